@@ -0,0 +1,190 @@
+import os
+import json
+import logging
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+from vector_search import normalize_rows, top_k_indices
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Metadata keys extracted by submit_path that the index can pre-filter on
+DEFAULT_FILTER_KEYS = ("board", "class", "subject")
+
+
+def _spherical_kmeans(matrix: np.ndarray, nlist: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd iterations on unit vectors; centroids are re-normalised so assignment is by cosine"""
+    sample_size = min(len(matrix), max(nlist * 64, 1024))
+    sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for j in range(nlist):
+            members = sample[assignment == j]
+            if len(members):
+                centroids[j] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters so every list stays useful
+                centroids[j] = sample[rng.integers(len(sample))]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over chunk embeddings.
+    Rows are clustered with spherical k-means and stored grouped by cluster, so a
+    query scores the centroids and then only the nprobe closest clusters.
+    Per-row metadata codes allow board/class/subject pre-filtering inside each cluster.
+    """
+
+    def __init__(self, nprobe: int = 8, filter_keys: Tuple[str, ...] = DEFAULT_FILTER_KEYS):
+        self.nprobe = nprobe
+        self.filter_keys = tuple(filter_keys)
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.items: List[Dict] = []
+        self.filter_vocab: Dict[str, Dict[str, int]] = {key: {} for key in self.filter_keys}
+        self.filter_codes: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def build(self, embeddings, items: List[Dict], nlist: Optional[int] = None,
+              iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        """Cluster the embeddings and lay the rows out list by list"""
+        if len(items) != len(embeddings):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(items)} items")
+        if not items:
+            raise ValueError("Cannot build an index without any chunks")
+
+        matrix = normalize_rows(embeddings)
+        if nlist is None:
+            # sqrt(N) lists keeps both the centroid scan and each probed list around sqrt(N)
+            nlist = int(np.sqrt(len(matrix)))
+        nlist = max(1, min(nlist, len(matrix)))
+
+        rng = np.random.default_rng(seed)
+        centroids = _spherical_kmeans(matrix, nlist, iterations, rng)
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+
+        self.centroids = centroids
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(nlist + 1)).astype(np.int64)
+        self.items = [items[i] for i in order]
+
+        self.filter_vocab = {key: {} for key in self.filter_keys}
+        self.filter_codes = {}
+        for key in self.filter_keys:
+            vocab = self.filter_vocab[key]
+            codes = np.empty(len(self.items), dtype=np.int32)
+            for row, item in enumerate(self.items):
+                value = str(item.get('metadata', {}).get(key, '')).lower()
+                codes[row] = vocab.setdefault(value, len(vocab))
+            self.filter_codes[key] = codes
+
+        logger.info(f"Built IVF index: {len(self.items)} chunks in {nlist} lists")
+        return self
+
+    def _filter_mask(self, start: int, end: int, filters: Dict) -> Optional[np.ndarray]:
+        mask = None
+        for key, value in filters.items():
+            code = self.filter_vocab.get(key, {}).get(str(value).lower())
+            if code is None:
+                return np.zeros(end - start, dtype=bool)
+            key_mask = self.filter_codes[key][start:end] == code
+            mask = key_mask if mask is None else mask & key_mask
+        return mask
+
+    def search(self, query_embedding, top_k: int = 5, filters: Optional[Dict] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """
+        Return (item, cosine similarity) pairs for the approximate top_k rows.
+        Filters are exact-match (case-insensitive) on the index's filter keys; when they
+        leave fewer than top_k candidates in the probed lists, more lists are probed.
+        """
+        if not self.items:
+            return []
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        unknown = set(filters) - set(self.filter_keys)
+        if unknown:
+            raise ValueError(f"Index cannot filter on {sorted(unknown)}; supported keys: {self.filter_keys}")
+
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        probe_order = np.argsort(-(self.centroids @ query), kind='stable')
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        candidate_rows, candidate_scores = [], []
+        found = 0
+        for probed, list_id in enumerate(probe_order):
+            if probed >= nprobe and found >= top_k:
+                break
+            start, end = int(self.list_offsets[list_id]), int(self.list_offsets[list_id + 1])
+            if start == end:
+                continue
+            rows = np.arange(start, end)
+            if filters:
+                mask = self._filter_mask(start, end, filters)
+                rows = rows[mask]
+                if not len(rows):
+                    continue
+            candidate_rows.append(rows)
+            candidate_scores.append(self.matrix[rows] @ query)
+            found += len(rows)
+
+        if not candidate_rows:
+            return []
+        rows = np.concatenate(candidate_rows)
+        scores = np.concatenate(candidate_scores)
+        return [(self.items[rows[i]], float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    def save(self, directory: str) -> None:
+        """Persist the index as a .npz of arrays plus a JSON sidecar for items and vocabularies"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "centroids": self.centroids,
+            "matrix": self.matrix,
+            "list_offsets": self.list_offsets,
+        }
+        for key, codes in self.filter_codes.items():
+            arrays[f"codes_{key}"] = codes
+        np.savez(os.path.join(directory, "ivf_index.npz"), **arrays)
+        with open(os.path.join(directory, "ivf_index.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "nprobe": self.nprobe,
+                "filter_keys": list(self.filter_keys),
+                "filter_vocab": self.filter_vocab,
+                "items": self.items,
+            }, f, ensure_ascii=False)
+        logger.info(f"Saved IVF index with {len(self.items)} chunks to {directory}")
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IVFIndex"]:
+        """Load an index written by save(), or None if the directory holds no index"""
+        npz_path = os.path.join(directory, "ivf_index.npz")
+        json_path = os.path.join(directory, "ivf_index.json")
+        if not (os.path.exists(npz_path) and os.path.exists(json_path)):
+            return None
+        with open(json_path, 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        index = cls(nprobe=sidecar["nprobe"], filter_keys=tuple(sidecar["filter_keys"]))
+        with np.load(npz_path) as arrays:
+            index.centroids = arrays["centroids"]
+            index.matrix = arrays["matrix"]
+            index.list_offsets = arrays["list_offsets"]
+            index.filter_codes = {key: arrays[f"codes_{key}"] for key in index.filter_keys}
+        index.filter_vocab = sidecar["filter_vocab"]
+        index.items = sidecar["items"]
+        logger.info(f"Loaded IVF index with {len(index.items)} chunks from {directory}")
+        return index
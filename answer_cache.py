@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '5000'))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+
+
+class _ScopeVectors:
+    """
+    The unit query vectors of one scope as rows of a growable matrix. Rows are appended in
+    place (capacity doubles when full) and removed by moving the last row into the gap,
+    so neither a store nor an eviction copies the whole scope.
+    """
+
+    def __init__(self, dim: int, capacity: int = 8):
+        self.ids = []
+        self._rows: Dict[int, int] = {}  # entry id -> row in matrix
+        self._matrix = np.empty((capacity, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, vector: np.ndarray) -> None:
+        count = len(self.ids)
+        if count == len(self._matrix):
+            grown = np.empty((2 * count, self._matrix.shape[1]), dtype=np.float32)
+            grown[:count] = self._matrix
+            self._matrix = grown
+        self._matrix[count] = vector
+        self._rows[entry_id] = count
+        self.ids.append(entry_id)
+
+    def remove(self, entry_id: int) -> None:
+        row = self._rows.pop(entry_id)
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self._matrix[row] = self._matrix[last]
+            self.ids[row] = moved_id
+            self._rows[moved_id] = row
+        self.ids.pop()
+
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        return self._matrix[:len(self.ids)] @ query
+
+
+class SemanticAnswerCache:
+    """
+    In-process answer cache keyed by (scope, query embedding), where scope is the resolved
+    GCS path of the chapter. A lookup hits when a cached question for the same chapter has
+    cosine similarity >= threshold with the new one. Bounded by max_entries with LRU
+    eviction; entries also expire after ttl_seconds.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 enabled: bool = ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # entry_id -> (scope, answer, created_at), in LRU order
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # scope -> its query vectors, for one matrix-vector product per lookup
+        self._scopes: Dict[str, _ScopeVectors] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def _normalize(query_embedding) -> np.ndarray:
+        vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, entry_id: int) -> None:
+        scope = self._entries.pop(entry_id)[0]
+        vectors = self._scopes[scope]
+        vectors.remove(entry_id)
+        if not vectors:
+            del self._scopes[scope]
+
+    def lookup(self, scope: str, query_embedding) -> Optional[str]:
+        """Return a cached answer for a near-identical question on the same chapter, if any"""
+        if not self.enabled:
+            return None
+        query = self._normalize(query_embedding)
+        with self._lock:
+            vectors = self._scopes.get(scope)
+            if vectors is not None:
+                similarities = vectors.similarities(query)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = vectors.ids[best]
+                    _, answer, created_at = self._entries[entry_id]
+                    if time.time() - created_at <= self.ttl_seconds:
+                        self._entries.move_to_end(entry_id)
+                        self.stats["hits"] += 1
+                        return answer
+                    self._remove(entry_id)
+                    self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, scope: str, query_embedding, answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        vector = self._normalize(query_embedding)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, answer, time.time())
+            vectors = self._scopes.get(scope)
+            if vectors is None:
+                vectors = self._scopes[scope] = _ScopeVectors(len(vector))
+            vectors.add(entry_id, vector)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "chapters": len(self._scopes),
+                "threshold": self.threshold,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
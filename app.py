@@ -1,14 +1,30 @@
 import re
 import os
-import io
 import json
 import logging
 import traceback
+import numpy as np
 from google.cloud.firestore_v1 import FieldFilter
 from flask import Flask, request, jsonify, render_template, redirect, url_for, session
-from pypdf import PdfReader
 from google.cloud import storage
-from sentence_transformers import SentenceTransformer
+from google.api_core.exceptions import NotFound
+from embedding_provider import get_embedding_model, get_embedding_model_stats
+from vector_search import top_k_indices
+from quantization import QuantizedMatrix, as_quantized, save_quantized, load_quantized, scales_filename, EMBEDDING_DTYPE
+from gcs_resolver import path_resolver
+from gcp_clients import get_storage_client, get_generative_model, get_client_pool_stats
+from streaming import wants_event_stream, iter_response_text, sse_response
+from answer_cache import SemanticAnswerCache
+from quiz_pool import QuizQuestionPool
+from chunk_manifest import ChunkManifest, chapter_key
+from chunk_store import ChunkStore, write_chunk_store, open_chunk_store, migrate_json_chunks
+from memory_cache import ByteBudgetCache
+from pdf_extract import extract_page_texts
+from chunking import chunk_pages
+from context_packer import pack_context, prompt_token_stats, QUIZ_CONTEXT_TOKEN_BUDGET
+from llm_executor import llm_executor, LLMOverloadedError, LLMTimeoutError
+from single_flight import SingleFlight, file_lock
+from ingestion import ingestion_queue
 from google.cloud import aiplatform
 from vertexai.generative_models import GenerativeModel
 import firebase_admin
@@ -77,7 +93,9 @@ except Exception as e:
 if ENHANCED_RAG_AVAILABLE:
     try:
         enhanced_chat_service = EnhancedChatService(project_id, location)
-        enhanced_quiz_service = EnhancedQuizService(project_id, location)
+        # One VertexAIRAG and one document store: a chapter chatted about is not embedded again for its quiz
+        enhanced_quiz_service = EnhancedQuizService(project_id, location, rag=enhanced_chat_service.rag,
+                                                    documents=enhanced_chat_service.documents)
         app.logger.info("Enhanced RAG services initialized successfully")
     except Exception as e:
         app.logger.error(f"Failed to initialize enhanced RAG services: {str(e)}")
@@ -135,13 +153,21 @@ except Exception as e:
     db = None
     app.logger.error(f"WARNING: Firebase initialization failed - {str(e)}")
 
-# ===== Load Sentence Transformer Model =====
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    app.logger.info("Embedding model loaded successfully")
-except Exception as e:
-    embedding_model = None
-    app.logger.error(f"Failed to load embedding model: {str(e)}", exc_info=True)
+# ===== Shared Sentence Transformer Model =====
+def load_embedding_model():
+    """
+    Fetch the process-wide embedding model shared with the chat blueprints and VertexAIRAG.
+    The model is loaded lazily on first use; returns None if it cannot be loaded.
+    """
+    try:
+        return get_embedding_model()
+    except Exception as e:
+        app.logger.error(f"Failed to load embedding model: {str(e)}", exc_info=True)
+        return None
+
+# ===== Semantic Answer Cache =====
+# Near-identical questions on the same chapter are answered from memory instead of Gemini
+answer_cache = SemanticAnswerCache()
 
 # ===== Email Configuration =====
 app.config.update(
@@ -195,61 +221,108 @@ def validate_pdf_path(path):
         app.logger.warning(f"Invalid chapter file format: '{chapter_file}' from {path}")
     return is_valid_file
 
-def get_pdf_from_storage(bucket_name, file_path):
+def get_pdf_from_storage(bucket_name, file_path, blob_info=None):
     """
     Retrieve PDF content from Google Cloud Storage.
     This function expects the exact GCS file_path (blob name).
     Path variations should be handled *before* calling this function.
+    If blob_info is a dict it is filled with the downloaded blob's generation and etag.
     """
     try:
         app.logger.info(f"Attempting to load PDF from GCS: gs://{bucket_name}/{file_path}")
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(file_path)
         
-        if not blob.exists():
+        # Download directly; a missing blob surfaces as NotFound without a separate exists() call
+        try:
+            pdf_bytes = blob.download_as_bytes()
+        except NotFound:
             app.logger.error(f"File not found in GCS: gs://{bucket_name}/{file_path}")
             raise FileNotFoundError(f"File not found at gs://{bucket_name}/{file_path}")
-            
-        pdf_bytes = blob.download_as_bytes()
         app.logger.info(f"Successfully downloaded {len(pdf_bytes)} bytes from GCS for '{file_path}'.")
+        if blob_info is not None:
+            # Populated from the download response headers, so no extra metadata call
+            blob_info.update(generation=blob.generation, etag=blob.etag)
         return pdf_bytes
     except Exception as e:
         app.logger.error(f"Error loading PDF from GCS for '{file_path}': {str(e)}", exc_info=True)
         raise
 
-def split_pdf_into_chunks(pdf_bytes, metadata=None, chunk_size=1000):
+def build_candidate_paths(gcs_folder_prefix, filename_variations, normalize_filename=True):
+    """
+    Expand filename variations into full blob names, each followed by its
+    "Class_"/underscore-normalised twin, in the order they should be tried.
+    With normalize_filename=False only the folder part is normalised.
+    """
+    normalized_folder_prefix = gcs_folder_prefix.replace("Class ", "Class_").replace(" ", "_")
+    candidates = []
+    for filename_var in filename_variations:
+        original_path = f"{gcs_folder_prefix}{filename_var}"
+        if normalize_filename:
+            normalized_path = original_path.replace("Class ", "Class_").replace(" ", "_")
+        else:
+            normalized_path = f"{normalized_folder_prefix}{filename_var}"
+        candidates.extend([original_path, normalized_path])
+    return list(dict.fromkeys(candidates))
+
+def quiz_filename_variations(chapter_number):
+    """Filename spellings used for chapter PDFs in the quiz bucket layout"""
+    return [
+        f"Chapter_{chapter_number}.pdf",
+        f"Chapter ({chapter_number}).pdf",
+        f"Chapter {chapter_number}.pdf",
+        f"chapter ({chapter_number}).pdf",
+        f"chapter_{chapter_number}.pdf",
+        f"chapter {chapter_number}.pdf",
+    ]
+
+def load_pdf_from_candidates(bucket_name, candidate_paths, blob_info=None):
+    """
+    Resolve the candidate blob names with the shared path resolver (one folder listing
+    instead of one round-trip per variation) and download the match.
+    Returns (pdf_bytes, resolved_path), or (None, None) if no candidate exists.
+    blob_info is passed through to get_pdf_from_storage.
+    """
+    resolved_path = path_resolver.resolve(bucket_name, candidate_paths)
+    if resolved_path is None:
+        return None, None
+    try:
+        return get_pdf_from_storage(bucket_name, resolved_path, blob_info), resolved_path
+    except FileNotFoundError:
+        # The cached resolution is stale (blob renamed or deleted); resolve once more from GCS
+        app.logger.warning(f"Resolved path gs://{bucket_name}/{resolved_path} disappeared; re-resolving.")
+        path_resolver.invalidate(bucket_name, candidate_paths)
+        resolved_path = path_resolver.resolve(bucket_name, candidate_paths)
+        if resolved_path is None:
+            return None, None
+        return get_pdf_from_storage(bucket_name, resolved_path, blob_info), resolved_path
+
+def split_pdf_into_chunks(pdf_bytes, metadata=None, chunk_size=1000, on_progress=None):
     """
     Split PDF into manageable chunks, associating each with provided metadata.
-    Uses io.BytesIO to present bytes as a file-like object to pypdf.
+    Page text is extracted by pdf_extract, which fans large documents out over a process pool,
+    and chunked by chunking.chunk_pages (sentence-aware, token-sized, overlapping and
+    crossing pages by default; chunk_size only applies to CHUNK_STRATEGY=page).
+    on_progress(pages_done, page_count) reports extraction progress.
     """
     if metadata is None:
         metadata = {} # Ensure metadata is always a dict
     
     try:
         app.logger.info(f"Starting PDF splitting into chunks. Bytes received: {len(pdf_bytes)}. Metadata: {metadata}")
-        pdf_stream = io.BytesIO(pdf_bytes)
+        pages = []
         
-        reader = PdfReader(pdf_stream)
-        
-        chunks_with_metadata = []
+        for page_number, text, page_error in extract_page_texts(pdf_bytes, on_progress=on_progress):
+            if page_error:
+                app.logger.error(f"Error extracting text from page {page_number}: {page_error}")
+            elif text:
+                pages.append((page_number, text))
+            else:
+                app.logger.warning(f"No text extracted from page {page_number}.")
         
-        for i, page in enumerate(reader.pages):
-            try:
-                text = page.extract_text()
-                if text:
-                    words = text.split()
-                    for j in range(0, len(words), chunk_size):
-                        chunk_text = ' '.join(words[j:j+chunk_size])
-                        # Store each chunk as a dictionary with text and its metadata
-                        chunks_with_metadata.append({
-                            "text": chunk_text,
-                            "metadata": {**metadata, "page": i + 1} # Add page number to metadata
-                        })
-                else:
-                    app.logger.warning(f"No text extracted from page {i+1}.")
-            except Exception as page_e:
-                app.logger.error(f"Error extracting text from page {i+1}: {str(page_e)}", exc_info=True)
+        # Each chunk is a dictionary with text and its metadata, including the page range it covers
+        chunks_with_metadata = chunk_pages(pages, metadata, chunk_size=chunk_size)
                 
         app.logger.info(f"Finished PDF splitting. Total chunks with metadata: {len(chunks_with_metadata)}")
         return chunks_with_metadata
@@ -257,36 +330,79 @@ def split_pdf_into_chunks(pdf_bytes, metadata=None, chunk_size=1000):
         app.logger.error(f"Error splitting PDF: {str(e)}", exc_info=True)
         raise
 
+# Cloud Run's ephemeral storage is /tmp/; point this at a directory pre-warmed by prewarm.py
+# (baked into the image or mounted) to start with every chapter already cached
+CHUNKS_CACHE_DIR = os.getenv('CHUNKS_CACHE_DIR', '/tmp/chunks_cache')
+
 def get_chunks_filename(bucket_name, file_path):
     """
-    Generate consistent filename for storing chunks in /tmp/.
-    Cloud Run's ephemeral storage is /tmp/.
+    Generate consistent filename for storing chunks in CHUNKS_CACHE_DIR.
+    Chunks are kept in the memory-mapped binary format from chunk_store.
     """
     safe_path = file_path.replace('/', '_').replace('.', '_').replace(' ', '_').replace('(', '').replace(')', '')
-    temp_dir = f"/tmp/chunks_cache"
-    os.makedirs(temp_dir, exist_ok=True)
-    return os.path.join(temp_dir, f"{bucket_name}_{safe_path}.json")
+    os.makedirs(CHUNKS_CACHE_DIR, exist_ok=True)
+    return os.path.join(CHUNKS_CACHE_DIR, f"{bucket_name}_{safe_path}.chunks")
+
+def get_legacy_chunks_filename(bucket_name, file_path):
+    """JSON chunk cache written by earlier versions; migrated on first read"""
+    return os.path.splitext(get_chunks_filename(bucket_name, file_path))[0] + ".json"
 
 def store_chunks(bucket_name, file_path, chunks):
     """Store chunks (with metadata) in local filesystem (/tmp/) with proper error handling"""
     chunks_filename = get_chunks_filename(bucket_name, file_path)
     try:
-        with open(chunks_filename, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, ensure_ascii=False)
+        write_chunk_store(chunks_filename, chunks)
         app.logger.info(f"Successfully stored chunks (with metadata) to temporary file: {chunks_filename}")
+        # Any embedding matrix on disk belonged to the previous chunk list
+        embeddings_filename = get_embeddings_filename(bucket_name, file_path)
+        for filename in (embeddings_filename, scales_filename(embeddings_filename)):
+            if os.path.exists(filename):
+                os.remove(filename)
     except Exception as e:
         app.logger.error(f"Error storing chunks to {chunks_filename}: {str(e)}", exc_info=True)
         raise
 
+def close_evicted_chunks(chunks_filename, chunks):
+    """Unmap chunk stores as they leave the cache instead of waiting for garbage collection"""
+    if isinstance(chunks, ChunkStore):
+        chunks.close()
+
+# Chunk stores already opened by this worker, keyed by cache filename and checked against its mtime
+parsed_chunks_cache = ByteBudgetCache(on_evict=close_evicted_chunks)
+
+def get_chunks_file_version(chunks_filename):
+    """(mtime, size) of a chunk cache file, or None if it does not exist"""
+    try:
+        stat = os.stat(chunks_filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
 def load_chunks(bucket_name, file_path):
-    """Load chunks (with metadata) from local filesystem (/tmp/) with proper error handling"""
+    """
+    Load chunks (with metadata) from local filesystem (/tmp/) with proper error handling.
+    Returns a memory-mapped ChunkStore (a read-only sequence of {"text", "metadata"} dicts);
+    a legacy JSON cache for the same file is converted on first read.
+    Opened stores are kept in an in-process LRU, so repeated questions on a chapter cost one stat().
+    """
     chunks_filename = get_chunks_filename(bucket_name, file_path)
     try:
+        version = get_chunks_file_version(chunks_filename)
+        if version is not None:
+            cached_chunks = parsed_chunks_cache.get(chunks_filename, version)
+            if cached_chunks is not None:
+                return cached_chunks
+
         app.logger.info(f"Attempting to load chunks (with metadata) from temporary file: {chunks_filename}")
-        if os.path.exists(chunks_filename):
-            with open(chunks_filename, 'r', encoding='utf-8') as f:
-                loaded_chunks = json.load(f)
+        loaded_chunks = open_chunk_store(chunks_filename)
+        if loaded_chunks is None:
+            legacy_filename = get_legacy_chunks_filename(bucket_name, file_path)
+            if os.path.exists(legacy_filename):
+                loaded_chunks = migrate_json_chunks(legacy_filename, chunks_filename)
+                version = get_chunks_file_version(chunks_filename)
+        if loaded_chunks is not None:
             app.logger.info(f"Successfully loaded {len(loaded_chunks)} chunks from cache.")
+            parsed_chunks_cache.set(chunks_filename, loaded_chunks, version=version)
             return loaded_chunks
         app.logger.info(f"Chunks file not found in cache: {chunks_filename}")
         return None
@@ -294,64 +410,270 @@ def load_chunks(bucket_name, file_path):
         app.logger.error(f"Error loading chunks from {chunks_filename}: {str(e)}", exc_info=True)
         return None
 
-def retrieve_relevant_chunks(chunks_with_metadata, query, filters=None, top_k=3):
+def get_embeddings_filename(bucket_name, file_path):
+    """
+    Generate the filename for the chunk embedding matrix.
+    It lives next to the chunk store so both are cached and evicted together.
+    """
+    chunks_filename = get_chunks_filename(bucket_name, file_path)
+    return os.path.splitext(chunks_filename)[0] + "_embeddings.npy"
+
+def compute_chunk_embeddings(chunks):
+    """Encode every chunk text in a single batched call, returning a float32 matrix."""
+    embedding_model = load_embedding_model()
+    if embedding_model is None:
+        app.logger.error("Embedding model not loaded. Cannot compute chunk embeddings.")
+        return None
+    texts = [item['text'] for item in chunks]
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(embedding_model.encode(texts), dtype=np.float32)
+
+def store_chunk_embeddings(bucket_name, file_path, embeddings):
+    """
+    Store the chunk embedding matrix as a .npy file next to the chunk store, in EMBEDDING_DTYPE
+    (int8 adds a _scales.npy companion). Returns the stored QuantizedMatrix.
+    """
+    embeddings_filename = get_embeddings_filename(bucket_name, file_path)
+    if not isinstance(embeddings, QuantizedMatrix):
+        embeddings = QuantizedMatrix.from_float(embeddings, EMBEDDING_DTYPE)
+    try:
+        # Write then rename so workers mapping the old file never see a partial matrix
+        save_quantized(embeddings_filename, embeddings)
+        app.logger.info(f"Successfully stored chunk embeddings {embeddings.shape} ({embeddings.dtype}) to: {embeddings_filename}")
+    except Exception as e:
+        app.logger.error(f"Error storing chunk embeddings to {embeddings_filename}: {str(e)}", exc_info=True)
+    return embeddings
+
+def load_chunk_embeddings(bucket_name, file_path, expected_count=None):
+    """
+    Load the chunk embedding matrix from /tmp/ as a read-only memory-mapped QuantizedMatrix,
+    in whatever dtype it was stored. Returns None when the file is missing, incomplete or does
+    not line up with the chunks it belongs to.
+    """
+    embeddings_filename = get_embeddings_filename(bucket_name, file_path)
+    try:
+        if not os.path.exists(embeddings_filename):
+            app.logger.info(f"Chunk embeddings not found in cache: {embeddings_filename}")
+            return None
+        embeddings = load_quantized(embeddings_filename)
+        if embeddings is None:
+            app.logger.warning(f"Cached int8 embeddings are missing their scales; ignoring {embeddings_filename}")
+            return None
+        if expected_count is not None and embeddings.shape[0] != expected_count:
+            app.logger.warning(
+                f"Cached embeddings row count {embeddings.shape[0]} does not match {expected_count} chunks; ignoring {embeddings_filename}"
+            )
+            return None
+        return embeddings
+    except Exception as e:
+        app.logger.error(f"Error loading chunk embeddings from {embeddings_filename}: {str(e)}", exc_info=True)
+        return None
+
+def ensure_chunk_embeddings(bucket_name, file_path, chunks):
+    """Load cached chunk embeddings, computing and storing them once if they are missing."""
+    embeddings = load_chunk_embeddings(bucket_name, file_path, expected_count=len(chunks))
+    if embeddings is None:
+        embeddings = compute_chunk_embeddings(chunks)
+        if embeddings is not None:
+            embeddings = store_chunk_embeddings(bucket_name, file_path, embeddings)
+    return embeddings
+
+def discard_cached_chunks(entry):
+    """Remove the chunk and embedding cache files built from a blob that has since changed"""
+    embeddings_filename = get_embeddings_filename(entry["bucket"], entry["path"])
+    for filename in (get_chunks_filename(entry["bucket"], entry["path"]),
+                     get_legacy_chunks_filename(entry["bucket"], entry["path"]),
+                     embeddings_filename, scales_filename(embeddings_filename)):
+        if os.path.exists(filename):
+            os.remove(filename)
+            app.logger.info(f"Removed stale cache file: {filename}")
+
+# Logical chapter (board/class/subject/chapter) -> resolved blob + generation of the cached chunks
+chunk_manifest = ChunkManifest(on_stale=discard_cached_chunks)
+
+def load_manifest_chunks(bucket_name, manifest_key):
+    """
+    Load a chapter's chunks from the local cache via the manifest, without downloading
+    (or even resolving) the PDF. Returns (chunks, blob_path), or (None, None) on a miss.
+    """
+    entry = chunk_manifest.lookup(manifest_key)
+    if entry is None:
+        return None, None
+    chunks = load_chunks(bucket_name, entry["path"])
+    if chunks is None:
+        # The cache file was evicted from /tmp; forget the entry so the caller reprocesses
+        chunk_manifest.invalidate(manifest_key)
+        return None, None
+    return chunks, entry["path"]
+
+def record_manifest_chunks(bucket_name, manifest_key, file_path, blob_info, chunks):
+    """Point the manifest at freshly cached chunks and the blob generation they came from"""
+    chunk_manifest.record(
+        manifest_key, bucket_name, file_path,
+        generation=blob_info.get("generation"), etag=blob_info.get("etag"), chunk_count=len(chunks)
+    )
+
+def get_blob_info(bucket_name, file_path):
+    """Generation and etag of a blob from one metadata call ({} if it does not exist)"""
+    blob = get_storage_client().bucket(bucket_name).get_blob(file_path)
+    return {"generation": blob.generation, "etag": blob.etag} if blob is not None else {}
+
+# Concurrent first requests for the same chapter PDF share one download and parse
+chapter_flight = SingleFlight()
+
+def build_chapter_chunks(bucket_name, candidate_paths, metadata, manifest_key, progress=None):
+    """
+    Make sure a chapter's chunks and embeddings are cached locally and recorded in the manifest.
+    Calls are coalesced on the resolved blob path within this worker and serialised across
+    workers with a file lock, so N simultaneous first requests cost one download and one parse.
+    progress (an ingestion JobProgress) is told the current stage and extracted page count.
+    Returns (chunks, blob_path, reused_cache), or (None, None, False) if no candidate exists.
+    """
+    if progress:
+        progress.stage("resolving")
+    resolved_path = path_resolver.resolve(bucket_name, candidate_paths)
+    if resolved_path is None:
+        return None, None, False
+    return chapter_flight.do(
+        f"{bucket_name}/{resolved_path}", _build_chapter_chunks,
+        bucket_name, candidate_paths, resolved_path, metadata, manifest_key, progress
+    )
+
+def _build_chapter_chunks(bucket_name, candidate_paths, resolved_path, metadata, manifest_key, progress=None):
+    def report(stage):
+        if progress:
+            progress.stage(stage)
+
+    report("waiting_for_lock")
+    with file_lock(get_chunks_filename(bucket_name, resolved_path) + ".lock"):
+        # Another worker may have finished the same chapter while we waited for the lock
+        chunks = load_chunks(bucket_name, resolved_path)
+        if chunks is not None:
+            app.logger.info(f"Using cached PDF chunks for {resolved_path}. Count: {len(chunks)}")
+            ensure_chunk_embeddings(bucket_name, resolved_path, chunks)
+            record_manifest_chunks(bucket_name, manifest_key, resolved_path, get_blob_info(bucket_name, resolved_path), chunks)
+            return chunks, resolved_path, True
+
+        report("downloading")
+        blob_info = {}
+        pdf_content, resolved_path = load_pdf_from_candidates(bucket_name, candidate_paths, blob_info)
+        if not pdf_content or not resolved_path:
+            return None, None, False
+        app.logger.info(f"SUCCESS: Loaded PDF using path: {resolved_path}")
+
+        report("extracting")
+        chunk_metadata = {"chapter_filename": resolved_path.split('/')[-1], **(metadata or {})}
+        chunks = split_pdf_into_chunks(pdf_content, metadata=chunk_metadata,
+                                       on_progress=progress.pages if progress else None)
+        store_chunks(bucket_name, resolved_path, chunks)
+        # Embed once here so every later question only has to encode the query
+        report("embedding")
+        ensure_chunk_embeddings(bucket_name, resolved_path, chunks)
+        record_manifest_chunks(bucket_name, manifest_key, resolved_path, blob_info, chunks)
+        app.logger.info(f"Successfully processed and stored {len(chunks)} chunks for {resolved_path}.")
+        return chunks, resolved_path, False
+
+def encode_query(query):
+    """Embed a single query as a float32 vector, or None if the embedding model is unavailable"""
+    embedding_model = load_embedding_model()
+    if embedding_model is None or not query:
+        return None
+    return np.asarray(embedding_model.encode([query])[0], dtype=np.float32)
+
+def retrieve_relevant_chunks(chunks_with_metadata, query, filters=None, top_k=3, chunk_embeddings=None, query_embedding=None,
+                             return_scores=False):
     """
     Retrieve most relevant chunks using semantic search, applying metadata filters first.
     chunks_with_metadata: List of dictionaries, each with 'text' and 'metadata' keys.
     filters: Dictionary of metadata to filter by, e.g., {'class': 'Class 10', 'subject': 'Science'}
+    chunk_embeddings: Optional precomputed matrix (one row per chunk), float or a QuantizedMatrix.
+    When given, only the query is encoded and the filtered rows are scored in their stored
+    dtype; otherwise the filtered chunks are encoded on the fly.
+    query_embedding: Optional precomputed query vector, so callers that already embedded
+    the query (e.g. for the answer cache) do not encode it twice.
+    return_scores: Return (text, score) pairs instead of bare texts, for context packing.
     """
     if not chunks_with_metadata or not query:
         app.logger.warning("No chunks or query provided for retrieval.")
         return []
             
+    embedding_model = load_embedding_model()
     if embedding_model is None:
         app.logger.error("Embedding model not loaded. Cannot retrieve relevant chunks.")
         return []
 
     # 1. Apply metadata filters
-    filtered_chunks = []
-    if filters:
+    if filters and isinstance(chunks_with_metadata, ChunkStore):
+        # Match against the deduplicated metadata table rather than every chunk
+        app.logger.info(f"Applying metadata filters: {filters}")
+        filtered_indices = chunks_with_metadata.filter_indices(filters)
+        app.logger.info(f"Filtered down to {len(filtered_indices)} chunks after metadata filtering.")
+    elif filters:
         app.logger.info(f"Applying metadata filters: {filters}")
-        for chunk_item in chunks_with_metadata:
+        filtered_indices = []
+        for i, chunk_item in enumerate(chunks_with_metadata):
             match = True
             for key, value in filters.items():
                 if key not in chunk_item['metadata'] or chunk_item['metadata'][key].lower() != value.lower():
                     match = False
                     break
             if match:
-                filtered_chunks.append(chunk_item)
-        app.logger.info(f"Filtered down to {len(filtered_chunks)} chunks after metadata filtering.")
+                filtered_indices.append(i)
+        app.logger.info(f"Filtered down to {len(filtered_indices)} chunks after metadata filtering.")
     else:
-        filtered_chunks = chunks_with_metadata # No filters, use all chunks
+        filtered_indices = list(range(len(chunks_with_metadata))) # No filters, use all chunks
 
-    if not filtered_chunks:
+    if not filtered_indices:
         app.logger.info("No chunks found after applying metadata filters.")
         return []
 
     # 2. Perform semantic search on filtered chunks
     try:
-        query_embedding = embedding_model.encode([query])[0]
+        if query_embedding is None:
+            query_embedding = np.asarray(embedding_model.encode([query])[0], dtype=np.float32)
         
-        # Extract just the text for embedding
-        texts_to_embed = [item['text'] for item in filtered_chunks]
-        chunk_embeddings = embedding_model.encode(texts_to_embed) 
-        
-        scored_chunks = []
-        for i, chunk_embedding in enumerate(chunk_embeddings):
-            score = (query_embedding * chunk_embedding).sum() 
-            scored_chunks.append((score, filtered_chunks[i])) # Keep the original chunk item (with metadata)
-            
-        scored_chunks.sort(reverse=True, key=lambda x: x[0])
+        # One matrix-vector product scores every filtered chunk
+        if chunk_embeddings is not None and len(chunk_embeddings) == len(chunks_with_metadata):
+            scores = as_quantized(chunk_embeddings).scores(query_embedding, filtered_indices)
+        else:
+            app.logger.info("No precomputed chunk embeddings supplied; encoding filtered chunks.")
+            texts_to_embed = [chunks_with_metadata[i]['text'] for i in filtered_indices]
+            chunk_matrix = np.asarray(embedding_model.encode(texts_to_embed), dtype=np.float32)
+            scores = chunk_matrix @ query_embedding
+        order = top_k_indices(scores, top_k)
         
         # Return only the 'text' content of the top_k relevant chunks
         # You might want to return the full chunk_item if you need metadata later
-        relevant_texts = [item['text'] for score, item in scored_chunks[:top_k]]
+        relevant_texts = [chunks_with_metadata[filtered_indices[i]]['text'] for i in order]
         app.logger.info(f"Retrieved {len(relevant_texts)} relevant chunks after semantic search.")
+        if return_scores:
+            return [(text, float(scores[i])) for text, i in zip(relevant_texts, order)]
         return relevant_texts
     except Exception as e:
         app.logger.error(f"Error retrieving chunks: {str(e)}", exc_info=True)
         return []
 
+def build_answer_prompt(context, query):
+    """Prompt shared by the blocking and streaming answer paths"""
+    return (
+        f"You are an expert educational assistant. Provide detailed, structured answers to student questions.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question: {query}\n\n"
+        f"Format your answer with:\n"
+        f"- **Bold** for key terms\n"
+        f"- *Italics* for emphasis\n"
+        f"- Lists for multiple items\n"
+        f"- Tables for comparative data\n"
+        f"- Headings for sections\n"
+        f"- Clear explanations with examples where needed\n\n"
+        f"Answer in detail, covering all relevant aspects from the context. "
+        f"If the question can't be answered from the context, say so explicitly.\n\n"
+        f"Answer:"
+    )
+
+ANSWER_GENERATION_ERROR = "I encountered an error while generating an answer. Please try again."
+
 def generate_answer(context, query, model_name="gemini-2.0-flash-001"):
     """Generate answer using Gemini model with proper error handling"""
     try:
@@ -359,29 +681,28 @@ def generate_answer(context, query, model_name="gemini-2.0-flash-001"):
             app.logger.warning("No context or query provided for answer generation.")
             return "I couldn't find enough context to answer that question."
             
-        model = GenerativeModel(model_name)
-        prompt = (
-            f"You are an expert educational assistant. Provide detailed, structured answers to student questions.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {query}\n\n"
-            f"Format your answer with:\n"
-            f"- **Bold** for key terms\n"
-            f"- *Italics* for emphasis\n"
-            f"- Lists for multiple items\n"
-            f"- Tables for comparative data\n"
-            f"- Headings for sections\n"
-            f"- Clear explanations with examples where needed\n\n"
-            f"Answer in detail, covering all relevant aspects from the context. "
-            f"If the question can't be answered from the context, say so explicitly.\n\n"
-            f"Answer:"
-        )
-        
-        response = model.generate_content(prompt)
+        model = get_generative_model(model_name)
+        prompt = build_answer_prompt(context, query)
+        prompt_token_stats.record("ask", prompt)
+        response = llm_executor.generate_content(model, prompt)
         app.logger.info("Successfully generated answer from Gemini.")
         return response.text.strip()
     except Exception as e:
         app.logger.error(f"Error generating answer: {str(e)}", exc_info=True)
-        return "I encountered an error while generating an answer. Please try again."
+        return ANSWER_GENERATION_ERROR
+
+def generate_answer_stream(context, query, model_name="gemini-2.0-flash-001"):
+    """Yield the answer text incrementally as Gemini produces it"""
+    if not context or not query:
+        app.logger.warning("No context or query provided for answer generation.")
+        yield "I couldn't find enough context to answer that question."
+        return
+    
+    model = get_generative_model(model_name)
+    prompt = build_answer_prompt(context, query)
+    prompt_token_stats.record("ask", prompt)
+    yield from llm_executor.stream(lambda: iter_response_text(model.generate_content(prompt, stream=True)))
+    app.logger.info("Finished streaming answer from Gemini.")
 
 # ===== Authentication Decorator =====
 def login_required(f):
@@ -393,6 +714,33 @@ def login_required(f):
         return f(*args, **kwargs)
     return wrapper
 
+# Comma-separated emails allowed to run maintenance endpoints; users with the Firebase
+# custom claim {"admin": true} are admins too
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+def is_admin(email):
+    if not email:
+        return False
+    if email.lower() in ADMIN_EMAILS:
+        return True
+    try:
+        return bool((auth.get_user_by_email(email).custom_claims or {}).get('admin'))
+    except Exception as e:
+        app.logger.warning(f"Could not check admin claim for {email}: {str(e)}")
+        return False
+
+def admin_required(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if 'user' not in session:
+            app.logger.warning("Authentication required, user not in session.")
+            return jsonify({'error': 'Authentication required'}), 401
+        if not is_admin(session.get('user')):
+            app.logger.warning(f"Admin access denied for {session.get('user')}.")
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return wrapper
+
 # ===== Routes =====
 @app.route('/')
 @app.route('/index.html')
@@ -1683,6 +2031,89 @@ def save_score():
         app.logger.error(f"Error saving score: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def run_chapter_ingest(payload, progress):
+    """Ingestion job handler: download, split, store and embed one chapter PDF"""
+    chunks, blob_path, reused_cache = build_chapter_chunks(
+        payload["bucket_name"], payload["candidate_paths"], payload["metadata"], payload["manifest_key"], progress
+    )
+    if chunks is None:
+        raise FileNotFoundError("PDF not found (tried multiple path variations)")
+    return {"chunks": len(chunks), "blob_path": blob_path, "reused_cache": reused_cache}
+
+ingestion_queue.register("chapter", run_chapter_ingest)
+
+def ingest_job_response(job, message, **extra):
+    """202 response for a queued or running ingestion job"""
+    return jsonify({
+        "status": "queued",
+        "message": message,
+        "job_id": job["job_id"],
+        "stage": job["stage"],
+        "status_url": url_for('get_ingest_job', job_id=job["job_id"]),
+        **extra
+    }), 202
+
+def enqueue_chapter_ingest(path):
+    """
+    Start preparing the chapter at a gs:// path.
+    Returns (chunk_count, None) when the manifest already has its chunks cached,
+    otherwise (None, job) for the queued (or already running) ingestion job.
+    """
+    bucket_name = path.split('/')[2]
+    app.logger.info(f"Extracted bucket_name: {bucket_name}")
+
+    path_segments = path.split('/')
+    # Extract metadata from the path
+    # Expected: gs:// / rag-project-storagebucket / NCERT / Class X / Subject / chapter (X).pdf
+    # Index:    0    1   2                  3        4         5         6
+    extracted_metadata = {
+        "board": path_segments[3],
+        "class": path_segments[4],
+        "subject": path_segments[5],
+        "chapter_filename": path_segments[6] # Keep original filename for variations
+    }
+    app.logger.info(f"Extracted metadata from path: {extracted_metadata}")
+
+    # Warm path: the manifest knows where this chapter's chunks are cached, so skip GCS entirely
+    manifest_key = chapter_key(bucket_name, path_segments[3:-1], path_segments[-1])
+    chunks_from_manifest, cached_file_path = load_manifest_chunks(bucket_name, manifest_key)
+    if chunks_from_manifest is not None:
+        app.logger.info(f"Using cached PDF chunks for {cached_file_path} via manifest. Count: {len(chunks_from_manifest)}")
+        ensure_chunk_embeddings(bucket_name, cached_file_path, chunks_from_manifest)
+        return len(chunks_from_manifest), None
+
+    gcs_folder_prefix = "/".join(path_segments[3:-1]) + "/" 
+    original_filename = path_segments[-1] 
+    app.logger.info(f"Extracted GCS folder prefix: {gcs_folder_prefix}")
+    app.logger.info(f"Extracted original filename: {original_filename}")
+
+    # Define filename variations to try in GCS
+    filename_variations_to_try = [
+        original_filename,
+        original_filename.replace(" (", "_").replace(").pdf", ".pdf"),
+        original_filename.replace("(", "").replace(")", ""),
+        original_filename.lower(),
+        original_filename.lower().replace(" (", "_").replace(").pdf", ".pdf"),
+        original_filename.lower().replace("(", "").replace(")", ""),
+        original_filename.replace("_", " "), 
+        original_filename.lower().replace("_", " "), 
+    ]
+    filename_variations_to_try = list(dict.fromkeys(filename_variations_to_try))
+    app.logger.info(f"Generated filename variations: {filename_variations_to_try}")
+
+    candidate_paths = build_candidate_paths(gcs_folder_prefix, filename_variations_to_try, normalize_filename=False)
+
+    # The download, split and embedding run on an ingestion worker; a chapter already
+    # queued or in progress returns that job instead of starting another
+    job = ingestion_queue.submit("chapter", f"chapter:{manifest_key}", {
+        "bucket_name": bucket_name,
+        "candidate_paths": candidate_paths,
+        "metadata": extracted_metadata,
+        "manifest_key": manifest_key
+    })
+    app.logger.info(f"Ingestion job {job['job_id']} for {path}: {job['status']}")
+    return None, job
+
 @app.route('/submit-path', methods=['POST'])
 # @login_required
 def submit_path():
@@ -1699,105 +2130,57 @@ def submit_path():
             app.logger.error(f"Path validation failed for: {path}")
             return jsonify({"error": "Invalid path format"}), 400
 
-        bucket_name = path.split('/')[2]
-        app.logger.info(f"Extracted bucket_name: {bucket_name}")
-
-        path_segments = path.split('/')
-        # Extract metadata from the path
-        # Expected: gs:// / rag-project-storagebucket / NCERT / Class X / Subject / chapter (X).pdf
-        # Index:    0    1   2                  3        4         5         6
-        extracted_metadata = {
-            "board": path_segments[3],
-            "class": path_segments[4],
-            "subject": path_segments[5],
-            "chapter_filename": path_segments[6] # Keep original filename for variations
-        }
-        app.logger.info(f"Extracted metadata from path: {extracted_metadata}")
-
-        gcs_folder_prefix = "/".join(path_segments[3:-1]) + "/" 
-        original_filename = path_segments[-1] 
-        app.logger.info(f"Extracted GCS folder prefix: {gcs_folder_prefix}")
-        app.logger.info(f"Extracted original filename: {original_filename}")
-
-        # Define filename variations to try in GCS
-        filename_variations_to_try = [
-            original_filename,
-            original_filename.replace(" (", "_").replace(").pdf", ".pdf"),
-            original_filename.replace("(", "").replace(")", ""),
-            original_filename.lower(),
-            original_filename.lower().replace(" (", "_").replace(").pdf", ".pdf"),
-            original_filename.lower().replace("(", "").replace(")", ""),
-            original_filename.replace("_", " "), 
-            original_filename.lower().replace("_", " "), 
-        ]
-        filename_variations_to_try = list(dict.fromkeys(filename_variations_to_try))
-        app.logger.info(f"Generated filename variations: {filename_variations_to_try}")
-
-        pdf_content = None
-        actual_file_path_in_gcs = None 
-
-        for filename_var in filename_variations_to_try:
-            current_gcs_file_path_original_folders = f"{gcs_folder_prefix}{filename_var}"
-            normalized_gcs_folder_prefix = gcs_folder_prefix.replace("Class ", "Class_").replace(" ", "_")
-            current_gcs_file_path_normalized_folders = f"{normalized_gcs_folder_prefix}{filename_var}"
-            
-            paths_to_attempt_this_iteration = list(dict.fromkeys([
-                current_gcs_file_path_original_folders,
-                current_gcs_file_path_normalized_folders
-            ]))
-
-            for attempt_path in paths_to_attempt_this_iteration:
-                try:
-                    app.logger.info(f"Attempting to load PDF from GCS using full path: {attempt_path}")
-                    pdf_content = get_pdf_from_storage(bucket_name, attempt_path)
-                    actual_file_path_in_gcs = attempt_path 
-                    app.logger.info(f"SUCCESS: Loaded PDF using path: {actual_file_path_in_gcs}")
-                    break 
-                except FileNotFoundError:
-                    app.logger.info(f"File not found for path: {attempt_path}. Trying next variation.")
-                    continue 
-                except Exception as e:
-                    app.logger.error(f"Unexpected error trying GCS path variation {attempt_path}: {e}", exc_info=True)
-                    continue
-            if pdf_content: 
-                break
-
-        if not pdf_content or not actual_file_path_in_gcs:
-            app.logger.error(f"FAILURE: PDF not found after trying all variations for requested path: {path}")
-            return jsonify({"error": "PDF not found (tried multiple path variations)"}), 404
-
-        # Use the *actual_file_path_in_gcs* for caching to ensure consistency
-        # The cache key should be based on the actual GCS path used.
-        chunks_cache_key = actual_file_path_in_gcs 
-        chunks_from_cache = load_chunks(bucket_name, chunks_cache_key)
-
-        if chunks_from_cache is None:
-            app.logger.info("Chunks not found in cache. Processing PDF...")
-            try:
-                # Pass extracted metadata to split_pdf_into_chunks
-                chunks = split_pdf_into_chunks(pdf_content, metadata=extracted_metadata)
-                store_chunks(bucket_name, chunks_cache_key, chunks)
-                app.logger.info(f"Successfully processed and stored {len(chunks)} chunks for {actual_file_path_in_gcs}.")
-                return jsonify({
-                    "status": "success", 
-                    "message": "Let's start learning the Chapter", 
-                    "chunks": len(chunks)
-                })
-            except Exception as e:
-                app.logger.error(f"Error processing PDF after GCS download: {str(e)}", exc_info=True)
-                return jsonify({"error": f"Failed to process PDF: {str(e)}"}), 500
-        else:
-            app.logger.info(f"Using cached PDF chunks for {actual_file_path_in_gcs}. Count: {len(chunks_from_cache)}")
+        chunk_count, job = enqueue_chapter_ingest(path)
+        if job is None:
             return jsonify({
                 "status": "success", 
                 "message": "Using cached PDF chunks", 
-                "chunks": len(chunks_from_cache)
+                "chunks": chunk_count
             })
+        return ingest_job_response(job, "Preparing the Chapter")
 
     except Exception as e:
         app.logger.error(f"Error in submit_path route: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/ingest', methods=['POST'])
+def create_ingest_job():
+    """
+    Queue preprocessing of a chapter PDF: {"path": "gs://bucket/Board/Class/Subject/chapter.pdf"}.
+    Returns the job id to poll at GET /api/ingest/<job_id>, or success straight away if cached.
+    """
+    try:
+        data = request.get_json() or {}
+        path = data.get("path")
+        if not path:
+            return jsonify({"error": "Missing path"}), 400
+        if not validate_pdf_path(path):
+            return jsonify({"error": "Invalid path format"}), 400
+
+        chunk_count, job = enqueue_chapter_ingest(path)
+        if job is None:
+            return jsonify({"status": "success", "message": "Using cached PDF chunks", "chunks": chunk_count})
+        return ingest_job_response(job, "Chapter queued for preprocessing")
+
+    except Exception as e:
+        app.logger.error(f"Error creating ingestion job: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/ingest/<job_id>', methods=['GET'])
+def get_ingest_job(job_id):
+    """
+    Progress of an ingestion job: status (queued, running, succeeded, failed), the current
+    stage, pages extracted so far and, once finished, its result or error
+    """
+    try:
+        job = ingestion_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown ingestion job"}), 404
+        return jsonify(job)
+    except Exception as e:
+        app.logger.error(f"Error reading ingestion job {job_id}: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/ask', methods=['POST'])
 # @login_required
 def ask():
@@ -1825,74 +2208,84 @@ def ask():
         }
         app.logger.info(f"Extracted filters for 'ask' route: {filters}")
 
-        # The cache key should be based on the actual GCS path used during submit_path
-        # For simplicity, we'll use the original requested path as the key here.
-        # In a more robust system, you might store the actual_file_path_in_gcs in the session
-        # or a database after submit_path to retrieve it consistently.
-        chunks_cache_key = "/".join(path.split('/')[3:]) 
+        # Filename variations the chapter PDF may be stored under
+        gcs_folder_prefix = "/".join(path_segments[3:-1]) + "/" 
+        original_filename = path_segments[-1]
+
+        filename_variations_to_try = [
+            original_filename,
+            original_filename.replace(" (", "_").replace(").pdf", ".pdf"),
+            original_filename.replace("(", "").replace(")", ""),
+            original_filename.lower(),
+            original_filename.lower().replace(" (", "_").replace(").pdf", ".pdf"),
+            original_filename.lower().replace("(", "").replace(")", ""),
+        ]
+        candidate_paths = build_candidate_paths(gcs_folder_prefix, filename_variations_to_try)
+
+        # The cache key should be based on the actual GCS path used during submit_path,
+        # which the chunk manifest records; otherwise resolve it (one cached folder listing),
+        # so every spelling of the same chapter shares one chunk and answer cache entry.
+        manifest_key = chapter_key(bucket_name, path_segments[3:-1], path_segments[-1])
+        manifest_entry = chunk_manifest.lookup(manifest_key)
+        if manifest_entry:
+            chunks_cache_key = manifest_entry["path"]
+        else:
+            chunks_cache_key = path_resolver.resolve(bucket_name, candidate_paths) or "/".join(path_segments[3:])
+        
+        # Serve near-identical questions on this chapter from the semantic answer cache
+        answer_cache_scope = f"{bucket_name}/{chunks_cache_key}"
+        query_embedding = encode_query(question)
+        if query_embedding is not None:
+            cached_answer = answer_cache.lookup(answer_cache_scope, query_embedding)
+            if cached_answer is not None:
+                app.logger.info("Serving answer from semantic answer cache.")
+                if wants_event_stream(data):
+                    return sse_response(iter([cached_answer]))
+                return jsonify({"answer": cached_answer})
         
         chunks_with_metadata = load_chunks(bucket_name, chunks_cache_key)
 
         if chunks_with_metadata is None:
             app.logger.info("Chunks not found in cache for 'ask' route. Re-processing PDF...")
             try:
-                # Re-attempt finding PDF with variations if not in cache
-                gcs_folder_prefix = "/".join(path_segments[3:-1]) + "/" 
-                original_filename = path_segments[-1]
-
-                filename_variations_to_try = [
-                    original_filename,
-                    original_filename.replace(" (", "_").replace(").pdf", ".pdf"),
-                    original_filename.replace("(", "").replace(")", ""),
-                    original_filename.lower(),
-                    original_filename.lower().replace(" (", "_").replace(").pdf", ".pdf"),
-                    original_filename.lower().replace("(", "").replace(")", ""),
-                ]
-                
-                pdf_content = None
-                actual_file_path_in_gcs_for_ask = None
-
-                for filename_var in filename_variations_to_try:
-                    current_gcs_file_path = f"{gcs_folder_prefix}{filename_var}"
-                    current_gcs_file_path_normalized_space = current_gcs_file_path.replace("Class ", "Class_").replace(" ", "_")
-                    
-                    paths_to_attempt = list(dict.fromkeys([current_gcs_file_path, current_gcs_file_path_normalized_space]))
-
-                    for attempt_path in paths_to_attempt:
-                        try:
-                            app.logger.info(f"Attempting to load PDF for 'ask' from GCS using path variation: {attempt_path}")
-                            pdf_content = get_pdf_from_storage(bucket_name, attempt_path)
-                            actual_file_path_in_gcs_for_ask = attempt_path
-                            app.logger.info(f"Successfully loaded PDF for 'ask' using path: {actual_file_path_in_gcs_for_ask}")
-                            break
-                        except FileNotFoundError:
-                            continue
-                        except Exception as e:
-                            app.logger.error(f"Unexpected error trying GCS path variation for 'ask' {attempt_path}: {e}", exc_info=True)
-                            continue
-                    if pdf_content:
-                        break
-
-                if not pdf_content:
+                # Same coalesced, locked and manifest-recorded path as submit and quiz generation
+                chunks_with_metadata, resolved_path, _ = build_chapter_chunks(
+                    bucket_name, candidate_paths, filters, manifest_key
+                )
+                if chunks_with_metadata is None:
                     app.logger.error(f"PDF not found for 'ask' after trying all variations for path: {path}")
                     return jsonify({"error": "PDF content not found for this path."}), 404
 
-                # Pass extracted metadata to split_pdf_into_chunks
-                chunks_with_metadata = split_pdf_into_chunks(pdf_content, metadata=filters) # Use filters as initial metadata
-                store_chunks(bucket_name, chunks_cache_key, chunks_with_metadata) 
-                app.logger.info(f"Successfully re-processed and stored {len(chunks_with_metadata)} chunks for 'ask' route.")
+                chunks_cache_key = resolved_path
+                answer_cache_scope = f"{bucket_name}/{resolved_path}"
+                app.logger.info(f"Loaded {len(chunks_with_metadata)} chunks for 'ask' route from {resolved_path}.")
             except Exception as e:
                 app.logger.error(f"Failed to re-process PDF for 'ask' route: {str(e)}", exc_info=True)
                 return jsonify({"error": f"Failed to load content for asking: {str(e)}"}), 500
 
+        chunk_embeddings = ensure_chunk_embeddings(bucket_name, chunks_cache_key, chunks_with_metadata)
+
         # Pass filters to retrieve_relevant_chunks
-        relevant_chunks_text = retrieve_relevant_chunks(chunks_with_metadata, question, filters=filters)
-        if not relevant_chunks_text:
+        relevant_chunks = retrieve_relevant_chunks(
+            chunks_with_metadata, question, filters=filters, chunk_embeddings=chunk_embeddings,
+            query_embedding=query_embedding, return_scores=True
+        )
+        if not relevant_chunks:
             app.logger.info("No relevant chunks found for question after filtering.")
             return jsonify({"answer": "I couldn't find relevant information to answer your question."})
 
-        context = " ".join(chunk.replace("\n", " ") for chunk in relevant_chunks_text).strip()
+        # Deduplicate, order by score and trim to the context token budget
+        context, packing = pack_context(relevant_chunks)
+        app.logger.info(f"Packed context: {packing}")
+        def remember_answer(generated_answer):
+            if query_embedding is not None and generated_answer != ANSWER_GENERATION_ERROR:
+                answer_cache.store(answer_cache_scope, query_embedding, generated_answer)
+
+        if wants_event_stream(data):
+            return sse_response(generate_answer_stream(context, question), on_complete=remember_answer)
+        
         answer = generate_answer(context, question)
+        remember_answer(answer)
         app.logger.info("Answer generated successfully.")
 
         return jsonify({"answer": answer})
@@ -1900,6 +2293,136 @@ def ask():
         app.logger.error(f"Error answering question: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+QUIZ_QUESTION_COUNT = 10
+
+def generate_chapter_quiz(board, class_level, subject, literature_type, chapter_number, difficulty):
+    """
+    Generate validated quiz questions for one chapter with Gemini.
+    Used directly on a quiz pool miss and by the pool's background refills, so it must
+    not touch the request or session. Raises FileNotFoundError if the chapter PDF is
+    missing and ValueError if no usable questions could be produced.
+    """
+    # Adjust subject path if English with literature/supplementary
+    subject_path = subject
+    if subject.lower() == 'english' and literature_type != '':
+        subject_path = f"{subject}/{literature_type}"
+        print("literature type added",subject_path)
+
+    app.logger.info(f"Using subject_path: {subject_path}")
+
+    # Construct base path to look for PDF file
+    base_path_segments = [board, f"Class {class_level}", subject_path]
+    gcs_folder_prefix = "/".join(base_path_segments) + "/"
+
+    # Cached chunks are found by chapter identity first, so a warm quiz never touches GCS
+    manifest_key = chapter_key("guru-ai-bucket", base_path_segments, chapter_number)
+    chunks_with_metadata, chunks_cache_key = load_manifest_chunks("guru-ai-bucket", manifest_key)
+
+    if chunks_with_metadata is not None:
+        app.logger.info(f"Loaded cached chunks for {chunks_cache_key} via manifest: {len(chunks_with_metadata)}")
+    else:
+        # Try multiple filename variants to account for inconsistencies
+        candidate_paths = build_candidate_paths(gcs_folder_prefix, quiz_filename_variations(chapter_number))
+
+        # Metadata for caching and context filtering (chapter_filename comes from the resolved blob)
+        quiz_metadata = {
+            "board": board,
+            "class": f"Class {class_level}",
+            "subject": subject
+        }
+
+        # Download, split and cache once, shared with any concurrent request for this chapter
+        chunks_with_metadata, chunks_cache_key, _ = build_chapter_chunks(
+            "guru-ai-bucket", candidate_paths, quiz_metadata, manifest_key
+        )
+
+        # If no file was found after all attempts
+        if chunks_with_metadata is None:
+            raise FileNotFoundError("PDF not found for quiz generation (tried multiple path variations)")
+
+    chunk_embeddings = ensure_chunk_embeddings("guru-ai-bucket", chunks_cache_key, chunks_with_metadata)
+
+    # Filter chunks by metadata
+    quiz_filters = {
+        "board": board,
+        "class": f"Class {class_level}",
+        "subject": subject
+    }
+
+    # Use semantic search to find most relevant chunks for question generation
+    context_chunks = retrieve_relevant_chunks(
+        chunks_with_metadata,
+        "generate quiz question",
+        filters=quiz_filters,
+        top_k=20,
+        chunk_embeddings=chunk_embeddings,
+        return_scores=True
+    )
+    # Bound the prompt regardless of how large the chapter's chunks are
+    context, packing = pack_context(context_chunks, token_budget=QUIZ_CONTEXT_TOKEN_BUDGET)
+    app.logger.info(f"Packed quiz context: {packing}")
+
+    if not context:
+        raise ValueError("No relevant context found to generate a quiz.")
+
+    # Gemini prompt to generate quiz questions
+    model = get_generative_model("gemini-2.0-flash-001")
+    prompt = (
+        f"Generate {QUIZ_QUESTION_COUNT} multiple choice questions based on the following educational content. "
+        f"Difficulty level: {difficulty}. "
+        f"Each question should be clear and complete. For each question, provide:\n"
+        f"- A complete question text\n"
+        f"- 4 possible options (labeled a, b, c, d)\n"
+        f"- The correct answer (0-3 corresponding to options)\n"
+        f"- A complete and detailed explanation\n"
+        f"- The topic from the content\n"
+        f"Format the response as a JSON array with these fields: question, options, correctAnswer, explanation, topic.\n"
+        f"Content:\n{context}\n\nQuestions:"
+    )
+
+    prompt_token_stats.record("quiz", prompt)
+    app.logger.info("Sending prompt to Gemini model...")
+    response = llm_executor.generate_content(model, prompt)
+    app.logger.info("Received response from Gemini.")
+
+    # Clean and parse the JSON response from Gemini
+    try:
+        json_text = response.text.strip()
+        if json_text.startswith("```json"):
+            json_text = json_text[len("```json"):].strip()
+        if json_text.endswith("```"):
+            json_text = json_text[:-len("```")].strip()
+
+        if '][' in json_text:
+            json_text = "[" + json_text.replace('][', ',') + "]"
+
+        cleaned_json_text = re.sub(r',\s*([\]}])', r'\1', json_text)
+        questions = json.loads(cleaned_json_text)
+
+    except json.JSONDecodeError as json_err:
+        app.logger.error(f"Invalid JSON format: {json_err}")
+        raise ValueError("Failed to generate quiz due to AI formatting error.")
+
+    # Validate each question object
+    validated_questions = []
+    for q in questions:
+        if all(k in q for k in ['question', 'options', 'correctAnswer', 'explanation', 'topic']) \
+           and isinstance(q['options'], list) and len(q['options']) == 4 \
+           and isinstance(q['correctAnswer'], int) and 0 <= q['correctAnswer'] <= 3:
+            validated_questions.append(q)
+        if len(validated_questions) >= QUIZ_QUESTION_COUNT:
+            break
+
+    # Ensure we have at least one valid question
+    if not validated_questions:
+        raise ValueError("No valid questions generated")
+
+    return validated_questions
+
+# Pre-generated questions per (board, class, subject, literature type, chapter, difficulty),
+# topped up in the background by generate_chapter_quiz
+quiz_pool = QuizQuestionPool(generate_chapter_quiz)
+
 # Route to generate a quiz based on subject, chapter, and difficulty level
 @app.route('/generate-quiz', methods=['POST'])
 @login_required
@@ -1935,145 +2458,26 @@ def generate_quiz():
         chapter_number_match = re.search(r'\d+', chapter)
         chapter_number = chapter_number_match.group() if chapter_number_match else '1'
 
-        # Adjust subject path if English with literature/supplementary
-        subject_path = subject
-        if subject.lower() == 'english' and literature_type != '':
-            subject_path = f"{subject}/{literature_type}"
-            print("literature type added",subject_path)
-
-        app.logger.info(f"Using subject_path: {subject_path}")
-
-        # Construct base path to look for PDF file
-        base_path_segments = [board, f"Class {class_level}", subject_path]
-        gcs_folder_prefix = "/".join(base_path_segments) + "/"
-
-        # Try multiple filename variants to account for inconsistencies
-        filename_variations = [
-            f"Chapter_{chapter_number}.pdf",
-            f"Chapter ({chapter_number}).pdf",
-            f"Chapter {chapter_number}.pdf",
-            f"chapter ({chapter_number}).pdf",
-            f"chapter_{chapter_number}.pdf",
-            f"chapter {chapter_number}.pdf",
-        ]
-
-        pdf_content = None
-        actual_file_path_in_gcs = None
-
-        # Attempt to locate the correct PDF file in GCS
-        for f_name_var in filename_variations:
-            current_gcs_file_path = f"{gcs_folder_prefix}{f_name_var}"
-            current_gcs_file_path_normalized_space = current_gcs_file_path.replace("Class ", "Class_").replace(" ", "_")
-
-            paths_to_attempt = list(dict.fromkeys([current_gcs_file_path, current_gcs_file_path_normalized_space]))
-
-            for attempt_path in paths_to_attempt:
-                try:
-                    app.logger.info(f"Trying quiz PDF path variation: {attempt_path}")
-                    pdf_content = get_pdf_from_storage("guru-ai-bucket", attempt_path)
-                    actual_file_path_in_gcs = attempt_path
-                    break
-                except FileNotFoundError:
-                    continue
-                except Exception as e:
-                    app.logger.warning(f"Error trying quiz path variation {attempt_path}: {e}")
-                    continue
-            if pdf_content:
-                break
-
-        # If no file was found after all attempts
-        if not pdf_content or not actual_file_path_in_gcs:
-            return jsonify({"error": "PDF not found for quiz generation (tried multiple path variations)"}), 404
-
-        # Metadata for caching and context filtering
-        quiz_metadata = {
-            "board": board,
-            "class": f"Class {class_level}",
-            "subject": subject,
-            "chapter_filename": actual_file_path_in_gcs.split('/')[-1]
-        }
-
-        chunks_cache_key = actual_file_path_in_gcs
-        chunks_with_metadata = load_chunks("guru-ai-bucket", chunks_cache_key)
-
-        # If not cached, split PDF and cache chunks
-        if chunks_with_metadata is None:
-            app.logger.info("Chunks not found. Processing PDF...")
-            chunks_with_metadata = split_pdf_into_chunks(pdf_content, metadata=quiz_metadata)
-            store_chunks("guru-ai-bucket", chunks_cache_key, chunks_with_metadata)
-            app.logger.info(f"Stored {len(chunks_with_metadata)} chunks.")
+        # Serve from the pre-generated pool, falling back to generating inline on a miss
+        pool_key = (board, class_level, subject, literature_type, chapter_number, difficulty)
+        validated_questions = quiz_pool.take(pool_key, user.uid, QUIZ_QUESTION_COUNT)
+        if validated_questions is None:
+            app.logger.info(f"Quiz pool miss for {pool_key}; generating inline.")
+            try:
+                validated_questions = generate_chapter_quiz(*pool_key)
+            except FileNotFoundError as e:
+                return jsonify({"error": str(e)}), 404
+            except LLMOverloadedError as e:
+                app.logger.warning(f"Quiz generation rejected: {str(e)}")
+                return jsonify({"error": "Quiz generation is busy. Please try again shortly."}), 503
+            except LLMTimeoutError as e:
+                app.logger.error(f"Quiz generation timed out: {str(e)}")
+                return jsonify({"error": "Quiz generation timed out. Please try again."}), 504
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 500
+            quiz_pool.add(pool_key, validated_questions, served_to=user.uid)
         else:
-            app.logger.info(f"Loaded cached chunks: {len(chunks_with_metadata)}")
-
-        # Filter chunks by metadata
-        quiz_filters = {
-            "board": board,
-            "class": f"Class {class_level}",
-            "subject": subject
-        }
-
-        # Use semantic search to find most relevant chunks for question generation
-        context_chunks_text = retrieve_relevant_chunks(
-            chunks_with_metadata,
-            "generate quiz question",
-            filters=quiz_filters,
-            top_k=20
-        )
-        context = " ".join(chunk.replace("\n", " ") for chunk in context_chunks_text)
-
-        if not context:
-            return jsonify({"error": "No relevant context found to generate a quiz."}), 500
-
-        # Gemini prompt to generate quiz questions
-        model = GenerativeModel("gemini-2.0-flash-001")
-        prompt = (
-            f"Generate 10 multiple choice questions based on the following educational content. "
-            f"Difficulty level: {difficulty}. "
-            f"Each question should be clear and complete. For each question, provide:\n"
-            f"- A complete question text\n"
-            f"- 4 possible options (labeled a, b, c, d)\n"
-            f"- The correct answer (0-3 corresponding to options)\n"
-            f"- A complete and detailed explanation\n"
-            f"- The topic from the content\n"
-            f"Format the response as a JSON array with these fields: question, options, correctAnswer, explanation, topic.\n"
-            f"Content:\n{context}\n\nQuestions:"
-        )
-
-        app.logger.info("Sending prompt to Gemini model...")
-        response = model.generate_content(prompt)
-        app.logger.info("Received response from Gemini.")
-
-        # Clean and parse the JSON response from Gemini
-        try:
-            json_text = response.text.strip()
-            if json_text.startswith("```json"):
-                json_text = json_text[len("```json"):].strip()
-            if json_text.endswith("```"):
-                json_text = json_text[:-len("```")].strip()
-
-            if '][' in json_text:
-                json_text = "[" + json_text.replace('][', ',') + "]"
-
-            cleaned_json_text = re.sub(r',\s*([\]}])', r'\1', json_text)
-            questions = json.loads(cleaned_json_text)
-
-        except json.JSONDecodeError as json_err:
-            app.logger.error(f"Invalid JSON format: {json_err}")
-            return jsonify({"error": "Failed to generate quiz due to AI formatting error."}), 500
-
-        # Validate each question object
-        validated_questions = []
-        for q in questions:
-            if all(k in q for k in ['question', 'options', 'correctAnswer', 'explanation', 'topic']) \
-               and isinstance(q['options'], list) and len(q['options']) == 4 \
-               and isinstance(q['correctAnswer'], int) and 0 <= q['correctAnswer'] <= 3:
-                validated_questions.append(q)
-            if len(validated_questions) >= 10:
-                break
-
-        # Ensure we have at least one valid question
-        if not validated_questions:
-            return jsonify({"error": "No valid questions generated"}), 500
+            app.logger.info(f"Served {len(validated_questions)} questions from quiz pool for {pool_key}.")
 
         # Return the generated quiz questions
         return jsonify({
@@ -2220,6 +2624,14 @@ def debug_session():
 
 # ===== Enhanced Vertex AI RAG Routes =====
 
+def run_enhanced_ingest(payload, progress):
+    """Ingestion job handler: build the enhanced service's index for one document"""
+    progress.stage("processing")
+    cache_key = enhanced_chat_service.process_document(payload["bucket_name"], payload["file_path"], payload["metadata"])
+    return {"cache_key": cache_key}
+
+ingestion_queue.register("enhanced", run_enhanced_ingest)
+
 @app.route('/api/enhanced/submit-path', methods=['POST'])
 @login_required
 def enhanced_submit_path():
@@ -2252,15 +2664,23 @@ def enhanced_submit_path():
             "chapter": path_segments[-1] if len(path_segments) > 5 else ""
         }
         
-        # Process document using enhanced service
-        cache_key = enhanced_chat_service.process_document(bucket_name, file_path, metadata)
+        cache_key = enhanced_chat_service.get_cache_key(bucket_name, file_path)
+        if enhanced_chat_service.is_processed(cache_key):
+            return jsonify({
+                "status": "success",
+                "message": "Document processed successfully using enhanced RAG",
+                "cache_key": cache_key,
+                "metadata": metadata
+            })
         
-        return jsonify({
-            "status": "success",
-            "message": "Document processed successfully using enhanced RAG",
-            "cache_key": cache_key,
+        # The index lives in this worker's memory, so the job is claimed by this process only
+        job = ingestion_queue.submit("enhanced", f"enhanced:{cache_key}", {
+            "bucket_name": bucket_name,
+            "file_path": file_path,
             "metadata": metadata
-        })
+        }, local=True)
+        return ingest_job_response(job, "Document queued for enhanced RAG processing",
+                                   cache_key=cache_key, metadata=metadata)
         
     except Exception as e:
         app.logger.error(f"Error in enhanced submit path: {str(e)}", exc_info=True)
@@ -2284,6 +2704,14 @@ def enhanced_ask():
         if not cache_key or not question:
             return jsonify({"error": "Missing cache_key or question"}), 400
             
+        if wants_event_stream(data):
+            result = enhanced_chat_service.ask_question_stream(cache_key, question, top_k)
+            if "stream" in result:
+                return sse_response(result["stream"], {"debug": result["debug"]})
+            if "error" in result:
+                return jsonify(result), 400
+            return jsonify(result)
+            
         # Ask question using enhanced service
         result = enhanced_chat_service.ask_question(cache_key, question, top_k)
         
@@ -2343,40 +2771,12 @@ def enhanced_generate_quiz():
         base_path_segments = [board, f"Class {class_level}", subject_path]
         gcs_folder_prefix = "/".join(base_path_segments) + "/"
         
-        # Try multiple filename variants
-        filename_variations = [
-            f"Chapter_{chapter_number}.pdf",
-            f"Chapter ({chapter_number}).pdf",
-            f"Chapter {chapter_number}.pdf",
-            f"chapter ({chapter_number}).pdf",
-            f"chapter_{chapter_number}.pdf",
-            f"chapter {chapter_number}.pdf",
-        ]
-        
-        pdf_content = None
-        actual_file_path_in_gcs = None
-        
-        # Find the correct PDF file
-        for f_name_var in filename_variations:
-            current_gcs_file_path = f"{gcs_folder_prefix}{f_name_var}"
-            current_gcs_file_path_normalized_space = current_gcs_file_path.replace("Class ", "Class_").replace(" ", "_")
-            
-            paths_to_attempt = list(dict.fromkeys([current_gcs_file_path, current_gcs_file_path_normalized_space]))
-            
-            for attempt_path in paths_to_attempt:
-                try:
-                    pdf_content = get_pdf_from_storage("guru-ai-bucket", attempt_path)
-                    actual_file_path_in_gcs = attempt_path
-                    break
-                except FileNotFoundError:
-                    continue
-                except Exception as e:
-                    app.logger.warning(f"Error trying quiz path variation {attempt_path}: {e}")
-                    continue
-            if pdf_content:
-                break
+        # Try multiple filename variants; the enhanced service downloads the PDF itself,
+        # so only the blob name needs resolving here
+        candidate_paths = build_candidate_paths(gcs_folder_prefix, quiz_filename_variations(chapter_number))
+        actual_file_path_in_gcs = path_resolver.resolve("guru-ai-bucket", candidate_paths)
                 
-        if not pdf_content or not actual_file_path_in_gcs:
+        if not actual_file_path_in_gcs:
             return jsonify({"error": "PDF not found for quiz generation"}), 404
             
         # Metadata for quiz generation
@@ -2410,6 +2810,75 @@ def enhanced_generate_quiz():
         app.logger.error(f"Error in enhanced quiz generation: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# Upper bound on chunks retrieved per cross-chapter question
+CORPUS_ASK_MAX_TOP_K = 20
+
+@app.route('/api/enhanced/corpus-ask', methods=['POST'])
+@login_required
+def enhanced_corpus_ask():
+    """
+    Cross-chapter question answering over the ANN index of every persisted chunk,
+    pre-filtered on board/class/subject
+    """
+    try:
+        if enhanced_chat_service is None:
+            return jsonify({"error": "Enhanced RAG service not available"}), 503
+            
+        data = request.get_json()
+        question = data.get("question")
+        
+        if not question:
+            return jsonify({"error": "Missing question"}), 400
+        
+        try:
+            top_k = int(data.get("top_k", 5))
+        except (TypeError, ValueError):
+            return jsonify({"error": "top_k must be an integer"}), 400
+        top_k = max(1, min(top_k, CORPUS_ASK_MAX_TOP_K))
+            
+        filters = {key: data.get(key) for key in ("board", "class", "subject") if data.get(key)}
+        
+        result = enhanced_chat_service.ask_corpus_question(question, filters, top_k)
+        
+        if "error" in result:
+            return jsonify(result), 400
+            
+        return jsonify(result)
+        
+    except Exception as e:
+        app.logger.error(f"Error in enhanced corpus ask: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+def run_corpus_index_rebuild(payload, progress):
+    """Ingestion job handler: rebuild the corpus ANN index from Firestore"""
+    progress.stage("building")
+    index = enhanced_chat_service.get_corpus_index(rebuild=True)
+    if index is None:
+        raise FileNotFoundError("No persisted chunks available to index")
+    return {"chunks": len(index), "lists": index.nlist}
+
+ingestion_queue.register("corpus_index", run_corpus_index_rebuild)
+
+@app.route('/api/enhanced/corpus-index/rebuild', methods=['POST'])
+@admin_required
+def enhanced_rebuild_corpus_index():
+    """
+    Queue a rebuild of the corpus ANN index from Firestore (admins only).
+    The full Firestore scan and k-means run on an ingestion worker of this process, which
+    then serves the new index; poll status_url for the chunk and list counts.
+    """
+    try:
+        if enhanced_chat_service is None:
+            return jsonify({"error": "Enhanced RAG service not available"}), 503
+            
+        # Repeated requests while a rebuild is queued or running return that job
+        job = ingestion_queue.submit("corpus_index", "corpus_index", {}, local=True)
+        return ingest_job_response(job, "Corpus index rebuild queued")
+        
+    except Exception as e:
+        app.logger.error(f"Error rebuilding corpus index: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/enhanced/status')
 def enhanced_status():
     """
@@ -2419,6 +2888,18 @@ def enhanced_status():
         "enhanced_rag_available": ENHANCED_RAG_AVAILABLE,
         "enhanced_chat_service": enhanced_chat_service is not None,
         "enhanced_quiz_service": enhanced_quiz_service is not None,
+        "embedding_model": get_embedding_model_stats(),
+        "gcs_path_resolver": path_resolver.get_stats(),
+        "client_pool": get_client_pool_stats(),
+        "answer_cache": answer_cache.get_stats(),
+        "quiz_pool": quiz_pool.get_stats(),
+        "chunk_manifest": chunk_manifest.get_stats(),
+        "chunk_memory_cache": parsed_chunks_cache.get_stats(),
+        "prompt_tokens": prompt_token_stats.get_stats(),
+        "llm_executor": llm_executor.get_stats(),
+        "chapter_single_flight": chapter_flight.get_stats(),
+        "ingestion_queue": ingestion_queue.get_stats(),
+        "enhanced_document_store": enhanced_chat_service.documents.get_stats() if enhanced_chat_service else None,
         "project_id": project_id,
         "location": location
     })
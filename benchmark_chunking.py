@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark for chunking strategies: retrieval hit rate vs context size sent to Gemini.
+Uses the sentence-transformers model when it is installed and a local TF-IDF scorer otherwise.
+Pass a PDF path to also report chunk counts and context sizes for a real chapter.
+"""
+
+import re
+import sys
+import numpy as np
+
+from chunking import chunk_pages, estimate_tokens
+from vector_search import top_k_indices
+
+TOP_K = 3
+PAGES = 40
+FACTS_PER_PAGE = 12
+WORDS_PER_LINE = 12
+STRATEGIES = ["page", "semantic"]
+
+VOCAB = (
+    "plant cell energy water light root leaf soil force motion mass heat acid base salt metal "
+    "carbon oxygen river valley climate trade empire kingdom river census village market crop "
+    "rain cloud wind current circuit magnet lens mirror sound wave atom molecule tissue organ"
+).split()
+
+
+def make_chapter(rng):
+    """
+    Synthetic chapter: each fact is one sentence containing a unique key term, facts are grouped
+    into paragraphs that run across page breaks, and lines are hard-wrapped like pypdf output.
+    Returns (pages, [(question, answer sentence)]).
+    """
+    sentences, questions = [], []
+    for fact in range(PAGES * FACTS_PER_PAGE):
+        key = f"term{fact}"
+        body = " ".join(rng.choice(VOCAB, size=rng.integers(14, 30)))
+        sentence = f"The {key} explains how {body}."
+        sentences.append(sentence)
+        questions.append((f"What does {key} explain about {' '.join(body.split()[:3])}?", sentence))
+
+    text, paragraph_length = [], 0
+    for sentence in sentences:
+        text.append(sentence)
+        paragraph_length += 1
+        if paragraph_length >= rng.integers(3, 7):
+            text.append("\n\n")
+            paragraph_length = 0
+    words = " ".join(text).replace(" \n\n ", " \n\n").split(" ")
+
+    words_per_page = len(words) // PAGES + 1
+    pages = []
+    for page in range(PAGES):
+        page_words = words[page * words_per_page:(page + 1) * words_per_page]
+        lines = [" ".join(page_words[i:i + WORDS_PER_LINE]) for i in range(0, len(page_words), WORDS_PER_LINE)]
+        pages.append((page + 1, "\n".join(lines)))
+    return pages, questions
+
+
+def load_scorer():
+    """Embedding model if available, otherwise TF-IDF so the benchmark runs anywhere"""
+    try:
+        from embedding_provider import get_embedding_model
+        model = get_embedding_model()
+        encode = lambda texts: np.asarray(model.encode(texts), dtype=np.float32)
+        return "all-MiniLM-L6-v2", encode
+    except Exception:
+        return "tf-idf", None
+
+
+def tfidf_encoder(documents):
+    tokenize = lambda text: re.findall(r"\w+", text.lower())
+    vocabulary = {}
+    for document in documents:
+        for token in set(tokenize(document)):
+            vocabulary[token] = vocabulary.get(token, 0) + 1
+    index = {token: i for i, token in enumerate(vocabulary)}
+    idf = np.log((1 + len(documents)) / (1 + np.array(list(vocabulary.values()), dtype=np.float32))) + 1
+
+    def encode(texts):
+        matrix = np.zeros((len(texts), len(index)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                if token in index:
+                    matrix[row, index[token]] += 1
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+    return encode
+
+
+def evaluate(chunks, questions, encode):
+    texts = [chunk["text"] for chunk in chunks]
+    encode = encode or tfidf_encoder(texts)
+    chunk_matrix = encode(texts)
+    query_matrix = encode([question for question, _ in questions])
+    normalize = lambda text: " ".join(text.split())
+    hits, context_tokens = 0, []
+    for row, (_, answer) in enumerate(questions):
+        order = top_k_indices(chunk_matrix @ query_matrix[row], TOP_K)
+        retrieved = [texts[i] for i in order]
+        hits += any(normalize(answer) in normalize(text) for text in retrieved)
+        context_tokens.append(sum(estimate_tokens(text) for text in retrieved))
+    return hits / len(questions), float(np.mean(context_tokens))
+
+
+def pdf_pages(path):
+    from pdf_extract import extract_page_texts
+    with open(path, 'rb') as f:
+        return [(number, text) for number, text, error in extract_page_texts(f.read()) if text]
+
+
+def main():
+    """Compare strategies on the synthetic chapter, and optionally on a real PDF"""
+    rng = np.random.default_rng(0)
+    pages, questions = make_chapter(rng)
+    scorer, encode = load_scorer()
+    print(f"🚀 chunking benchmark ({scorer}, top_k={TOP_K}, {len(questions)} questions)")
+    print("=" * 70)
+    print(f"{'strategy':>10} {'chunks':>8} {'mean tokens':>12} {'hit rate':>10} {'context tokens':>15}")
+    for strategy in STRATEGIES:
+        chunks = chunk_pages(pages, strategy=strategy)
+        hit_rate, context = evaluate(chunks, questions, encode)
+        mean_tokens = np.mean([estimate_tokens(chunk["text"]) for chunk in chunks])
+        print(f"{strategy:>10} {len(chunks):>8} {mean_tokens:>12.0f} {hit_rate:>9.1%} {context:>15.0f}")
+
+    if len(sys.argv) > 1:
+        real_pages = pdf_pages(sys.argv[1])
+        print("=" * 70)
+        print(f"📄 {sys.argv[1]}: {len(real_pages)} pages with text")
+        for strategy in STRATEGIES:
+            chunks = chunk_pages(real_pages, strategy=strategy)
+            sizes = [estimate_tokens(chunk["text"]) for chunk in chunks]
+            print(f"{strategy:>10} {len(chunks):>8} chunks, mean {np.mean(sizes):.0f} / max {max(sizes)} tokens, "
+                  f"top-{TOP_K} context <= {sum(sorted(sizes)[-TOP_K:])} tokens")
+    print("=" * 70)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark for chunk embedding storage types: recall@k, memory and scoring time of
+float16 and int8 (per-vector scale) against exact float32 search
+"""
+
+import sys
+import time
+import numpy as np
+
+from quantization import QuantizedMatrix, EMBEDDING_DTYPES, encode_vector
+from vector_search import normalize_rows, top_k_indices
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+CHUNK_COUNTS = [1000, 10000, 100000]
+# Topics per corpus, so neighbours are close together the way chunks of one chapter are
+CLUSTER_SIZE = 50
+QUERIES = 200
+TOP_K = 5
+REPEATS = 5
+# Recall@k below this is reported as a regression
+MIN_RECALL = 0.9
+
+
+def make_corpus(count, rng):
+    """Clustered unit vectors: a topic centre per CLUSTER_SIZE rows plus noise"""
+    centres = rng.standard_normal((max(1, count // CLUSTER_SIZE), EMBEDDING_DIM)).astype(np.float32)
+    rows = centres[rng.integers(0, len(centres), count)] + 0.6 * rng.standard_normal((count, EMBEDDING_DIM))
+    queries = centres[rng.integers(0, len(centres), QUERIES)] + 0.6 * rng.standard_normal((QUERIES, EMBEDDING_DIM))
+    return normalize_rows(rows), normalize_rows(queries)
+
+
+def recall_at_k(matrix, exact_top, queries):
+    hits = 0
+    for query, expected in zip(queries, exact_top):
+        hits += len(set(top_k_indices(matrix.scores(query), TOP_K)) & set(expected))
+    return hits / (len(queries) * TOP_K)
+
+
+def time_scores(matrix, queries):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for query in queries[:20]:
+            matrix.scores(query)
+    return (time.perf_counter() - start) / (REPEATS * 20)
+
+
+def main():
+    """Report recall@k and memory per dtype; fail if any dtype drops below MIN_RECALL"""
+    rng = np.random.default_rng(0)
+    print(f"🚀 Embedding quantisation benchmark (dim {EMBEDDING_DIM}, top-{TOP_K}, {QUERIES} queries)")
+    print("=" * 78)
+    print(f"{'chunks':>8} {'dtype':>8} {'bytes/vec':>10} {'Firestore B':>12} {'matrix MiB':>11} "
+          f"{'score ms':>9} {'recall@k':>9}")
+
+    all_ok = True
+    for count in CHUNK_COUNTS:
+        embeddings, queries = make_corpus(count, rng)
+        exact = QuantizedMatrix.from_float(embeddings, "float32")
+        exact_top = [top_k_indices(exact.scores(query), TOP_K) for query in queries]
+        for dtype in EMBEDDING_DTYPES:
+            matrix = QuantizedMatrix.from_float(embeddings, dtype)
+            recall = recall_at_k(matrix, exact_top, queries)
+            all_ok = all_ok and recall >= MIN_RECALL
+            print(f"{count:>8} {dtype:>8} {matrix.nbytes / count:>10.1f} {len(encode_vector(embeddings[0], dtype)):>12} "
+                  f"{matrix.nbytes / 2**20:>11.2f} {time_scores(matrix, queries) * 1000:>9.3f} "
+                  f"{recall:>8.3f}{'' if recall >= MIN_RECALL else ' ❌'}")
+
+    print("=" * 78)
+    if all_ok:
+        print(f"🎉 Every dtype keeps recall@{TOP_K} >= {MIN_RECALL} against float32.")
+        return 0
+    print(f"❌ Some dtype fell below recall@{TOP_K} {MIN_RECALL}.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark for VertexAIRAG.semantic_search: per-chunk list scoring vs packed EmbeddingMatrix
+"""
+
+import sys
+import time
+import numpy as np
+
+from vector_search import EmbeddingMatrix
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+CHUNK_COUNTS = [100, 1000, 10000]
+TOP_K = 5
+REPEATS = 20
+
+
+def legacy_semantic_search(query_embedding, chunks, top_k):
+    """The original loop: rebuild every vector, recompute both norms, sort everything"""
+    scored_chunks = []
+    for chunk in chunks:
+        if 'embedding' in chunk:
+            chunk_embedding = np.array(chunk['embedding'])
+            similarity = np.dot(query_embedding, chunk_embedding) / (
+                np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
+            )
+            scored_chunks.append((chunk, float(similarity)))
+    scored_chunks.sort(key=lambda x: x[1], reverse=True)
+    return scored_chunks[:top_k]
+
+
+def make_chunks(count, rng):
+    embeddings = rng.standard_normal((count, EMBEDDING_DIM)).astype(np.float32)
+    return [
+        {
+            "text": f"chunk {i}",
+            "metadata": {"page": i + 1},
+            "chunk_id": f"page_{i+1}_chunk_1",
+            "embedding": embeddings[i].tolist()
+        }
+        for i in range(count)
+    ]
+
+
+def time_call(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    """Run the benchmark and check both paths return the same ranking"""
+    rng = np.random.default_rng(0)
+    print("🚀 semantic_search benchmark")
+    print("=" * 70)
+    print(f"{'chunks':>8} {'legacy ms':>12} {'matrix ms':>12} {'speed-up':>10} {'same top-k':>12}")
+
+    all_match = True
+    for count in CHUNK_COUNTS:
+        chunks = make_chunks(count, rng)
+        index = EmbeddingMatrix.from_chunks(chunks)
+        query = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+        repeats = max(1, REPEATS * 100 // count)
+        legacy_s, legacy = time_call(lambda: legacy_semantic_search(query, chunks, TOP_K), repeats)
+        matrix_s, packed = time_call(lambda: index.search(query, TOP_K), REPEATS)
+
+        same = [c['chunk_id'] for c, _ in legacy] == [c['chunk_id'] for c, _ in packed] and np.allclose(
+            [s for _, s in legacy], [s for _, s in packed], atol=1e-5
+        )
+        all_match = all_match and same
+        print(f"{count:>8} {legacy_s * 1000:>12.3f} {matrix_s * 1000:>12.3f} "
+              f"{legacy_s / matrix_s:>9.1f}x {'✅' if same else '❌':>11}")
+
+    print("=" * 70)
+    if all_match:
+        print("🎉 Rankings match the original cosine search.")
+        return 0
+    print("❌ Rankings differ from the original cosine search.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,13 @@ from flask import Blueprint, request, jsonify, render_template, session
 from PyPDF2 import PdfReader
 from google.cloud import storage
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embedding_provider import get_embedding_model
+from vector_search import top_k_indices
+from gcs_resolver import path_resolver
+from gcp_clients import get_storage_client, get_generative_model
+from streaming import wants_event_stream, iter_response_text, sse_response
+from context_packer import pack_context, prompt_token_stats
+from llm_executor import llm_executor
 from vertexai.generative_models import GenerativeModel
 import firebase_admin
 from firebase_admin import credentials
@@ -27,8 +33,7 @@ if not firebase_admin._apps:
     except Exception as e:
         print(f"Firebase initialization error: {e}")
 
-# Load embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Embedding model is shared process-wide and loaded on first use (see embedding_provider)
 
 # Authentication decorator
 def chat_login_required(f):
@@ -76,6 +81,8 @@ def submit_path():
         pdf_bytes = load_pdf_from_gcs(bucket_name, file_path)
         chunks = split_pdf_into_chunks(pdf_bytes)
         store_chunks_locally(chunks_path, chunks)
+        # Embed every page once here so /ask only has to encode the question
+        store_chunk_embeddings_locally(get_embeddings_path(gcs_path), encode_chunks(chunks))
 
         return jsonify({
             "status": "success",
@@ -122,7 +129,8 @@ def ask():
         # Debugging line to print out chunks loaded
         print(f"Loaded {len(chunks)} chunks from: {chunks_path}")  # Debug log
 
-        relevant_chunks = retrieve_relevant_chunks_with_scores(chunks, question)
+        chunk_embeddings = load_or_build_chunk_embeddings(get_embeddings_path(gcs_path), chunks)
+        relevant_chunks = retrieve_relevant_chunks_with_scores(chunks, question, chunk_embeddings=chunk_embeddings)
 
         # Debugging the relevant chunks found
         print(f"Found {len(relevant_chunks)} relevant chunks for the question.")  # Debug log
@@ -132,7 +140,8 @@ def ask():
             "score": float(score)
         } for chunk, score in relevant_chunks]
 
-        context = " ".join(chunk.replace("\n", " ") for chunk, _ in relevant_chunks).strip()
+        # Deduplicate, order by score and trim to the context token budget
+        context, packing = pack_context(relevant_chunks)
         if not context:
             return jsonify({
                 "error": "No relevant context found",
@@ -142,15 +151,21 @@ def ask():
                 }
             }), 404
 
+        debug = {
+            "question": question,
+            "context_used": context[:500] + "..." if len(context) > 500 else context,
+            "context_packing": packing,
+            "top_chunks": debug_info
+        }
+
+        if wants_event_stream(data):
+            return sse_response(generate_answer_stream(context, question), {"debug": debug})
+
         answer = generate_answer(context, question)
 
         return jsonify({
             "answer": answer,
-            "debug": {
-                "question": question,
-                "context_used": context[:500] + "..." if len(context) > 500 else context,
-                "top_chunks": debug_info
-            }
+            "debug": debug
         })
 
     except Exception as e:
@@ -165,8 +180,11 @@ def get_chunks_path(gcs_path):
     path = '/'.join(parts[3:])
     return f"{bucket}_{path.replace('/', '_').replace(' ', '')}_chunks.json"
 
+def get_embeddings_path(gcs_path):
+    return get_chunks_path(gcs_path)[:-len("_chunks.json")] + "_embeddings.npy"
+
 def load_pdf_from_gcs(bucket_name, file_path):
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
 
     path_variants = [
@@ -179,10 +197,10 @@ def load_pdf_from_gcs(bucket_name, file_path):
         file_path.upper()
     ]
 
-    for variant in path_variants:
-        blob = bucket.blob(variant)
-        if blob.exists():
-            return blob.download_as_bytes()
+    # One folder listing per distinct prefix instead of an exists() call per variant
+    resolved_path = path_resolver.resolve(bucket_name, path_variants)
+    if resolved_path:
+        return bucket.blob(resolved_path).download_as_bytes()
 
     raise FileNotFoundError(f"PDF not found in GCS. Tried: {path_variants}")
 
@@ -194,40 +212,77 @@ def store_chunks_locally(chunks_path, chunks):
     with open(chunks_path, 'w') as f:
         json.dump(chunks, f)
 
-def retrieve_relevant_chunks_with_scores(chunks, query, top_k=3):
-    query_embedding = embedding_model.encode([query])[0]
-    scored = []
-    for chunk in chunks:
-        chunk_embedding = embedding_model.encode([chunk])[0]
-        score = np.dot(query_embedding, chunk_embedding)
-        scored.append((chunk, score))
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return scored[:top_k]
+def encode_chunks(chunks):
+    # One batched forward pass over every page instead of one call per page
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(get_embedding_model().encode(chunks), dtype=np.float32)
+
+def store_chunk_embeddings_locally(embeddings_path, embeddings):
+    np.save(embeddings_path, embeddings)
+
+def load_or_build_chunk_embeddings(embeddings_path, chunks):
+    if os.path.exists(embeddings_path):
+        try:
+            embeddings = np.load(embeddings_path)
+            if embeddings.shape[0] == len(chunks):
+                return embeddings
+            print(f"Cached embeddings do not match {len(chunks)} chunks, rebuilding: {embeddings_path}")
+        except Exception as e:
+            print(f"Failed to load cached embeddings {embeddings_path}: {e}")
+    embeddings = encode_chunks(chunks)
+    store_chunk_embeddings_locally(embeddings_path, embeddings)
+    return embeddings
+
+def retrieve_relevant_chunks_with_scores(chunks, query, top_k=3, chunk_embeddings=None):
+    if not chunks:
+        return []
+    embedding_model = get_embedding_model()
+    query_embedding = np.asarray(embedding_model.encode([query])[0], dtype=np.float32)
+    if chunk_embeddings is None or len(chunk_embeddings) != len(chunks):
+        chunk_embeddings = encode_chunks(chunks)
+    scores = chunk_embeddings @ query_embedding
+    return [(chunks[i], scores[i]) for i in top_k_indices(scores, top_k)]
+
+def build_answer_prompt(context, query):
+    return (
+        f"You are an expert educational assistant. Provide detailed, structured answers to student questions.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question: {query}\n\n"
+        f"Format your answer with:\n"
+        f"- Bold for key terms\n"
+        f"- Italics for emphasis\n"
+        f"- Lists for multiple items\n"
+        f"- Tables for comparative data\n"
+        f"- Headings for sections\n"
+        f"- Clear explanations with examples where needed\n\n"
+        f"Answer:"
+    )
 
 def generate_answer(context, query, model_name="gemini-2.0-flash-001"):
     try:
         if not context or not query:
             return "I couldn't find enough context to answer that question."
 
-        model = GenerativeModel(model_name)
-        prompt = (
-            f"You are an expert educational assistant. Provide detailed, structured answers to student questions.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {query}\n\n"
-            f"Format your answer with:\n"
-            f"- Bold for key terms\n"
-            f"- Italics for emphasis\n"
-            f"- Lists for multiple items\n"
-            f"- Tables for comparative data\n"
-            f"- Headings for sections\n"
-            f"- Clear explanations with examples where needed\n\n"
-            f"Answer:"
-        )
-        response = model.generate_content(prompt)
+        model = get_generative_model(model_name)
+        prompt = build_answer_prompt(context, query)
+        prompt_token_stats.record("chat", prompt)
+        response = llm_executor.generate_content(model, prompt)
         return response.text.strip()
     except Exception as e:
         return "An error occurred while generating the answer."
 
+def generate_answer_stream(context, query, model_name="gemini-2.0-flash-001"):
+    # Yields answer text as Gemini produces it; errors surface as an SSE "error" event
+    if not context or not query:
+        yield "I couldn't find enough context to answer that question."
+        return
+
+    model = get_generative_model(model_name)
+    prompt = build_answer_prompt(context, query)
+    prompt_token_stats.record("chat", prompt)
+    yield from llm_executor.stream(lambda: iter_response_text(model.generate_content(prompt, stream=True)))
+
 # ---------------- FLASK APP FOR TESTING ----------------
 
 if __name__ == '__main__':
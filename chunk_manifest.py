@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from google.cloud import storage
+
+from gcp_clients import get_storage_client
+from single_flight import file_lock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CHUNK_MANIFEST_PATH = os.getenv(
+    'CHUNK_MANIFEST_PATH', os.path.join(os.getenv('CHUNKS_CACHE_DIR', '/tmp/chunks_cache'), 'manifest.json')
+)
+# How long a recorded blob generation is trusted before a metadata call re-checks it
+CHUNK_MANIFEST_REVALIDATE_SECONDS = float(os.getenv('CHUNK_MANIFEST_REVALIDATE_SECONDS', '600'))
+
+
+def _normalize_segment(segment: str) -> str:
+    return " ".join(segment.replace("_", " ").lower().split())
+
+
+def chapter_key(bucket_name: str, folder_segments: List[str], chapter: str) -> str:
+    """
+    Logical identity of a chapter, independent of how its PDF happens to be spelled in GCS:
+    bucket, normalised folder segments (board/class/subject[/literature]) and chapter number.
+    "Class_9/Science/chapter (3).pdf" and "Class 9/science/Chapter_3.pdf" map to the same key.
+    """
+    chapter_number = re.search(r'\d+', chapter or '')
+    chapter_part = chapter_number.group() if chapter_number else _normalize_segment(chapter or '')
+    folder_part = "/".join(_normalize_segment(segment) for segment in folder_segments if segment)
+    return f"{bucket_name}::{folder_part}::chapter {chapter_part}"
+
+
+def _same_version(a: Dict, b: Dict) -> bool:
+    return (a.get("bucket"), a.get("path"), a.get("generation")) == (b.get("bucket"), b.get("path"), b.get("generation"))
+
+
+class ChunkManifest:
+    """
+    Maps logical chapter keys to the resolved blob whose chunks are cached locally,
+    together with the blob generation/etag they were built from.
+    A warm lookup needs no GCS I/O at all; once an entry is older than revalidate_seconds
+    a single metadata GET confirms the generation. If the blob changed or disappeared the
+    entry is dropped and on_stale(entry) lets the owner discard the derived cache files.
+    Entries are persisted as JSON so other workers and restarts share them; each write
+    merges this worker's change into the file under a file lock, so concurrent workers
+    never drop each other's entries.
+    """
+
+    def __init__(self, manifest_path: Optional[str] = CHUNK_MANIFEST_PATH,
+                 revalidate_seconds: float = CHUNK_MANIFEST_REVALIDATE_SECONDS,
+                 on_stale: Optional[Callable[[Dict], None]] = None,
+                 client_factory: Callable[[], storage.Client] = None):
+        self._client_factory = client_factory or get_storage_client
+        self.manifest_path = manifest_path
+        self.revalidate_seconds = revalidate_seconds
+        self.on_stale = on_stale
+        self._entries: Dict[str, Dict] = {}
+        self._disk_mtime = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidations": 0, "stale": 0, "records": 0}
+        self._reload_from_disk()
+
+    def _reload_from_disk(self) -> None:
+        """Pick up entries written by other workers since the last read"""
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+            if mtime == self._disk_mtime:
+                return
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            with self._lock:
+                for key, entry in entries.items():
+                    current = self._entries.get(key)
+                    if current is None or entry.get("validated_at", 0) > current.get("validated_at", 0):
+                        self._entries[key] = entry
+                self._disk_mtime = mtime
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable chunk manifest {self.manifest_path}: {e}")
+
+    def _save(self, key: str, entry: Optional[Dict], removed: Optional[Dict] = None) -> None:
+        """
+        Write one entry (or, with entry None, the removal of `removed`) into the manifest file.
+        The file is re-read under a cross-process lock and only this key is changed, so entries
+        recorded by other workers survive; a removal is skipped if another worker has
+        meanwhile recorded a different blob or generation for the key.
+        """
+        if not self.manifest_path:
+            return
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+            with file_lock(self.manifest_path + ".lock"):
+                entries = {}
+                if os.path.exists(self.manifest_path):
+                    with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+                if entry is not None:
+                    entries[key] = entry
+                elif removed is not None and key in entries and _same_version(entries[key], removed):
+                    del entries[key]
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.manifest_path)
+                mtime = os.path.getmtime(self.manifest_path)
+            with self._lock:
+                for other_key, other in entries.items():
+                    current = self._entries.get(other_key)
+                    if current is None or other.get("validated_at", 0) > current.get("validated_at", 0):
+                        self._entries[other_key] = other
+                self._disk_mtime = mtime
+        except Exception as e:
+            logger.warning(f"Failed to write chunk manifest {self.manifest_path}: {e}")
+
+    def _revalidate(self, key: str, entry: Dict) -> bool:
+        """
+        One metadata call: is the blob still at the generation the chunks were built from?
+        Entries recorded without a generation only need the blob to still exist. A successful
+        check is kept in memory only; every worker re-checks at most once per interval.
+        """
+        self.stats["revalidations"] += 1
+        try:
+            blob = self._client_factory().bucket(entry["bucket"]).get_blob(entry["path"])
+        except Exception as e:
+            # Keep serving the local copy; a GCS outage would fail the cold path anyway
+            logger.warning(f"Could not revalidate gs://{entry['bucket']}/{entry['path']}: {e}")
+            return True
+        if blob is not None and (entry.get("generation") is None or str(blob.generation) == str(entry["generation"])):
+            with self._lock:
+                entry["validated_at"] = time.time()
+            return True
+        logger.info(
+            f"Cached chunks for {key} are stale (generation {entry.get('generation')} -> "
+            f"{blob.generation if blob is not None else 'deleted'})"
+        )
+        return False
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Return the manifest entry for a chapter whose cached chunks are still current, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._reload_from_disk()
+            entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        if time.time() - entry.get("validated_at", 0) > self.revalidate_seconds and not self._revalidate(key, entry):
+            self.stats["stale"] += 1
+            self.stats["misses"] += 1
+            self.invalidate(key)
+            if self.on_stale is not None:
+                try:
+                    self.on_stale(entry)
+                except Exception as e:
+                    logger.warning(f"Failed to discard stale cache for {key}: {e}")
+            return None
+
+        self.stats["hits"] += 1
+        return dict(entry)
+
+    def record(self, key: str, bucket_name: str, blob_path: str, generation=None, etag: Optional[str] = None,
+               chunk_count: Optional[int] = None) -> None:
+        """Remember which blob (and generation) a chapter's cached chunks were built from"""
+        entry = {
+            "bucket": bucket_name,
+            "path": blob_path,
+            "generation": str(generation) if generation is not None else None,
+            "etag": etag,
+            "chunks": chunk_count,
+            "validated_at": time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self.stats["records"] += 1
+        self._save(key, dict(entry))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            removed = self._entries.pop(key, None)
+        if removed is not None:
+            self._save(key, None, removed)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "entries": len(self._entries), "revalidate_seconds": self.revalidate_seconds}
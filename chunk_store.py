@@ -0,0 +1,206 @@
+import os
+import json
+import mmap
+import struct
+import logging
+import threading
+import numpy as np
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# File layout (little endian), every section aligned to 8 bytes:
+#   magic (8) | header length (uint64) | header JSON | offsets int64[n + 1] | metadata ids int32[n] | UTF-8 text blob
+# The header holds the chunk count, the text blob size and the deduplicated metadata table.
+CHUNK_STORE_MAGIC = b"GCHUNK01"
+_HEADER_LENGTH = struct.Struct("<Q")
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def write_chunk_store(path: str, chunks: Iterable[Dict]) -> int:
+    """
+    Serialise chunks ({"text", "metadata"} dicts) to path atomically (temp file + rename).
+    Metadata dicts that repeat across chunks are stored once. Returns the number of chunks.
+    """
+    metadata_table: List[Dict] = []
+    metadata_ids: Dict[str, int] = {}
+    encoded_texts = []
+    chunk_metadata_ids = []
+    for chunk in chunks:
+        metadata = chunk.get('metadata', {}) or {}
+        metadata_json = json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+        if metadata_json not in metadata_ids:
+            metadata_ids[metadata_json] = len(metadata_table)
+            metadata_table.append(metadata)
+        chunk_metadata_ids.append(metadata_ids[metadata_json])
+        encoded_texts.append(chunk.get('text', '').encode('utf-8'))
+
+    count = len(encoded_texts)
+    offsets = np.zeros(count + 1, dtype='<i8')
+    if count:
+        np.cumsum([len(text) for text in encoded_texts], out=offsets[1:])
+    header = json.dumps({
+        "count": count,
+        "text_bytes": int(offsets[-1]),
+        "metadata": metadata_table,
+    }, ensure_ascii=False).encode('utf-8')
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(CHUNK_STORE_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header.ljust(_aligned(len(header)), b' '))
+            f.write(offsets.tobytes())
+            ids_bytes = np.asarray(chunk_metadata_ids, dtype='<i4').tobytes()
+            f.write(ids_bytes.ljust(_aligned(len(ids_bytes)), b'\0'))
+            for text in encoded_texts:
+                f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+class ChunkStore(Sequence):
+    """
+    Read-only, memory-mapped view of a chunk store file.
+    Opening only parses the small header; offsets, metadata ids and text stay in the
+    mapped file, so gunicorn workers reading the same chapter share the OS page cache.
+    Indexing yields the same {"text", "metadata"} dicts that the JSON cache used to hold.
+    close() releases the mapping; a store that is still read afterwards (e.g. by a request
+    that fetched it just before a cache evicted it) maps the file again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._mmap = None
+        self._open()
+
+    def _open(self) -> None:
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            identity = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if getattr(self, '_identity', identity) != identity:
+                raise ValueError(f"{self.path} was replaced after this store was closed")
+            self._identity = identity
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        path = self.path
+        try:
+            if self._mmap[:len(CHUNK_STORE_MAGIC)] != CHUNK_STORE_MAGIC:
+                raise ValueError(f"{path} is not a chunk store file")
+            position = len(CHUNK_STORE_MAGIC)
+            (header_length,) = _HEADER_LENGTH.unpack_from(self._mmap, position)
+            position += _HEADER_LENGTH.size
+            header = json.loads(self._mmap[position:position + header_length].decode('utf-8'))
+            position += _aligned(header_length)
+
+            self._count = header["count"]
+            self.metadata_table: List[Dict] = header["metadata"]
+            self.offsets = np.frombuffer(self._mmap, dtype='<i8', count=self._count + 1, offset=position)
+            position += 8 * (self._count + 1)
+            self.metadata_ids = np.frombuffer(self._mmap, dtype='<i4', count=self._count, offset=position)
+            position += _aligned(4 * self._count)
+            self._text_start = position
+            if self._text_start + header["text_bytes"] > len(self._mmap):
+                raise ValueError(f"{path} is truncated")
+            self._size = len(self._mmap)
+        except Exception:
+            self.offsets = self.metadata_ids = None
+            self._mmap.close()
+            self._mmap = None
+            raise
+
+    def _mapped(self) -> None:
+        """Map the file again if the store was closed; caller holds the lock"""
+        if self._mmap is None:
+            self._open()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def text(self, index: int) -> str:
+        with self._lock:
+            self._mapped()
+            start = self._text_start + int(self.offsets[index])
+            end = self._text_start + int(self.offsets[index + 1])
+            return self._mmap[start:end].decode('utf-8')
+
+    def metadata(self, index: int) -> Dict:
+        with self._lock:
+            self._mapped()
+            return dict(self.metadata_table[int(self.metadata_ids[index])])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("chunk index out of range")
+        return {"text": self.text(index), "metadata": self.metadata(index)}
+
+    def texts(self) -> List[str]:
+        return [self.text(i) for i in range(self._count)]
+
+    def filter_indices(self, filters: Dict) -> List[int]:
+        """
+        Indices of chunks whose metadata matches every filter (case-insensitive), evaluated
+        once per distinct metadata dict instead of once per chunk
+        """
+        matching_ids = [
+            table_id for table_id, metadata in enumerate(self.metadata_table)
+            if all(key in metadata and str(metadata[key]).lower() == str(value).lower() for key, value in filters.items())
+        ]
+        with self._lock:
+            self._mapped()
+            return np.flatnonzero(np.isin(self.metadata_ids, matching_ids)).tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return self._size
+
+    @property
+    def closed(self) -> bool:
+        return self._mmap is None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mmap is None:
+                return
+            # Arrays viewing the map must go first, or mmap refuses to close
+            self.offsets = self.metadata_ids = None
+            self._mmap.close()
+            self._mmap = None
+
+
+def open_chunk_store(path: str) -> Optional[ChunkStore]:
+    """Open a chunk store, or None if the file is missing or unreadable"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return ChunkStore(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable chunk store {path}: {e}")
+        return None
+
+
+def migrate_json_chunks(json_path: str, store_path: str) -> Optional[ChunkStore]:
+    """Convert a legacy JSON chunk cache into a chunk store, removing the JSON file afterwards"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    write_chunk_store(store_path, chunks)
+    try:
+        os.remove(json_path)
+    except FileNotFoundError:
+        # Another worker migrated the same file concurrently
+        pass
+    logger.info(f"Migrated {len(chunks)} chunks from {json_path} to {store_path}")
+    return open_chunk_store(store_path)
@@ -0,0 +1,141 @@
+import os
+import re
+import math
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "semantic" packs sentences across pages up to a token target; "page" keeps the original
+# fixed word slices within a single page
+CHUNK_STRATEGY = os.getenv('CHUNK_STRATEGY', 'semantic').lower()
+CHUNK_TARGET_TOKENS = int(os.getenv('CHUNK_TARGET_TOKENS', '256'))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '48'))
+# Legacy page strategy: words per slice
+CHUNK_PAGE_WORDS = 1000
+
+# Subword tokenizers average roughly 1.3 tokens per English word
+TOKENS_PER_WORD = 1.3
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_BREAK = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9])')
+# Abbreviations common in textbooks that end with a period but not a sentence
+_ABBREVIATION_END = re.compile(r'(?:^|[\s(])(?:fig|figs|eq|no|vol|ch|pp?|vs|etc|approx|i\.e|e\.g|mr|mrs|dr|st)\.$', re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the model token count for text"""
+    return math.ceil(len(text.split()) * TOKENS_PER_WORD)
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """Split a paragraph into sentences, joining the hard line breaks pypdf leaves inside them"""
+    text = " ".join(paragraph.split())
+    sentences = []
+    for piece in _SENTENCE_BREAK.split(text):
+        if sentences and _ABBREVIATION_END.search(sentences[-1]):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        elif piece:
+            sentences.append(piece)
+    return sentences
+
+
+def _page_units(pages: Sequence[Tuple[int, str]], target_tokens: int) -> List[Tuple[str, int, int, bool]]:
+    """
+    Flatten pages into (sentence, page, tokens, starts_paragraph) units.
+    Sentences longer than the target are cut into word windows so no unit overflows a chunk.
+    """
+    max_words = max(1, int(target_tokens / TOKENS_PER_WORD))
+    units = []
+    for page_number, text in pages:
+        for paragraph in _PARAGRAPH_BREAK.split(text or ''):
+            first_in_paragraph = True
+            for sentence in split_sentences(paragraph):
+                words = sentence.split()
+                for start in range(0, len(words), max_words):
+                    piece = " ".join(words[start:start + max_words])
+                    units.append((piece, page_number, estimate_tokens(piece), first_in_paragraph))
+                    first_in_paragraph = False
+    return units
+
+
+def chunk_pages_semantic(pages: Sequence[Tuple[int, str]], metadata: Optional[Dict] = None,
+                         target_tokens: int = CHUNK_TARGET_TOKENS,
+                         overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Dict]:
+    """
+    Pack whole sentences into chunks of about target_tokens, crossing page boundaries.
+    A chunk is closed early at a paragraph break once it is at least 60% full, and each
+    new chunk repeats trailing sentences of the previous one up to overlap_tokens.
+    Chunk metadata records the page range as "page" (first) and "page_end" (last).
+    """
+    metadata = metadata or {}
+    units = _page_units(pages, target_tokens)
+    chunks: List[Dict] = []
+    current: List[Tuple[str, int, int, bool]] = []
+    current_tokens = 0
+    new_units_in_current = 0
+
+    def emit():
+        chunks.append({
+            "text": " ".join(unit[0] for unit in current),
+            "metadata": {**metadata, "page": current[0][1], "page_end": current[-1][1]},
+        })
+
+    for unit in units:
+        _, _, tokens, starts_paragraph = unit
+        full = current_tokens + tokens > target_tokens
+        paragraph_break = starts_paragraph and current_tokens >= 0.6 * target_tokens
+        if new_units_in_current and (full or paragraph_break):
+            emit()
+            # Carry trailing sentences forward as overlap
+            overlap, overlap_size = [], 0
+            for previous in reversed(current):
+                if overlap_size + previous[2] > overlap_tokens or overlap_size + previous[2] + tokens > target_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += previous[2]
+            current, current_tokens, new_units_in_current = overlap, overlap_size, 0
+        current.append(unit)
+        current_tokens += tokens
+        new_units_in_current += 1
+
+    if new_units_in_current:
+        emit()
+    return chunks
+
+
+def chunk_pages_fixed(pages: Sequence[Tuple[int, str]], metadata: Optional[Dict] = None,
+                      chunk_size: int = CHUNK_PAGE_WORDS) -> List[Dict]:
+    """The original strategy: chunk_size-word slices that never cross a page"""
+    metadata = metadata or {}
+    chunks = []
+    for page_number, text in pages:
+        words = (text or '').split()
+        for j in range(0, len(words), chunk_size):
+            chunks.append({
+                "text": ' '.join(words[j:j + chunk_size]),
+                "metadata": {**metadata, "page": page_number},
+            })
+    return chunks
+
+
+def chunk_pages(pages: Sequence[Tuple[int, str]], metadata: Optional[Dict] = None,
+                strategy: Optional[str] = None, chunk_size: int = CHUNK_PAGE_WORDS) -> List[Dict]:
+    """Chunk (page number, text) pairs with the configured strategy"""
+    strategy = (strategy or CHUNK_STRATEGY).lower()
+    if strategy == 'page':
+        return chunk_pages_fixed(pages, metadata, chunk_size=chunk_size)
+    if strategy != 'semantic':
+        logger.warning(f"Unknown CHUNK_STRATEGY '{strategy}'; using semantic chunking")
+    return chunk_pages_semantic(pages, metadata)
+
+
+def assign_chunk_ids(chunks: List[Dict]) -> List[Dict]:
+    """Add page-based chunk ids ("page_3_chunk_2") numbered within each starting page"""
+    per_page: Dict[int, int] = {}
+    for chunk in chunks:
+        page = chunk['metadata'].get('page')
+        per_page[page] = per_page.get(page, 0) + 1
+        chunk['chunk_id'] = f"page_{page}_chunk_{per_page[page]}"
+    return chunks
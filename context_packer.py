@@ -0,0 +1,99 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+from chunking import estimate_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Token budgets for the retrieved context placed in a prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+QUIZ_CONTEXT_TOKEN_BUDGET = int(os.getenv('QUIZ_CONTEXT_TOKEN_BUDGET', '6000'))
+# Word-trigram Jaccard similarity above which a lower-scored chunk counts as a duplicate
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', '0.8'))
+
+
+def _shingles(words: List[str], size: int = 3) -> set:
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def pack_context(scored_chunks: Sequence[Tuple[str, float]], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> Tuple[str, Dict]:
+    """
+    Assemble prompt context from (text, score) pairs: highest score first, near-duplicates
+    (e.g. overlapping neighbours from the chunker) dropped, and chunks added while they fit
+    token_budget. If even the best chunk is too large it is cut to the budget.
+    Returns the context string and a summary of what was kept.
+    """
+    ordered = sorted(scored_chunks, key=lambda item: item[1], reverse=True)
+    kept_texts, kept_shingles = [], []
+    used_tokens = duplicates = over_budget = 0
+    truncated = False
+
+    for text, _ in ordered:
+        words = text.split()
+        if not words:
+            continue
+        shingles = _shingles([word.lower() for word in words])
+        if any(len(shingles & other) / len(shingles | other) >= dedup_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+
+        tokens = estimate_tokens(text)
+        if used_tokens + tokens > token_budget:
+            if kept_texts:
+                over_budget += 1
+                continue
+            # Keep as much of the single best chunk as the budget allows
+            words = words[:max(1, int(len(words) * token_budget / tokens))]
+            tokens = estimate_tokens(" ".join(words))
+            truncated = True
+        kept_texts.append(" ".join(words))
+        kept_shingles.append(shingles)
+        used_tokens += tokens
+
+    summary = {
+        "chunks_in": len(ordered),
+        "chunks_used": len(kept_texts),
+        "duplicates_dropped": duplicates,
+        "over_budget_dropped": over_budget,
+        "truncated": truncated,
+        "context_tokens": used_tokens,
+        "token_budget": token_budget,
+    }
+    return " ".join(kept_texts), summary
+
+
+class PromptTokenStats:
+    """Per-source running totals of estimated prompt tokens sent to Gemini"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, source: str, prompt: str) -> int:
+        """Estimate and record the token count of a prompt; returns the estimate"""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._stats.setdefault(source, {"requests": 0, "total_tokens": 0, "max_tokens": 0})
+            stats["requests"] += 1
+            stats["total_tokens"] += tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+            stats["last_tokens"] = tokens
+        logger.info(f"Prompt for {source}: ~{tokens} tokens")
+        return tokens
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                source: {**stats, "mean_tokens": round(stats["total_tokens"] / stats["requests"], 1)}
+                for source, stats in self._stats.items()
+            }
+
+
+# Shared by app.py, the chat blueprints and the enhanced services
+prompt_token_stats = PromptTokenStats()
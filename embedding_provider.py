@@ -0,0 +1,103 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+# After a failed load, callers fail fast for this long before the next attempt
+EMBEDDING_MODEL_RETRY_SECONDS = float(os.getenv('EMBEDDING_MODEL_RETRY_SECONDS', '30'))
+
+# One model instance per name, shared by app.py, the chat blueprints and VertexAIRAG
+_models: Dict[str, object] = {}
+_model_stats: Dict[str, Dict] = {}
+_failures: Dict[str, Tuple[float, Exception]] = {}  # name -> (failed at, error) of the last failed load
+_lock = threading.Lock()
+
+
+def _estimate_model_bytes(model) -> int:
+    """Sum the parameter and buffer storage of a torch-backed model"""
+    try:
+        total = 0
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+    except Exception as e:
+        logger.warning(f"Could not estimate embedding model memory: {e}")
+        return 0
+
+
+def _raise_if_backing_off(model_name: str) -> None:
+    failure = _failures.get(model_name)
+    if failure is None:
+        return
+    failed_at, error = failure
+    retry_in = failed_at + EMBEDDING_MODEL_RETRY_SECONDS - time.time()
+    if retry_in > 0:
+        raise RuntimeError(
+            f"Embedding model '{model_name}' failed to load ({error}); retrying in {retry_in:.0f}s"
+        )
+
+
+def get_embedding_model(model_name: Optional[str] = None):
+    """
+    Return the process-wide SentenceTransformer, loading it on first use.
+    Safe to call from any thread; concurrent first callers wait for a single load.
+    A failed load is remembered: for EMBEDDING_MODEL_RETRY_SECONDS callers get a
+    RuntimeError straight away instead of queueing behind another full load attempt.
+    """
+    model_name = model_name or DEFAULT_EMBEDDING_MODEL
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    _raise_if_backing_off(model_name)
+
+    with _lock:
+        model = _models.get(model_name)
+        if model is not None:
+            return model
+        _raise_if_backing_off(model_name)
+
+        stats = _model_stats.setdefault(model_name, {
+            "load_count": 0,
+            "load_failures": 0,
+            "load_seconds": 0.0,
+            "memory_bytes": 0,
+        })
+        start = time.perf_counter()
+        try:
+            # Imported here so processes that never embed do not pay for torch at import time
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+        except Exception as e:
+            stats["load_failures"] += 1
+            _failures[model_name] = (time.time(), e)
+            logger.error(f"Failed to load embedding model '{model_name}': {e}")
+            raise
+        _failures.pop(model_name, None)
+
+        stats["load_count"] += 1
+        stats["load_seconds"] = round(time.perf_counter() - start, 3)
+        stats["memory_bytes"] = _estimate_model_bytes(model)
+        _models[model_name] = model
+        logger.info(
+            f"Embedding model '{model_name}' loaded in {stats['load_seconds']}s "
+            f"({stats['memory_bytes'] / (1024 * 1024):.1f} MiB)"
+        )
+        return model
+
+
+def get_embedding_model_stats() -> Dict:
+    """Report load counts, load time and memory use for every model requested so far"""
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "models": {
+                name: {**stats, "loaded": name in _models,
+                       "last_error": str(_failures[name][1]) if name in _failures else None}
+                for name, stats in _model_stats.items()
+            }
+        }
@@ -0,0 +1,91 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Hashable
+
+from google.cloud import storage
+from vertexai.generative_models import GenerativeModel
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Keep-alive connections per host for the shared storage client's HTTP session
+GCS_HTTP_POOL_SIZE = int(os.getenv('GCS_HTTP_POOL_SIZE', '32'))
+
+
+class ClientPool:
+    """
+    Process-wide registry of long-lived clients, created once per key per worker.
+    Instances are rebuilt after a fork (gunicorn pre-fork) because gRPC/HTTP
+    connections must not be shared across processes.
+    """
+
+    def __init__(self):
+        self._instances: Dict[Hashable, object] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.stats = {"hits": 0, "misses": 0, "creation_seconds": 0.0}
+
+    def get(self, key: Hashable, factory: Callable[[], object]):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._instances.clear()
+                    self._pid = os.getpid()
+
+        instance = self._instances.get(key)
+        if instance is not None:
+            self.stats["hits"] += 1
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is not None:
+                self.stats["hits"] += 1
+                return instance
+            start = time.perf_counter()
+            instance = factory()
+            elapsed = time.perf_counter() - start
+            self.stats["misses"] += 1
+            self.stats["creation_seconds"] = round(self.stats["creation_seconds"] + elapsed, 4)
+            self._instances[key] = instance
+            logger.info(f"Created pooled client {key!r} in {elapsed:.3f}s")
+            return instance
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "instances": len(self._instances), "pid": self._pid}
+
+
+_storage_pool = ClientPool()
+_model_pool = ClientPool()
+
+
+def _create_storage_client() -> storage.Client:
+    client = storage.Client()
+    try:
+        # Widen the keep-alive pool so concurrent downloads reuse TLS connections
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=GCS_HTTP_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE)
+        client._http.mount("https://", adapter)
+    except Exception as e:
+        logger.warning(f"Could not resize storage HTTP connection pool: {e}")
+    return client
+
+
+def get_storage_client() -> storage.Client:
+    """Shared Cloud Storage client for this worker"""
+    return _storage_pool.get("storage", _create_storage_client)
+
+
+def get_generative_model(model_name: str = "gemini-2.0-flash-001") -> GenerativeModel:
+    """Shared Gemini model handle for this worker, one per model name"""
+    return _model_pool.get(model_name, lambda: GenerativeModel(model_name))
+
+
+def get_client_pool_stats() -> Dict:
+    """Hit/miss counters and total creation time for the storage and model pools"""
+    return {
+        "storage": _storage_pool.get_stats(),
+        "generative_models": _model_pool.get_stats(),
+    }
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from google.cloud import storage
+
+from gcp_clients import get_storage_client
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RESOLVER_TTL_SECONDS = float(os.getenv('GCS_RESOLVER_TTL_SECONDS', '3600'))
+# Folder listings also answer "not found", so they expire much sooner than resolved paths
+RESOLVER_LISTING_TTL_SECONDS = float(os.getenv('GCS_RESOLVER_LISTING_TTL_SECONDS', '60'))
+RESOLVER_MAX_ENTRIES = int(os.getenv('GCS_RESOLVER_MAX_ENTRIES', '2048'))
+# Optional JSON file so resolved paths survive worker restarts (e.g. /tmp/gcs_paths.json)
+RESOLVER_DISK_CACHE = os.getenv('GCS_RESOLVER_DISK_CACHE')
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after ttl_seconds"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (value, stored_at if stored_at is not None else time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def items(self) -> List[tuple]:
+        with self._lock:
+            return [(key, value, stored_at) for key, (value, stored_at) in self._entries.items()]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class BlobPathResolver:
+    """
+    Resolve a list of candidate blob names (filename/folder variations) to the one that exists.
+    Each distinct folder is listed once with a single list_blobs call and the candidates are
+    matched locally, instead of one blob.exists() round-trip per variation. Resolved paths
+    and folder listings are cached in-memory (LRU + TTL), resolved paths optionally on disk.
+    Listings get a short TTL, and a miss against a cached listing lists again once, so a
+    PDF uploaded after the folder was listed is found straight away.
+    """
+
+    def __init__(self, client_factory: Callable[[], storage.Client] = None,
+                 ttl_seconds: float = RESOLVER_TTL_SECONDS,
+                 max_entries: int = RESOLVER_MAX_ENTRIES,
+                 disk_cache_path: Optional[str] = RESOLVER_DISK_CACHE,
+                 listing_ttl_seconds: float = RESOLVER_LISTING_TTL_SECONDS):
+        self._client_factory = client_factory or get_storage_client
+        self.resolved = TTLCache(max_entries, ttl_seconds)
+        self.listings = TTLCache(max_entries, listing_ttl_seconds)
+        self.disk_cache_path = disk_cache_path
+        self._disk_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "list_calls": 0, "relists": 0, "exists_calls": 0, "not_found": 0}
+        self._load_disk_cache()
+
+    @property
+    def client(self) -> storage.Client:
+        # The factory is expected to be cheap (the default returns the pooled client)
+        return self._client_factory()
+
+    @staticmethod
+    def _cache_key(bucket_name: str, candidate_paths: List[str]) -> str:
+        return bucket_name + "::" + "|".join(candidate_paths)
+
+    def _load_disk_cache(self) -> None:
+        if not self.disk_cache_path or not os.path.exists(self.disk_cache_path):
+            return
+        try:
+            with open(self.disk_cache_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            for key, entry in entries.items():
+                self.resolved.set(key, entry["path"], stored_at=entry["resolved_at"])
+            logger.info(f"Loaded {len(entries)} resolved GCS paths from {self.disk_cache_path}")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable GCS path cache {self.disk_cache_path}: {e}")
+
+    def _save_disk_cache(self) -> None:
+        if not self.disk_cache_path:
+            return
+        entries = {
+            key: {"path": path, "resolved_at": stored_at}
+            for key, path, stored_at in self.resolved.items()
+        }
+        tmp_path = f"{self.disk_cache_path}.{os.getpid()}.tmp"
+        try:
+            with self._disk_lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.disk_cache_path)
+        except Exception as e:
+            logger.warning(f"Failed to write GCS path cache {self.disk_cache_path}: {e}")
+
+    def _list_folder(self, bucket_name: str, folder_prefix: str, refresh: bool = False) -> Tuple[set, bool]:
+        """
+        Names of the blobs directly inside folder_prefix, from cache or one list_blobs call,
+        and whether they came from the cache
+        """
+        listing_key = f"{bucket_name}::{folder_prefix}"
+        names = None if refresh else self.listings.get(listing_key)
+        if names is not None:
+            return names, True
+        self.stats["list_calls"] += 1
+        blobs = self.client.list_blobs(bucket_name, prefix=folder_prefix, delimiter='/')
+        names = {blob.name for blob in blobs}
+        self.listings.set(listing_key, names)
+        return names, False
+
+    def _resolve_from_listings(self, bucket_name: str, candidate_paths: List[str]) -> Optional[str]:
+        folder_prefixes = list(dict.fromkeys(
+            path.rsplit('/', 1)[0] + '/' if '/' in path else '' for path in candidate_paths
+        ))
+        for refresh in (False, True):
+            existing, any_cached = set(), False
+            for folder_prefix in folder_prefixes:
+                names, cached = self._list_folder(bucket_name, folder_prefix, refresh)
+                existing |= names
+                any_cached = any_cached or cached
+            resolved = next((path for path in candidate_paths if path in existing), None)
+            # Only a cached listing can be out of date; fresh ones are authoritative
+            if resolved is not None or not any_cached:
+                return resolved
+            self.stats["relists"] += 1
+        return None
+
+    def _probe_serially(self, bucket_name: str, candidate_paths: List[str]) -> Optional[str]:
+        """Fallback when listing is not permitted: one exists() check per candidate"""
+        bucket = self.client.bucket(bucket_name)
+        for path in candidate_paths:
+            self.stats["exists_calls"] += 1
+            if bucket.blob(path).exists():
+                return path
+        return None
+
+    def resolve(self, bucket_name: str, candidate_paths: List[str]) -> Optional[str]:
+        """
+        Return the first candidate (in the given priority order) that exists in the bucket,
+        or None if none of them do
+        """
+        candidate_paths = list(dict.fromkeys(candidate_paths))
+        key = self._cache_key(bucket_name, candidate_paths)
+        cached = self.resolved.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+        self.stats["misses"] += 1
+
+        try:
+            resolved = self._resolve_from_listings(bucket_name, candidate_paths)
+        except Exception as e:
+            logger.warning(f"Listing gs://{bucket_name} failed ({e}); probing candidates one by one")
+            resolved = self._probe_serially(bucket_name, candidate_paths)
+
+        if resolved is None:
+            self.stats["not_found"] += 1
+            logger.info(f"No blob found in gs://{bucket_name} for candidates: {candidate_paths}")
+            return None
+
+        logger.info(f"Resolved gs://{bucket_name}/{resolved}")
+        self.resolved.set(key, resolved)
+        self._save_disk_cache()
+        return resolved
+
+    def invalidate(self, bucket_name: str, candidate_paths: List[str]) -> None:
+        """Forget a resolution (and its folder listings) after the blob turned out to be gone"""
+        candidate_paths = list(dict.fromkeys(candidate_paths))
+        self.resolved.pop(self._cache_key(bucket_name, candidate_paths))
+        for path in candidate_paths:
+            folder_prefix = path.rsplit('/', 1)[0] + '/' if '/' in path else ''
+            self.listings.pop(f"{bucket_name}::{folder_prefix}")
+        self._save_disk_cache()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "cached_paths": len(self.resolved), "cached_folders": len(self.listings)}
+
+
+# Shared by app.py and the chat blueprints
+path_resolver = BlobPathResolver()
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import Callable, Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by every worker process on the instance
+INGEST_DB_PATH = os.getenv('INGEST_DB_PATH', '/tmp/ingest_jobs.sqlite3')
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '2'))
+# A running job whose progress has not moved for this long is assumed orphaned and requeued
+INGEST_STALE_SECONDS = float(os.getenv('INGEST_STALE_SECONDS', '600'))
+# Succeeded and failed jobs are deleted this long after they finish
+INGEST_RETENTION_SECONDS = float(os.getenv('INGEST_RETENTION_SECONDS', str(7 * 24 * 3600)))
+INGEST_POLL_SECONDS = 1.0
+INGEST_PRUNE_INTERVAL_SECONDS = 300.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobProgress:
+    """Handed to job handlers to report the current stage and page progress"""
+
+    # Page updates closer together than this are coalesced into one write
+    MIN_WRITE_INTERVAL = 0.5
+
+    def __init__(self, job_queue: "IngestionQueue", job_id: str):
+        self._queue = job_queue
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def stage(self, name: str) -> None:
+        logger.info(f"Ingest job {self.job_id}: {name}")
+        self._queue._update(self.job_id, stage=name)
+        self._last_write = time.time()
+
+    def pages(self, done: int, total: int) -> None:
+        now = time.time()
+        if done < total and now - self._last_write < self.MIN_WRITE_INTERVAL:
+            return
+        self._queue._update(self.job_id, pages_done=done, pages_total=total)
+        self._last_write = now
+
+
+class IngestionQueue:
+    """
+    Persistent job queue backed by SQLite, with a small pool of in-process worker threads.
+    Handlers are registered per job kind and called as handler(payload, progress).
+    Any worker process sharing the database file can claim a job, and any of them can
+    report its status; local jobs (whose result lives in this process's memory) are only
+    claimed by the process that submitted them, even when requeued after stalling. Submitting
+    a key that already has a queued or running job returns that job instead of creating a
+    duplicate. Finished jobs are pruned after retention_seconds.
+    """
+
+    def __init__(self, db_path: str = INGEST_DB_PATH, workers: int = INGEST_WORKERS,
+                 stale_seconds: float = INGEST_STALE_SECONDS,
+                 retention_seconds: float = INGEST_RETENTION_SECONDS):
+        self.db_path = db_path
+        self.workers = workers
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_seconds
+        self._last_prune = 0.0
+        self._handlers: Dict[str, Callable[[Dict, JobProgress], Optional[Dict]]] = {}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._init_db()
+
+    @staticmethod
+    def _owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    owner TEXT,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    pages_done INTEGER DEFAULT 0,
+                    pages_total INTEGER DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+
+    def register(self, kind: str, handler: Callable[[Dict, JobProgress], Optional[Dict]]) -> None:
+        self._handlers[kind] = handler
+
+    def ensure_started(self) -> None:
+        """Start the worker threads for this process (again after a fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"ingest-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+            logger.info(f"Started {self.workers} ingestion workers on {self.db_path}")
+
+    def submit(self, kind: str, key: str, payload: Dict, local: bool = False) -> Dict:
+        """Queue a job (or return the active one for the same key) and return its status"""
+        if kind not in self._handlers:
+            raise ValueError(f"No ingestion handler registered for '{kind}'")
+        self.ensure_started()
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            existing = connection.execute(
+                f"SELECT * FROM jobs WHERE key = ? AND status IN ({','.join('?' * len(ACTIVE_STATUSES))}) "
+                "ORDER BY created_at LIMIT 1",
+                (key, *ACTIVE_STATUSES)
+            ).fetchone()
+            if existing is not None:
+                connection.execute("COMMIT")
+                return self._to_dict(existing)
+            job_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO jobs (id, kind, key, payload, owner, status, stage, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, kind, key, json.dumps(payload), self._owner() if local else None, now, now)
+            )
+            connection.execute("COMMIT")
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def get_stats(self) -> Dict:
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {"jobs": {row["status"]: row["n"] for row in rows}, "workers": self.workers,
+                "worker_pid": self._pid}
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "key": row["key"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "pages_done": row["pages_done"],
+            "pages_total": row["pages_total"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    @staticmethod
+    def _owner_alive(owner: str) -> bool:
+        """False only for an owner on this host whose process has exited"""
+        host, _, pid = owner.rpartition(":")
+        if host != socket.gethostname():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, ValueError):
+            pass
+        return True
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            # Jobs left running by a stalled or dead worker are picked up again; local jobs keep
+            # their owner, since only that process can serve their result
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', stage = 'requeued' "
+                "WHERE status = 'running' AND updated_at < ?",
+                (now - self.stale_seconds,)
+            )
+            owners = connection.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status = 'queued' AND owner IS NOT NULL"
+            ).fetchall()
+            for (owner,) in owners:
+                if not self._owner_alive(owner):
+                    connection.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? "
+                        "WHERE status = 'queued' AND owner = ?",
+                        ("The worker process that owned this job exited; submit it again", now, owner)
+                    )
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND (owner IS NULL OR owner = ?) "
+                "ORDER BY created_at LIMIT 1",
+                (self._owner(),)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', stage = 'starting', updated_at = ? WHERE id = ?",
+                    (now, row["id"])
+                )
+            connection.execute("COMMIT")
+        return row
+
+    def _prune(self) -> None:
+        """Delete succeeded and failed jobs older than the retention period"""
+        now = time.time()
+        if now - self._last_prune < INGEST_PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        with closing(self._connect()) as connection:
+            deleted = connection.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                (now - self.retention_seconds,)
+            ).rowcount
+        if deleted:
+            logger.info(f"Pruned {deleted} finished ingestion jobs")
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                self._prune()
+                row = self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim ingestion job: {e}", exc_info=True)
+                row = None
+            if row is None:
+                self._wake.wait(INGEST_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(row)
+
+    def _run(self, row: sqlite3.Row) -> None:
+        job_id = row["id"]
+        handler = self._handlers.get(row["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"No ingestion handler registered for '{row['kind']}'")
+            result = handler(json.loads(row["payload"]), JobProgress(self, job_id))
+            self._update(job_id, status="succeeded", stage="done", result=json.dumps(result or {}))
+            logger.info(f"Ingest job {job_id} ({row['key']}) succeeded")
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} ({row['key']}) failed: {str(e)}", exc_info=True)
+            self._update(job_id, status="failed", error=str(e))
+
+
+# Shared by app.py's submit endpoints and the ingest job API
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Gemini calls allowed in flight per worker process
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+# Calls allowed to wait for a free slot before new ones are rejected
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '64'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+
+_STREAM_END = object()
+
+
+class LLMTimeoutError(TimeoutError):
+    """The model did not answer within the per-call timeout"""
+
+
+class LLMOverloadedError(RuntimeError):
+    """Too many generations are already running or queued in this worker"""
+
+
+class LLMExecutor:
+    """
+    Bounded thread pool for blocking Gemini calls.
+    At most max_concurrency calls run at once and at most max_queue more may wait; beyond
+    that submissions fail fast with LLMOverloadedError instead of piling up. Callers wait
+    with a per-call timeout, so one slow generation cannot pin a request thread forever.
+    The pool is recreated after a fork (gunicorn pre-fork).
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 timeout_seconds: float = LLM_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "rejected": 0,
+                      "total_wait_seconds": 0.0, "total_run_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+                    self._pid = os.getpid()
+                    self._queued = self._active = 0
+        return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule fn on the pool; raises LLMOverloadedError when the queue is full"""
+        executor = self._get_executor()
+        with self._lock:
+            if self._active + self._queued >= self.max_concurrency + self.max_queue:
+                self.stats["rejected"] += 1
+                raise LLMOverloadedError(
+                    f"{self._active} generations running and {self._queued} queued; try again shortly"
+                )
+            self._queued += 1
+            self.stats["submitted"] += 1
+        submitted_at = time.perf_counter()
+
+        def tracked():
+            started_at = time.perf_counter()
+            waited = started_at - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self.stats["total_wait_seconds"] += waited
+                self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            try:
+                result = fn(*args, **kwargs)
+                with self._lock:
+                    self.stats["completed"] += 1
+                return result
+            except Exception:
+                with self._lock:
+                    self.stats["failed"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self.stats["total_run_seconds"] += time.perf_counter() - started_at
+
+        return executor.submit(tracked)
+
+    def _wait(self, future: Future, timeout: Optional[float]):
+        timeout = self.timeout_seconds if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # A call still queued is dropped; a running one keeps its slot until the SDK returns
+            cancelled = future.cancel()
+            with self._lock:
+                if cancelled:
+                    self._queued -= 1
+                self.stats["timeouts"] += 1
+            raise LLMTimeoutError(f"Model call did not finish within {timeout:.1f}s")
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Run fn on the pool and wait for its result (raises LLMTimeoutError / LLMOverloadedError)"""
+        return self._wait(self.submit(fn, *args, **kwargs), timeout)
+
+    def generate_content(self, model, prompt, timeout: Optional[float] = None, **kwargs):
+        """model.generate_content(prompt) on the pool"""
+        return self.run(model.generate_content, prompt, timeout=timeout, **kwargs)
+
+    def stream(self, make_iterator: Callable[[], Iterator], timeout: Optional[float] = None) -> Iterator:
+        """
+        Consume a streaming response on the pool, yielding its items to the caller.
+        The slot is held for the whole stream; timeout applies to the wait for each item.
+        """
+        timeout = self.timeout_seconds if timeout is None else timeout
+        items: "queue.Queue" = queue.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for item in make_iterator():
+                    if cancelled.is_set():
+                        break
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+                raise
+            finally:
+                items.put(_STREAM_END)
+
+        self.submit(produce)
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self.stats["timeouts"] += 1
+                    raise LLMTimeoutError(f"No streamed output within {timeout:.1f}s")
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Client went away or timed out: let the producer stop at the next item
+            cancelled.set()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            finished = self.stats["completed"] + self.stats["failed"]
+            started = finished + self._active
+            return {
+                **{key: round(value, 4) if isinstance(value, float) else value for key, value in self.stats.items()},
+                "active": self._active,
+                "queued": self._queued,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout_seconds,
+                "mean_wait_seconds": round(self.stats["total_wait_seconds"] / started, 4) if started else 0.0,
+            }
+
+
+# Shared by app.py, the chat blueprints and the enhanced services
+llm_executor = LLMExecutor()
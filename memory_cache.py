@@ -0,0 +1,162 @@
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Byte budget for parsed chapter chunks held in each worker
+CHUNK_MEMORY_CACHE_MAX_BYTES = int(os.getenv('CHUNK_MEMORY_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+
+def estimate_size(value, _seen=None) -> int:
+    """
+    Approximate resident size of a cached value in bytes.
+    numpy arrays count their buffer, objects exposing nbytes (ChunkStore, EmbeddingMatrix)
+    report themselves, and containers are walked recursively.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return sys.getsizeof(value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    return size
+
+
+class ByteBudgetCache:
+    """
+    Thread-safe cache bounded by the estimated byte size of its values rather than entry count.
+    policy "lru" evicts the least recently used entry; "lfu" evicts the entry with the fewest
+    hits since it was cached (least recently used among equals), which keeps a few popular
+    chapters resident while one-off lookups churn.
+    Each entry carries a version (e.g. file mtime); a get with a different version is a miss.
+    Values larger than the whole budget are not cached.
+    on_evict(key, value) is called, outside the lock, for every value that leaves the cache
+    (evicted, stale, replaced or popped), e.g. to release the resources a value holds.
+    """
+
+    def __init__(self, max_bytes: int = CHUNK_MEMORY_CACHE_MAX_BYTES, policy: str = "lru",
+                 on_evict: Optional[Callable[[Hashable, object], None]] = None):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}' (expected one of {EVICTION_POLICIES})")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (version, value, size)
+        self._hits: Dict[Hashable, int] = {}  # key -> hits since cached, for LFU
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "evicted_bytes": 0}
+
+    def _remove(self, key: Hashable) -> Optional[tuple]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+            self._hits.pop(key, None)
+        return entry
+
+    def _evict_one(self) -> tuple:
+        if self.policy == "lfu":
+            # Iteration order is recency, so min() picks the least recently used of the least used
+            key = min(self._entries, key=lambda k: self._hits.get(k, 0))
+        else:
+            key = next(iter(self._entries))
+        entry = self._remove(key)
+        self.stats["evictions"] += 1
+        self.stats["evicted_bytes"] += entry[2]
+        return key, entry[1]
+
+    def _notify(self, removed: List[tuple]) -> None:
+        if self.on_evict is None:
+            return
+        for key, value in removed:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                logger.warning(f"on_evict failed for {key!r}: {e}")
+
+    def get(self, key: Hashable, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            stale = entry[0] != version
+            if stale:
+                self._remove(key)
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits[key] = self._hits.get(key, 0) + 1
+                self.stats["hits"] += 1
+        if stale:
+            self._notify([(key, entry[1])])
+            return None
+        return entry[1]
+
+    def peek(self, key: Hashable, version=None):
+        """Like get, but without touching the statistics or the entry's recency"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None and entry[0] == version else None
+
+    def set(self, key: Hashable, value, version=None, size: Optional[int] = None) -> bool:
+        """Cache value under key, evicting entries by the cache's policy to stay within budget"""
+        size = estimate_size(value) if size is None else size
+        removed = []
+        with self._lock:
+            previous = self._remove(key)
+            if previous is not None and previous[1] is not value:
+                removed.append((key, previous[1]))
+            cached = size <= self.max_bytes
+            if cached:
+                while self._entries and self._bytes + size > self.max_bytes:
+                    removed.append(self._evict_one())
+                self._entries[key] = (version, value, size)
+                self._bytes += size
+        if not cached:
+            logger.info(f"Not caching {key!r}: {size} bytes exceeds the {self.max_bytes} byte budget")
+        self._notify(removed)
+        return cached
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._remove(key)
+        if entry is not None:
+            self._notify([(key, entry[1])])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "occupancy": round(self._bytes / self.max_bytes, 4) if self.max_bytes else 0.0,
+                "policy": self.policy,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
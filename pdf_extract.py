@@ -0,0 +1,147 @@
+import io
+import os
+import sys
+import types
+import logging
+import tempfile
+import threading
+import traceback
+import multiprocessing
+import multiprocessing.context
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Below this many pages the process start-up and PDF re-parsing cost more than they save
+PDF_EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv('PDF_EXTRACT_PARALLEL_MIN_PAGES', '16'))
+
+# (page number starting at 1, extracted text or None, formatted error or None)
+PageText = Tuple[int, Optional[str], Optional[str]]
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# Stands in for __main__ while a pool process is started; see _ExtractProcess
+_bare_main = types.ModuleType('__main__')
+_main_swap_lock = threading.Lock()
+
+
+class _ExtractProcess(multiprocessing.context.ForkServerProcess):
+    """
+    Pool process that does not re-run the parent's main script. multiprocessing tells every
+    non-forked child to import the parent's __main__ (as __mp_main__), which under
+    `python app.py` would repeat app.py's whole start-up (Vertex AI, Firebase, services,
+    manifest) in each extraction worker. The start-up data is taken from sys.modules['__main__']
+    while the process is launched, so a bare module is put there for that moment.
+    """
+
+    @staticmethod
+    def _Popen(process_obj):
+        with _main_swap_lock:
+            main_module = sys.modules['__main__']
+            sys.modules['__main__'] = _bare_main
+            try:
+                return multiprocessing.context.ForkServerProcess._Popen(process_obj)
+            finally:
+                sys.modules['__main__'] = main_module
+
+
+class _ExtractContext(multiprocessing.context.ForkServerContext):
+    Process = _ExtractProcess
+
+
+def _extract_pages(reader: PdfReader, start: int, end: int,
+                   on_progress: Optional[Callable[[int, int], None]] = None) -> List[PageText]:
+    results = []
+    for index in range(start, end):
+        try:
+            results.append((index + 1, reader.pages[index].extract_text(), None))
+        except Exception:
+            results.append((index + 1, None, traceback.format_exc()))
+        if on_progress:
+            on_progress(index + 1, end)
+    return results
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[PageText]:
+    """Worker entry point: parse the PDF file once and extract pages [start, end)"""
+    with open(pdf_path, 'rb') as f:
+        return _extract_pages(PdfReader(f), start, end)
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    """
+    One pool per worker process; recreated after a fork so children never share it.
+    Children are not forked from the server process: by now it holds the embedding model and
+    runs ingestion, LLM and quiz threads whose locks a forked child could inherit held. They
+    come from a fork server that has imported only this module (and pypdf).
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            context = _ExtractContext()
+            context.set_forkserver_preload([__name__])
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def extract_page_texts(pdf_bytes: bytes, max_workers: Optional[int] = None,
+                       min_pages_for_parallel: Optional[int] = None,
+                       on_progress: Optional[Callable[[int, int], None]] = None) -> List[PageText]:
+    """
+    Extract the text of every page, in page order.
+    Documents with at least min_pages_for_parallel pages are split into one contiguous page
+    range per worker and extracted on a process pool from a temporary copy of the PDF, so the
+    bytes are not pickled per task; smaller ones (or a failing pool) run serially.
+    Per-page failures are returned rather than raised so callers can log them.
+    on_progress(pages_done, page_count) is called as pages (or page ranges) finish.
+    """
+    max_workers = max_workers or PDF_EXTRACT_WORKERS
+    if min_pages_for_parallel is None:
+        min_pages_for_parallel = PDF_EXTRACT_PARALLEL_MIN_PAGES
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+    if max_workers <= 1 or page_count < min_pages_for_parallel:
+        return _extract_pages(reader, 0, page_count, on_progress)
+
+    # Every worker parses the whole PDF once, so give each exactly one range
+    range_count = min(page_count, max_workers)
+    bounds = [page_count * i // range_count for i in range(range_count + 1)]
+    pdf_path = None
+    try:
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(pdf_bytes)
+            pdf_path = f.name
+        executor = _get_executor(max_workers)
+        futures = [
+            executor.submit(_extract_page_range, pdf_path, bounds[i], bounds[i + 1])
+            for i in range(range_count)
+        ]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+            if on_progress:
+                on_progress(len(results), page_count)
+        return results
+    except Exception as e:
+        logger.warning(f"Parallel PDF extraction failed ({e}); extracting {page_count} pages serially")
+        _reset_executor()
+        return _extract_pages(reader, 0, page_count, on_progress)
+    finally:
+        if pdf_path is not None:
+            os.remove(pdf_path)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Pre-warm the chapter cache for every chapter we serve.
+Walks chapter_mapping_quiz.json and SUBJECT_CHAPTER_DATA, resolves each chapter PDF with the
+quiz route's filename variations and builds its chunk store, embedding matrix and manifest entry
+in --output-dir through the same build_chapter_chunks path the app uses. Point CHUNKS_CACHE_DIR
+at that directory (baked into the image or mounted) and the first student never waits on GCS.
+Progress is saved after every chapter, so an interrupted run resumes where it stopped.
+
+    python prewarm.py --output-dir ./chunks_cache --workers 4 [--board NCERT --class 10 --subject Science]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_BUCKET = "guru-ai-bucket"
+STATE_FILENAME = "prewarm_state.json"
+# Stages reported by build_chapter_chunks, in pipeline order
+STAGES = ["resolving", "waiting_for_lock", "downloading", "extracting", "embedding"]
+
+
+class StageClock:
+    """Progress sink for build_chapter_chunks that times each stage and remembers the page count"""
+
+    def __init__(self):
+        self.durations = {}
+        self.page_count = 0
+        self._stage = None
+        self._started = time.perf_counter()
+
+    def stage(self, name):
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.durations[self._stage] = self.durations.get(self._stage, 0.0) + now - self._started
+        self._stage, self._started = name, now
+
+    def pages(self, done, total):
+        self.page_count = total
+
+    def finish(self):
+        self.stage(None)
+
+
+def iter_chapters(mapping):
+    """
+    Yield (board, class, subject, literature_type, chapter) from either mapping shape:
+    subject -> [chapters] / {chapter: title}, or subject -> {literature_type: chapters}
+    """
+    for board, classes in mapping.items():
+        for class_name, subjects in classes.items():
+            for subject, value in subjects.items():
+                if isinstance(value, dict) and value and all(isinstance(v, (dict, list)) for v in value.values()):
+                    for literature_type, chapters in value.items():
+                        for chapter in chapters:
+                            yield board, class_name, subject, literature_type, chapter
+                else:
+                    for chapter in value:
+                        yield board, class_name, subject, "", chapter
+
+
+def collect_chapters(app_module, bucket, source, board=None, class_level=None, subject=None):
+    """Chapters from the selected mappings, deduplicated by manifest key and filtered"""
+    mappings = []
+    if source in ("quiz", "all"):
+        mappings.append(app_module.chapter_mapping)
+    if source in ("subjects", "all"):
+        mappings.append(app_module.SUBJECT_CHAPTER_DATA)
+
+    chapters = {}
+    for mapping in mappings:
+        for entry in iter_chapters(mapping):
+            entry_board, class_name, entry_subject, literature_type, chapter = entry
+            if board and entry_board != board:
+                continue
+            if class_level and class_name != f"Class {class_level}":
+                continue
+            if subject and entry_subject.strip().lower() != subject.lower():
+                continue
+            folder = [entry_board, class_name, entry_subject] + ([literature_type] if literature_type else [])
+            chapters.setdefault(app_module.chapter_key(bucket, folder, chapter), entry)
+    return chapters
+
+
+def prewarm_chapter(app_module, bucket, key, entry):
+    """Build one chapter's cache files; returns its state record"""
+    board, class_name, subject, literature_type, chapter = entry
+    number = re.search(r'\d+', chapter)
+    folder = [board, class_name, subject] + ([literature_type] if literature_type else [])
+    candidate_paths = app_module.build_candidate_paths(
+        "/".join(folder) + "/", app_module.quiz_filename_variations(number.group() if number else chapter)
+    )
+    metadata = {"board": board, "class": class_name, "subject": subject}
+
+    clock = StageClock()
+    started = time.perf_counter()
+    record = {"board": board, "class": class_name, "subject": subject,
+              "literature_type": literature_type, "chapter": chapter}
+    try:
+        chunks, blob_path, reused_cache = app_module.build_chapter_chunks(
+            bucket, candidate_paths, metadata, key, progress=clock
+        )
+        if chunks is None:
+            record["status"] = "missing"
+        else:
+            record.update(status="done", blob_path=blob_path, chunks=len(chunks), reused_cache=reused_cache)
+    except Exception as e:
+        record.update(status="failed", error=str(e))
+    clock.finish()
+    record.update(seconds=round(time.perf_counter() - started, 3), pages=clock.page_count,
+                  stages={name: round(seconds, 3) for name, seconds in clock.durations.items()})
+    return record
+
+
+def chapter_label(record):
+    subject = f"{record['subject'].strip()} {record['literature_type']}".strip()
+    return f"{record['class']} / {subject} / {record['chapter']}"
+
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r') as f:
+        return json.load(f)
+
+
+def save_state(state_path, state):
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(temp_path, state_path)
+
+
+def print_summary(records, wall_seconds):
+    """Per-stage time and throughput for the chapters processed in this run"""
+    built = [r for r in records if r["status"] == "done" and not r.get("reused_cache")]
+    counts = {status: sum(1 for r in records if r["status"] == status) for status in ("done", "missing", "failed")}
+    print("=" * 70)
+    print(f"Processed {len(records)} chapters in {wall_seconds:.1f}s: "
+          f"{counts['done']} cached ({len(built)} built, {counts['done'] - len(built)} already present), "
+          f"{counts['missing']} missing, {counts['failed']} failed")
+    if wall_seconds > 0:
+        print(f"Throughput: {len(records) / wall_seconds * 60:.1f} chapters/min")
+
+    pages = sum(r["pages"] for r in built)
+    chunks = sum(r["chunks"] for r in built)
+    print(f"{'stage':<18}{'chapters':>10}{'total s':>10}{'mean s':>10}  throughput")
+    for stage in STAGES:
+        timed = [r["stages"][stage] for r in records if stage in r.get("stages", {})]
+        if not timed:
+            continue
+        total = sum(timed)
+        rate = ""
+        if stage == "extracting" and total:
+            rate = f"{pages / total:.1f} pages/s"
+        elif stage == "embedding" and total:
+            rate = f"{chunks / total:.1f} chunks/s"
+        elif total:
+            rate = f"{len(timed) / total:.2f} chapters/s"
+        print(f"{stage:<18}{len(timed):>10}{total:>10.1f}{total / len(timed):>10.2f}  {rate}")
+
+    for r in records:
+        if r["status"] == "failed":
+            print(f"❌ {chapter_label(r)}: {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm chapter chunk and embedding caches")
+    parser.add_argument("--output-dir", default=os.getenv('CHUNKS_CACHE_DIR', '/tmp/chunks_cache'),
+                        help="directory for the cache files (use as CHUNKS_CACHE_DIR at runtime)")
+    parser.add_argument("--workers", type=int, default=4, help="chapters processed in parallel")
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET)
+    parser.add_argument("--source", choices=["quiz", "subjects", "all"], default="all",
+                        help="chapter_mapping_quiz.json, SUBJECT_CHAPTER_DATA or both")
+    parser.add_argument("--board")
+    parser.add_argument("--class", dest="class_level", help="class number, e.g. 10")
+    parser.add_argument("--subject")
+    parser.add_argument("--limit", type=int, help="process at most this many pending chapters")
+    parser.add_argument("--retry-missing", action="store_true", help="look again for chapters whose PDF was not found")
+    args = parser.parse_args()
+
+    # The cache locations are read when app is imported
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    os.environ['CHUNKS_CACHE_DIR'] = output_dir
+    os.environ['CHUNK_MANIFEST_PATH'] = os.path.join(output_dir, 'manifest.json')
+    import app as app_module
+
+    chapters = collect_chapters(app_module, args.bucket, args.source, args.board, args.class_level, args.subject)
+    state_path = os.path.join(output_dir, STATE_FILENAME)
+    state = load_state(state_path)
+    skip = {"done", "missing"} - ({"missing"} if args.retry_missing else set())
+    pending = [(key, entry) for key, entry in chapters.items() if state.get(key, {}).get("status") not in skip]
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"📚 {len(chapters)} chapters selected, {len(chapters) - len(pending)} already done, "
+          f"{len(pending)} to process with {args.workers} workers into {output_dir}")
+
+    state_lock = threading.Lock()
+    records = []
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {executor.submit(prewarm_chapter, app_module, args.bucket, key, entry): key
+                   for key, entry in pending}
+        for future in as_completed(futures):
+            key, record = futures[future], future.result()
+            with state_lock:
+                state[key] = record
+                records.append(record)
+                save_state(state_path, state)
+            print(f"[{len(records)}/{len(pending)}] {record['status']:<8} {chapter_label(record)} ({record['seconds']:.1f}s)")
+    except KeyboardInterrupt:
+        print("Interrupted; progress is saved, rerun to resume.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    print_summary(records, time.perf_counter() - started)
+    return 1 if any(r["status"] == "failed" for r in records) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import os
+import logging
+import numpy as np
+from typing import Optional, Sequence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage type for chunk embeddings in memory, in the local cache and in Firestore:
+# float32 (exact), float16 (half the size) or int8 (a quarter, scalar-quantised with one scale per vector)
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+EMBEDDING_DTYPE = os.getenv('EMBEDDING_DTYPE', 'float32').lower()
+if EMBEDDING_DTYPE not in EMBEDDING_DTYPES:
+    logger.warning(f"Unknown EMBEDDING_DTYPE '{EMBEDDING_DTYPE}'; using float32")
+    EMBEDDING_DTYPE = "float32"
+
+# Rows converted per step when scoring, so the float32 buffer stays in cache
+SCORE_BLOCK_ROWS = 1024
+
+
+def quantize_rows(embeddings, dtype: str = EMBEDDING_DTYPE):
+    """
+    Convert a float matrix to dtype. Returns (data, scales): scales is a float32 vector
+    for int8 (row ~= data * scale, with each row's largest magnitude mapped to 127) and None otherwise.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+        scales[scales == 0] = 1.0
+        data = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return data, scales.astype(np.float32)
+    raise ValueError(f"Unknown embedding dtype '{dtype}' (expected one of {EMBEDDING_DTYPES})")
+
+
+class QuantizedMatrix:
+    """
+    Embedding matrix kept in its storage type (float32, float16 or int8 plus per-row scales).
+    Scores are computed against the stored rows a block at a time, so a float16 or int8
+    matrix is never expanded to float32 as a whole. Works on memory-mapped arrays too.
+    """
+
+    def __init__(self, data: np.ndarray, scales: Optional[np.ndarray] = None):
+        if data.dtype == np.int8 and (scales is None or len(scales) != len(data)):
+            raise ValueError("int8 embeddings need one scale per row")
+        self.data = data
+        self.scales = scales if data.dtype == np.int8 else None
+
+    @classmethod
+    def from_float(cls, embeddings, dtype: str = EMBEDDING_DTYPE) -> "QuantizedMatrix":
+        return cls(*quantize_rows(embeddings, dtype))
+
+    @property
+    def dtype(self) -> str:
+        return np.dtype(self.data.dtype).name
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def rows(self, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Dequantised float32 copy of the selected rows (all rows by default)"""
+        data = self.data if indices is None else self.data[np.asarray(indices, dtype=np.int64)]
+        matrix = np.asarray(data, dtype=np.float32)
+        if self.scales is not None:
+            scales = self.scales if indices is None else self.scales[np.asarray(indices, dtype=np.int64)]
+            matrix = matrix * scales[:, None]
+        return matrix
+
+    def scores(self, query, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Dot product of query with each selected row (all rows by default), as float32"""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        rows = None if indices is None else np.asarray(indices, dtype=np.int64)
+        if self.data.dtype == np.float32:
+            return (self.data if rows is None else self.data[rows]) @ query
+
+        count = len(self.data) if rows is None else len(rows)
+        out = np.empty(count, dtype=np.float32)
+        buffer = np.empty((min(count, SCORE_BLOCK_ROWS), self.data.shape[1]), dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, count)
+            block_rows = slice(start, end) if rows is None else rows[start:end]
+            block = buffer[:end - start]
+            np.copyto(block, self.data[block_rows], casting='unsafe')
+            np.dot(block, query, out=out[start:end])
+            if self.scales is not None:
+                out[start:end] *= self.scales[block_rows]
+        return out
+
+
+def as_quantized(embeddings) -> QuantizedMatrix:
+    """Wrap a plain float matrix so callers can score either kind the same way"""
+    if isinstance(embeddings, QuantizedMatrix):
+        return embeddings
+    return QuantizedMatrix(np.asarray(embeddings, dtype=np.float32))
+
+
+def scales_filename(embeddings_filename: str) -> str:
+    """Companion file holding the per-row scales of an int8 embedding matrix"""
+    return os.path.splitext(embeddings_filename)[0] + "_scales.npy"
+
+
+def _save_atomic(filename: str, array: np.ndarray) -> None:
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_filename, filename)
+
+
+def save_quantized(filename: str, matrix: QuantizedMatrix) -> None:
+    """
+    Write the matrix as .npy in its storage type (plus the scales file for int8).
+    Each file is written then renamed, scales first, so readers never map a partial matrix.
+    """
+    scales_path = scales_filename(filename)
+    if matrix.scales is not None:
+        _save_atomic(scales_path, matrix.scales)
+    elif os.path.exists(scales_path):
+        os.remove(scales_path)
+    _save_atomic(filename, matrix.data)
+
+
+def load_quantized(filename: str, mmap_mode: Optional[str] = 'r') -> Optional[QuantizedMatrix]:
+    """Load a matrix written by save_quantized (or a plain float32 .npy); None if incomplete"""
+    data = np.load(filename, mmap_mode=mmap_mode)
+    scales = None
+    if data.dtype == np.int8:
+        scales_path = scales_filename(filename)
+        if not os.path.exists(scales_path):
+            return None
+        scales = np.load(scales_path, mmap_mode=mmap_mode)
+        if len(scales) != len(data):
+            return None
+    return QuantizedMatrix(data, scales)
+
+
+def encode_vector(vector, dtype: str = EMBEDDING_DTYPE) -> bytes:
+    """Pack one embedding for storage: little-endian values, int8 prefixed by its float32 scale"""
+    data, scales = quantize_rows(vector, dtype)
+    if dtype == "int8":
+        return scales.astype('<f4').tobytes() + data.tobytes()
+    return data.astype(data.dtype.newbyteorder('<')).tobytes()
+
+
+def decode_vector(payload: bytes, dtype: str = "float32") -> np.ndarray:
+    """Inverse of encode_vector, returning float32"""
+    if dtype == "int8":
+        scale = np.frombuffer(payload[:4], dtype='<f4')[0]
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    if dtype == "float16":
+        return np.frombuffer(payload, dtype='<f2').astype(np.float32)
+    return np.frombuffer(payload, dtype='<f4')
@@ -0,0 +1,169 @@
+import os
+import random
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Questions kept per (board, class, subject, chapter, difficulty)
+QUIZ_POOL_MAX_SIZE = int(os.getenv('QUIZ_POOL_MAX_SIZE', '100'))
+# Start a background refill once a user has fewer than this many unseen questions left
+QUIZ_POOL_REFILL_THRESHOLD = int(os.getenv('QUIZ_POOL_REFILL_THRESHOLD', '20'))
+QUIZ_POOL_WORKERS = int(os.getenv('QUIZ_POOL_WORKERS', '2'))
+# Least recently used chapters, and users per chapter, beyond these caps are forgotten
+QUIZ_POOL_MAX_CHAPTERS = int(os.getenv('QUIZ_POOL_MAX_CHAPTERS', '500'))
+QUIZ_POOL_MAX_USERS = int(os.getenv('QUIZ_POOL_MAX_USERS', '1000'))
+
+
+def _question_id(question: Dict) -> str:
+    return " ".join(str(question.get('question', '')).lower().split())
+
+
+class _ChapterPool:
+    def __init__(self):
+        self.questions: Dict[str, Dict] = {}  # question id -> question, insertion ordered
+        self.served: "OrderedDict[Hashable, set]" = OrderedDict()  # user id -> question ids served, LRU order
+
+    def served_to(self, user_id: Hashable, max_users: int) -> set:
+        served = self.served.setdefault(user_id, set())
+        self.served.move_to_end(user_id)
+        while len(self.served) > max_users:
+            self.served.popitem(last=False)
+        return served
+
+
+class QuizQuestionPool:
+    """
+    Pre-generated quiz questions per chapter/difficulty key.
+    Users are served by sampling without replacement from the questions they have not
+    seen yet; when their unseen count drops below refill_threshold, generate_fn(*key)
+    runs on a background thread to top the pool up (one refill per key at a time).
+    A miss schedules nothing, since the caller generates inline and seeds the pool with add().
+    Chapters and the users tracked per chapter are capped, least recently used first.
+    """
+
+    def __init__(self, generate_fn: Callable[..., List[Dict]],
+                 max_size: int = QUIZ_POOL_MAX_SIZE,
+                 refill_threshold: int = QUIZ_POOL_REFILL_THRESHOLD,
+                 max_workers: int = QUIZ_POOL_WORKERS,
+                 max_chapters: int = QUIZ_POOL_MAX_CHAPTERS,
+                 max_users: int = QUIZ_POOL_MAX_USERS):
+        self.generate_fn = generate_fn
+        self.max_size = max_size
+        self.refill_threshold = refill_threshold
+        self.max_chapters = max_chapters
+        self.max_users = max_users
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quiz-pool")
+        self._pools: "OrderedDict[Hashable, _ChapterPool]" = OrderedDict()
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self.stats = {"served_from_pool": 0, "pool_misses": 0, "refills": 0, "refill_failures": 0}
+
+    def _get_pool(self, key: Hashable, create: bool = False) -> Optional[_ChapterPool]:
+        """Look up (or create) a chapter pool and mark it recently used; caller holds the lock"""
+        pool = self._pools.get(key)
+        if pool is None:
+            if not create:
+                return None
+            pool = self._pools[key] = _ChapterPool()
+            while len(self._pools) > self.max_chapters:
+                self._pools.popitem(last=False)
+        self._pools.move_to_end(key)
+        return pool
+
+    def add(self, key: Hashable, questions: List[Dict], served_to: Optional[Hashable] = None) -> int:
+        """
+        Add freshly generated questions, skipping duplicates; returns how many were new.
+        When they were generated inline for served_to, a refill is scheduled if that user
+        is still short of unseen questions.
+        """
+        with self._lock:
+            pool = self._get_pool(key, create=True)
+            served = pool.served_to(served_to, self.max_users) if served_to is not None else None
+            added = 0
+            for question in questions:
+                qid = _question_id(question)
+                if qid and qid not in pool.questions:
+                    pool.questions[qid] = question
+                    added += 1
+                if served is not None and qid:
+                    served.add(qid)
+            # Drop the oldest questions beyond the cap
+            while len(pool.questions) > self.max_size:
+                pool.questions.pop(next(iter(pool.questions)))
+            remaining = sum(1 for qid in pool.questions if qid not in served) if served is not None else None
+
+        if remaining is not None and remaining < self.refill_threshold:
+            self.request_refill(key)
+        return added
+
+    def take(self, key: Hashable, user_id: Hashable, count: int) -> Optional[List[Dict]]:
+        """
+        Return count questions the user has not seen yet, or None if the pool cannot
+        supply that many (the caller then generates synchronously and passes the result
+        to add()). Schedules a refill when serving leaves the user below the threshold.
+        """
+        with self._lock:
+            pool = self._get_pool(key)
+            unseen = []
+            if pool is not None:
+                served = pool.served_to(user_id, self.max_users)
+                unseen = [qid for qid in pool.questions if qid not in served]
+                if len(unseen) < count and len(pool.questions) >= self.max_size:
+                    # The user has worked through a full pool; start a new pass over it
+                    served.clear()
+                    unseen = list(pool.questions)
+
+            if len(unseen) < count:
+                self.stats["pool_misses"] += 1
+                return None
+            selected = random.sample(unseen, count)
+            served.update(selected)
+            self.stats["served_from_pool"] += 1
+            remaining = len(unseen) - count
+            selected = [pool.questions[qid] for qid in selected]
+
+        if remaining < self.refill_threshold:
+            self.request_refill(key)
+        return selected
+
+    def request_refill(self, key: Hashable) -> bool:
+        """Queue background generation for key unless one is already running"""
+        with self._lock:
+            pool = self._pools.get(key)
+            if key in self._refilling or (pool is not None and len(pool.questions) >= self.max_size):
+                return False
+            self._refilling.add(key)
+        self._executor.submit(self._refill, key)
+        return True
+
+    def _refill(self, key: Hashable) -> None:
+        try:
+            questions = self.generate_fn(*key)
+            added = self.add(key, questions)
+            with self._lock:
+                self.stats["refills"] += 1
+            logger.info(f"Quiz pool refill for {key}: {added} new questions")
+        except Exception as e:
+            with self._lock:
+                self.stats["refill_failures"] += 1
+            logger.error(f"Quiz pool refill failed for {key}: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "chapters": len(self._pools),
+                "max_chapters": self.max_chapters,
+                "questions": sum(len(pool.questions) for pool in self._pools.values()),
+                "refills_in_flight": len(self._refilling),
+                "max_size": self.max_size,
+                "refill_threshold": self.refill_threshold,
+            }
@@ -0,0 +1,86 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; cross-process locking becomes a no-op
+    fcntl = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs fn, callers that
+    arrive while it is in flight wait for and share its result (or exception).
+    Nothing is cached once the call finishes; later callers run fn again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"Waiting on in-flight work for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._calls)}
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """
+    Exclusive advisory lock on lock_path, shared by every process on the host
+    (e.g. all gunicorn workers), so only one of them builds a given cache file
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -879,11 +879,20 @@ async function sendMessage(question) {
         const response = await fetch('/ask', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream, application/json'
             },
-            body: JSON.stringify({ path: fullPath, question: question })
+            body: JSON.stringify({ path: fullPath, question: question, stream: true })
         });
 
+        // Streamed answers render token-by-token; JSON responses (errors, no context) fall through
+        if ((response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            await renderStreamedAnswer(response);
+            userQuestionInput.disabled = false;
+            sendButton.disabled = false;
+            return;
+        }
+
         const data = await response.json();
         hideProcessingMessage();
         userQuestionInput.disabled = false;
@@ -905,6 +914,54 @@ async function sendMessage(question) {
     }
 }
 
+// Reads a text/event-stream response from /ask and grows a single bot bubble as deltas arrive
+async function renderStreamedAnswer(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let contentElement = null;
+
+    const handleEvent = (rawEvent) => {
+        let eventType = 'message';
+        let dataText = '';
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) eventType = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+        });
+        if (!dataText) return;
+        const payload = JSON.parse(dataText);
+
+        if (eventType === 'error') {
+            hideProcessingMessage();
+            displayErrorMessage(payload.error || "Could not generate an answer. Please try again.");
+            return;
+        }
+        answer = eventType === 'done' ? (payload.answer || answer) : answer + (payload.delta || '');
+        if (!contentElement) {
+            hideProcessingMessage();
+            displayMessage('bot', ' ');
+            const bubbles = chatArea.querySelectorAll('.message.bot .bubble');
+            contentElement = bubbles[bubbles.length - 1].firstElementChild;
+        }
+        contentElement.innerHTML = formatBotMessage(answer);
+        chatArea.scrollTop = chatArea.scrollHeight;
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            handleEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+        }
+    }
+    if (buffer.trim()) handleEvent(buffer);
+    if (!contentElement) hideProcessingMessage();
+}
+
 async function submitPath() {
     if (!state.board || !state.class || !state.subject || !state.chapter) {
         displayErrorMessage("Please select Board, Class, Subject, and Chapter.");
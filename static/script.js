@@ -291,12 +291,13 @@ async function submitPath() {
     body: JSON.stringify({ path: fullPath })
   })
     .then(response => response.json())
+    .then(result => result.status === 'queued' ? waitForIngestJob(result, processingId) : result)
     .then(result => {
       if (result.status === 'success') {
         updateProcessingMessage(processingId, result.message || '✅ PDF successfully divided into chunks.');
         showQuizButton();
       } else {
-        updateProcessingMessage(processingId, '❌ Error dividing PDF into chunks: ' + result.message);
+        updateProcessingMessage(processingId, '❌ Error dividing PDF into chunks: ' + (result.message || result.error));
       }
     })
     .catch(error => {
@@ -310,6 +311,22 @@ async function submitPath() {
   chatContainer.scrollTop = chatContainer.scrollHeight;
 }
 
+// Poll a queued chapter ingestion job until it finishes, showing its stage and page progress
+async function waitForIngestJob(queued, processingId) {
+  while (true) {
+    await new Promise(resolve => setTimeout(resolve, 1000));
+    const job = await fetch(queued.status_url).then(response => response.json());
+    if (job.status === 'succeeded') {
+      return { status: 'success', message: "Let's start learning the Chapter", chunks: job.result.chunks };
+    }
+    if (job.status === 'failed' || job.error) {
+      return { status: 'error', message: job.error };
+    }
+    const pages = job.pages_total ? ` (${job.pages_done}/${job.pages_total} pages)` : '';
+    updateProcessingMessage(processingId, `⏳ ${job.stage}${pages}...`);
+  }
+}
+
 function displayUserMessage(message) {
   const chat = document.getElementById('chat');
   const div = document.createElement('div');
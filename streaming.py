@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import Response, request, stream_with_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def wants_event_stream(data: Optional[Dict] = None) -> bool:
+    """
+    Streaming is opt-in so the JSON contract stays the default:
+    send {"stream": true} in the body or an Accept: text/event-stream header.
+    """
+    if data and data.get("stream") is True:
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def iter_response_text(responses) -> Iterable[str]:
+    """Text deltas from a Gemini generate_content(..., stream=True) iterator"""
+    for response in responses:
+        try:
+            text = response.text
+        except ValueError:
+            # Chunks carrying only finish/safety metadata have no text parts
+            continue
+        if text:
+            yield text
+
+
+def sse_event(payload: Dict, event: Optional[str] = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_response(text_chunks: Iterable[str], done_payload: Optional[Dict] = None,
+                 on_complete: Optional[Callable[[str], None]] = None) -> Response:
+    """
+    Server-sent events response: one {"delta": ...} message per text chunk, then a
+    "done" event carrying the full answer plus done_payload (e.g. debug info).
+    Failures mid-stream are reported as an "error" event since the status is already sent.
+    """
+    def generate():
+        parts = []
+        try:
+            for chunk in text_chunks:
+                if chunk:
+                    parts.append(chunk)
+                    yield sse_event({"delta": chunk})
+        except Exception as e:
+            logger.error(f"Error while streaming answer: {str(e)}", exc_info=True)
+            yield sse_event({"error": "I encountered an error while generating an answer. Please try again."}, event="error")
+            return
+
+        answer = "".join(parts).strip()
+        if on_complete is not None:
+            try:
+                on_complete(answer)
+            except Exception as e:
+                logger.warning(f"Stream completion callback failed: {e}")
+        yield sse_event({**(done_payload or {}), "answer": answer}, event="done")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
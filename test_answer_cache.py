@@ -0,0 +1,88 @@
+import numpy as np
+
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+
+def unit(*components):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector
+
+
+def make_cache(**kwargs):
+    return SemanticAnswerCache(**{"threshold": 0.95, "max_entries": 100, "ttl_seconds": 3600,
+                                  "enabled": True, **kwargs})
+
+
+def test_near_identical_question_hits_and_different_one_misses():
+    cache = make_cache()
+    cache.store("bucket/ch1.pdf", unit(1.0), "Chloroplasts.")
+    # Scale does not matter, only direction
+    assert cache.lookup("bucket/ch1.pdf", unit(5.0, 0.1)) == "Chloroplasts."
+    assert cache.lookup("bucket/ch1.pdf", unit(1.0, 1.0)) is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_best_match_wins():
+    cache = make_cache(threshold=0.5)
+    cache.store("s", unit(1.0), "x")
+    cache.store("s", unit(0.0, 1.0), "y")
+    cache.store("s", unit(0.7, 0.7), "xy")
+    assert cache.lookup("s", unit(0.1, 1.0)) == "y"
+    assert cache.lookup("s", unit(0.6, 0.8)) == "xy"
+
+
+def test_scopes_are_isolated():
+    cache = make_cache()
+    cache.store("bucket/ch1.pdf", unit(1.0), "Chapter one answer")
+    assert cache.lookup("bucket/ch2.pdf", unit(1.0)) is None
+    assert cache.get_stats()["chapters"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: clock[0])
+    cache = make_cache(ttl_seconds=60)
+    cache.store("s", unit(1.0), "old")
+    clock[0] += 61
+    assert cache.lookup("s", unit(1.0)) is None
+    assert cache.get_stats()["expirations"] == 1
+    assert cache.get_stats()["entries"] == 0
+
+    cache.store("s", unit(1.0), "new")
+    assert cache.lookup("s", unit(1.0)) == "new"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=3)
+    for i, answer in enumerate("abc"):
+        cache.store("s", unit(*([0.0] * i + [1.0])), answer)
+    assert cache.lookup("s", unit(1.0)) == "a"  # "b" is now the oldest
+    cache.store("s", unit(0.0, 0.0, 0.0, 1.0), "d")
+    assert cache.lookup("s", unit(0.0, 1.0)) is None
+    assert [cache.lookup("s", unit(*([0.0] * i + [1.0]))) for i in (0, 2, 3)] == ["a", "c", "d"]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_many_stores_and_removals_keep_rows_consistent():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 8)).astype(np.float32)
+    cache = make_cache(max_entries=50, threshold=0.999)
+    for i, vector in enumerate(vectors):
+        cache.store(f"scope{i % 3}", vector, str(i))
+    # The last 50 survive, each still paired with its own answer
+    for i in range(150, 200):
+        assert cache.lookup(f"scope{i % 3}", vectors[i]) == str(i)
+    assert cache.lookup("scope0", vectors[0]) is None
+
+
+def test_disabled_cache_and_empty_answers_store_nothing():
+    cache = make_cache(enabled=False)
+    cache.store("s", unit(1.0), "answer")
+    assert cache.lookup("s", unit(1.0)) is None
+
+    cache = make_cache()
+    cache.store("s", unit(1.0), "")
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,108 @@
+import pytest
+
+chunk_manifest = pytest.importorskip("chunk_manifest")
+ChunkManifest = chunk_manifest.ChunkManifest
+chapter_key = chunk_manifest.chapter_key
+
+
+class FakeBlob:
+    def __init__(self, generation):
+        self.generation = generation
+
+
+class FakeStorage:
+    """Storage client stand-in: bucket(name).get_blob(path) from a {path: generation} dict"""
+
+    def __init__(self, generations):
+        self.generations = generations
+        self.get_blob_calls = 0
+
+    def bucket(self, name):
+        return self
+
+    def get_blob(self, path):
+        self.get_blob_calls += 1
+        generation = self.generations.get(path)
+        return FakeBlob(generation) if generation is not None else None
+
+
+def make_manifest(tmp_path, storage, revalidate_seconds=0, on_stale=None):
+    return ChunkManifest(str(tmp_path / "manifest.json"), revalidate_seconds=revalidate_seconds,
+                         on_stale=on_stale, client_factory=lambda: storage)
+
+
+def test_chapter_key_ignores_filename_spelling():
+    assert chapter_key("b", ["NCERT", "Class_9", "Science"], "chapter (3).pdf") == \
+        chapter_key("b", ["ncert", "Class 9", "science"], "Chapter_3.pdf")
+
+
+def test_fresh_entry_is_served_without_gcs(tmp_path):
+    storage = FakeStorage({"a.pdf": 1})
+    manifest = make_manifest(tmp_path, storage, revalidate_seconds=600)
+    manifest.record("k", "b", "a.pdf", generation=1, chunk_count=3)
+    assert manifest.lookup("k")["path"] == "a.pdf"
+    assert storage.get_blob_calls == 0
+
+
+def test_changed_generation_is_stale(tmp_path):
+    storage = FakeStorage({"a.pdf": 1})
+    discarded = []
+    manifest = make_manifest(tmp_path, storage, on_stale=discarded.append)
+    manifest.record("k", "b", "a.pdf", generation=1)
+    assert manifest.lookup("k") is not None
+
+    storage.generations["a.pdf"] = 2
+    assert manifest.lookup("k") is None
+    assert [entry["path"] for entry in discarded] == ["a.pdf"]
+    assert make_manifest(tmp_path, storage, revalidate_seconds=600).lookup("k") is None
+
+
+def test_deleted_blob_is_stale(tmp_path):
+    storage = FakeStorage({})
+    manifest = make_manifest(tmp_path, storage)
+    manifest.record("k", "b", "a.pdf", generation=1)
+    assert manifest.lookup("k") is None
+
+
+def test_entry_without_generation_only_needs_the_blob(tmp_path):
+    storage = FakeStorage({"a.pdf": 7})
+    manifest = make_manifest(tmp_path, storage)
+    manifest.record("k", "b", "a.pdf", generation=None)
+    assert manifest.lookup("k") is not None
+    assert manifest.lookup("k") is not None
+    assert manifest.get_stats()["stale"] == 0
+
+
+def test_successful_revalidation_does_not_rewrite_the_file(tmp_path):
+    storage = FakeStorage({"a.pdf": 1})
+    manifest = make_manifest(tmp_path, storage)
+    manifest.record("k", "b", "a.pdf", generation=1)
+    path = tmp_path / "manifest.json"
+    before = path.read_text()
+    manifest.lookup("k")
+    assert path.read_text() == before
+    assert storage.get_blob_calls == 1
+
+
+def test_workers_do_not_drop_each_others_entries(tmp_path):
+    storage = FakeStorage({"a.pdf": 1, "b.pdf": 1})
+    first = make_manifest(tmp_path, storage, revalidate_seconds=600)
+    second = make_manifest(tmp_path, storage, revalidate_seconds=600)
+    first.record("a", "b", "a.pdf", generation=1)
+    second.record("b", "b", "b.pdf", generation=1)
+    first.invalidate("missing")
+
+    restarted = make_manifest(tmp_path, storage, revalidate_seconds=600)
+    assert restarted.lookup("a")["path"] == "a.pdf"
+    assert restarted.lookup("b")["path"] == "b.pdf"
+
+
+def test_invalidate_keeps_a_newer_version_from_another_worker(tmp_path):
+    storage = FakeStorage({"a.pdf": 2})
+    first = make_manifest(tmp_path, storage, revalidate_seconds=600)
+    first.record("k", "b", "a.pdf", generation=1)
+    second = make_manifest(tmp_path, storage, revalidate_seconds=600)
+    second.record("k", "b", "a.pdf", generation=2)
+
+    first.invalidate("k")
+    assert make_manifest(tmp_path, storage, revalidate_seconds=600).lookup("k")["generation"] == "2"
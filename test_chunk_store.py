@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from chunk_store import ChunkStore, CHUNK_STORE_MAGIC, write_chunk_store, open_chunk_store, migrate_json_chunks
+
+
+CHUNKS = [
+    {"text": "Photosynthesis happens in chloroplasts.", "metadata": {"board": "NCERT", "subject": "Science", "page": 1}},
+    {"text": "प्रकाश संश्लेषण", "metadata": {"board": "NCERT", "subject": "Hindi", "page": 2}},
+    {"text": "", "metadata": {"board": "NCERT", "subject": "Science", "page": 1}},
+    {"text": "Respiration releases energy.", "metadata": {}},
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "chapter.chunks")
+    assert write_chunk_store(path, CHUNKS) == len(CHUNKS)
+    store = ChunkStore(path)
+    assert len(store) == len(CHUNKS)
+    assert list(store) == CHUNKS
+    assert store[-1] == CHUNKS[-1]
+    assert store[1:3] == CHUNKS[1:3]
+    assert store.texts() == [chunk["text"] for chunk in CHUNKS]
+    with pytest.raises(IndexError):
+        store[len(CHUNKS)]
+
+
+def test_repeated_metadata_is_stored_once(tmp_path):
+    path = str(tmp_path / "chapter.chunks")
+    write_chunk_store(path, CHUNKS)
+    assert len(ChunkStore(path).metadata_table) == 3
+
+
+def test_filter_indices_is_case_insensitive(tmp_path):
+    path = str(tmp_path / "chapter.chunks")
+    write_chunk_store(path, CHUNKS)
+    store = ChunkStore(path)
+    assert store.filter_indices({"subject": "science"}) == [0, 2]
+    assert store.filter_indices({"subject": "Science", "page": "1"}) == [0, 2]
+    assert store.filter_indices({"subject": "Maths"}) == []
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "empty.chunks")
+    write_chunk_store(path, [])
+    assert len(ChunkStore(path)) == 0
+
+
+def test_closed_store_reopens_until_the_file_is_replaced(tmp_path):
+    path = str(tmp_path / "chapter.chunks")
+    write_chunk_store(path, CHUNKS)
+    store = ChunkStore(path)
+    store.close()
+    assert store.closed
+    assert store[0] == CHUNKS[0]
+
+    store.close()
+    write_chunk_store(path, CHUNKS[:1])
+    with pytest.raises(ValueError):
+        store[0]
+
+
+def test_unreadable_files_are_ignored(tmp_path):
+    assert open_chunk_store(str(tmp_path / "missing.chunks")) is None
+    bad = tmp_path / "bad.chunks"
+    bad.write_bytes(b"not a chunk store")
+    assert open_chunk_store(str(bad)) is None
+
+    path = tmp_path / "truncated.chunks"
+    write_chunk_store(str(path), CHUNKS)
+    data = path.read_bytes()
+    assert data.startswith(CHUNK_STORE_MAGIC)
+    path.write_bytes(data[:-10])
+    assert open_chunk_store(str(path)) is None
+
+
+def test_legacy_json_is_migrated(tmp_path):
+    json_path = tmp_path / "chapter.json"
+    json_path.write_text(json.dumps(CHUNKS), encoding="utf-8")
+    store = migrate_json_chunks(str(json_path), str(tmp_path / "chapter.chunks"))
+    assert list(store) == CHUNKS
+    assert not json_path.exists()
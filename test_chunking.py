@@ -0,0 +1,90 @@
+from chunking import (
+    assign_chunk_ids, chunk_pages, chunk_pages_fixed, chunk_pages_semantic, estimate_tokens, split_sentences,
+)
+
+
+def numbered_sentences(count, start=1, words=8):
+    return " ".join(f"Sentence {n} " + " ".join(["word"] * (words - 3)) + " end." for n in range(start, start + count))
+
+
+def test_sentences_split_but_not_after_abbreviations():
+    paragraph = ("Plants need light, e.g. Sunlight or lamps. See Fig. 3 for the leaf.\n"
+                 "It shows the stomata. Is it clear? Yes!")
+    assert split_sentences(paragraph) == [
+        "Plants need light, e.g. Sunlight or lamps.",
+        "See Fig. 3 for the leaf.",
+        "It shows the stomata.",
+        "Is it clear?",
+        "Yes!",
+    ]
+
+
+def test_over_long_sentence_is_cut_into_word_windows():
+    sentence = " ".join(f"w{n}" for n in range(100)) + "."
+    chunks = chunk_pages_semantic([(1, sentence)], target_tokens=26, overlap_tokens=0)
+    # 26 tokens is 20 words per window
+    assert [len(chunk["text"].split()) for chunk in chunks] == [20] * 5
+    assert " ".join(chunk["text"] for chunk in chunks) == sentence
+
+
+def test_chunks_respect_the_target_and_overlap():
+    text = numbered_sentences(30)
+    chunks = chunk_pages_semantic([(1, text)], target_tokens=40, overlap_tokens=12)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk["text"]) <= 40
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = split_sentences(previous["text"])[-1]
+        assert split_sentences(current["text"])[0] == last_sentence
+    # Every sentence survives, in order
+    seen = []
+    for chunk in chunks:
+        for sentence in split_sentences(chunk["text"]):
+            if not seen or seen[-1] != sentence:
+                seen.append(sentence)
+    assert seen == split_sentences(text)
+
+
+def test_no_overlap_when_disabled():
+    chunks = chunk_pages_semantic([(1, numbered_sentences(12))], target_tokens=40, overlap_tokens=0)
+    sentences = [s for chunk in chunks for s in split_sentences(chunk["text"])]
+    assert len(sentences) == 12
+
+
+def test_chunks_cross_pages_and_record_the_page_range():
+    pages = [(1, numbered_sentences(3)), (2, numbered_sentences(3, start=4)), (3, "")]
+    chunks = chunk_pages_semantic(pages, metadata={"subject": "Science"}, target_tokens=200, overlap_tokens=0)
+    assert len(chunks) == 1
+    assert chunks[0]["metadata"] == {"subject": "Science", "page": 1, "page_end": 2}
+
+    chunks = chunk_pages_semantic(pages, target_tokens=30, overlap_tokens=0)
+    assert [(c["metadata"]["page"], c["metadata"]["page_end"]) for c in chunks] == [(1, 1), (1, 2), (2, 2)]
+
+
+def test_paragraph_break_closes_a_mostly_full_chunk():
+    text = numbered_sentences(3) + "\n\n" + numbered_sentences(1, start=4)
+    chunks = chunk_pages_semantic([(1, text)], target_tokens=50, overlap_tokens=0)
+    assert [len(split_sentences(chunk["text"])) for chunk in chunks] == [3, 1]
+
+
+def test_page_strategy_keeps_fixed_slices_within_pages():
+    pages = [(1, "a b c d e"), (2, "f g")]
+    chunks = chunk_pages(pages, {"board": "NCERT"}, strategy="page", chunk_size=2)
+    assert [(chunk["text"], chunk["metadata"]["page"]) for chunk in chunks] == [
+        ("a b", 1), ("c d", 1), ("e", 1), ("f g", 2),
+    ]
+    assert chunk_pages_fixed(pages, chunk_size=2) == [{"text": c["text"], "metadata": {"page": c["metadata"]["page"]}}
+                                                      for c in chunks]
+
+
+def test_chunk_ids_are_numbered_per_starting_page_and_stable():
+    pages = [(1, numbered_sentences(3)), (2, numbered_sentences(5, start=4))]
+
+    def ids():
+        chunks = chunk_pages_semantic(pages, target_tokens=30, overlap_tokens=0)
+        return [chunk["chunk_id"] for chunk in assign_chunk_ids(chunks)]
+
+    first = ids()
+    assert first == ["page_1_chunk_1", "page_1_chunk_2", "page_2_chunk_1", "page_2_chunk_2"]
+    # Firestore document ids are built from these, so re-chunking must reproduce them
+    assert ids() == first
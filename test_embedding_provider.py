@@ -0,0 +1,50 @@
+import sys
+import types
+
+import pytest
+
+import embedding_provider
+
+
+@pytest.fixture
+def fake_sentence_transformers(monkeypatch):
+    """A sentence_transformers module whose model constructor can be told to fail"""
+    module = types.ModuleType("sentence_transformers")
+    module.attempts = 0
+    module.fail = True
+
+    class SentenceTransformer:
+        def __init__(self, name):
+            module.attempts += 1
+            if module.fail:
+                raise OSError("model download failed")
+            self.name = name
+
+    module.SentenceTransformer = SentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    monkeypatch.setattr(embedding_provider, "_models", {})
+    monkeypatch.setattr(embedding_provider, "_model_stats", {})
+    monkeypatch.setattr(embedding_provider, "_failures", {})
+    return module
+
+
+def test_failed_load_backs_off(fake_sentence_transformers, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(embedding_provider.time, "time", lambda: clock[0])
+    monkeypatch.setattr(embedding_provider, "EMBEDDING_MODEL_RETRY_SECONDS", 30)
+
+    with pytest.raises(OSError):
+        embedding_provider.get_embedding_model("m")
+    with pytest.raises(RuntimeError, match="retrying in 30s"):
+        embedding_provider.get_embedding_model("m")
+    assert fake_sentence_transformers.attempts == 1
+
+    clock[0] += 31
+    fake_sentence_transformers.fail = False
+    model = embedding_provider.get_embedding_model("m")
+    assert model.name == "m"
+    assert embedding_provider.get_embedding_model("m") is model
+    assert fake_sentence_transformers.attempts == 2
+
+    stats = embedding_provider.get_embedding_model_stats()["models"]["m"]
+    assert (stats["load_count"], stats["load_failures"], stats["last_error"]) == (1, 1, None)
@@ -0,0 +1,106 @@
+import pytest
+
+gcs_resolver = pytest.importorskip("gcs_resolver")
+BlobPathResolver = gcs_resolver.BlobPathResolver
+
+FOLDER = "NCERT/Class 10/Science/"
+CANDIDATES = [FOLDER + "Chapter 1.pdf", FOLDER + "chapter_1.pdf"]
+
+
+class FakeBlob:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeStorage:
+    """Storage client stand-in that lists blobs from a set of names and counts the calls"""
+
+    def __init__(self, names):
+        self.names = set(names)
+        self.list_calls = 0
+
+    def list_blobs(self, bucket_name, prefix, delimiter):
+        self.list_calls += 1
+        return [FakeBlob(name) for name in sorted(self.names)
+                if name.startswith(prefix) and "/" not in name[len(prefix):]]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gcs_resolver.time, "time", lambda: now[0])
+    return now
+
+
+def make_resolver(storage, **kwargs):
+    options = {"ttl_seconds": 3600, "listing_ttl_seconds": 60, "disk_cache_path": None, **kwargs}
+    return BlobPathResolver(client_factory=lambda: storage, **options)
+
+
+def test_first_existing_candidate_wins_with_one_listing(clock):
+    storage = FakeStorage([FOLDER + "chapter_1.pdf", FOLDER + "Chapter 2.pdf"])
+    resolver = make_resolver(storage)
+    assert resolver.resolve("bucket", CANDIDATES) == FOLDER + "chapter_1.pdf"
+    assert resolver.resolve("bucket", CANDIDATES) == FOLDER + "chapter_1.pdf"
+    assert storage.list_calls == 1
+    assert resolver.get_stats()["hits"] == 1
+
+
+def test_other_chapters_reuse_the_cached_folder_listing(clock):
+    storage = FakeStorage([FOLDER + "Chapter 1.pdf", FOLDER + "Chapter 2.pdf"])
+    resolver = make_resolver(storage)
+    resolver.resolve("bucket", CANDIDATES)
+    assert resolver.resolve("bucket", [FOLDER + "Chapter 2.pdf"]) == FOLDER + "Chapter 2.pdf"
+    assert storage.list_calls == 1
+
+
+def test_miss_against_a_cached_listing_lists_again_once(clock):
+    storage = FakeStorage([FOLDER + "Chapter 2.pdf"])
+    resolver = make_resolver(storage)
+    assert resolver.resolve("bucket", [FOLDER + "Chapter 2.pdf"]) is not None
+    # Uploaded after the folder was listed
+    storage.names.add(FOLDER + "Chapter 1.pdf")
+    assert resolver.resolve("bucket", CANDIDATES) == FOLDER + "Chapter 1.pdf"
+    assert storage.list_calls == 2
+    assert resolver.get_stats()["relists"] == 1
+
+
+def test_miss_against_a_fresh_listing_is_not_retried(clock):
+    storage = FakeStorage([])
+    resolver = make_resolver(storage)
+    assert resolver.resolve("bucket", CANDIDATES) is None
+    assert storage.list_calls == 1
+    # The second miss hits the cached listing, so it re-lists exactly once
+    assert resolver.resolve("bucket", CANDIDATES) is None
+    assert storage.list_calls == 2
+    assert resolver.get_stats()["not_found"] == 2
+
+
+def test_listing_expires_after_its_ttl(clock):
+    storage = FakeStorage([FOLDER + "Chapter 2.pdf"])
+    resolver = make_resolver(storage)
+    resolver.resolve("bucket", [FOLDER + "Chapter 2.pdf"])
+    storage.names.add(FOLDER + "Chapter 1.pdf")
+    clock[0] += 61
+    assert resolver.resolve("bucket", CANDIDATES) == FOLDER + "Chapter 1.pdf"
+    assert storage.list_calls == 2
+    assert resolver.get_stats()["relists"] == 0
+
+
+def test_invalidate_forgets_the_path_and_its_listing(clock):
+    storage = FakeStorage([FOLDER + "Chapter 1.pdf"])
+    resolver = make_resolver(storage)
+    resolver.resolve("bucket", CANDIDATES)
+    storage.names = {FOLDER + "chapter_1.pdf"}
+    resolver.invalidate("bucket", CANDIDATES)
+    assert resolver.resolve("bucket", CANDIDATES) == FOLDER + "chapter_1.pdf"
+    assert storage.list_calls == 2
+
+
+def test_resolved_paths_survive_a_restart_via_the_disk_cache(tmp_path, clock):
+    storage = FakeStorage([FOLDER + "Chapter 1.pdf"])
+    disk_cache = str(tmp_path / "gcs_paths.json")
+    make_resolver(storage, disk_cache_path=disk_cache).resolve("bucket", CANDIDATES)
+    restarted = make_resolver(storage, disk_cache_path=disk_cache)
+    assert restarted.resolve("bucket", CANDIDATES) == FOLDER + "Chapter 1.pdf"
+    assert storage.list_calls == 1
@@ -0,0 +1,93 @@
+import time
+from contextlib import closing
+
+from ingestion import IngestionQueue
+
+
+def make_queue(tmp_path, **kwargs):
+    # No worker threads: tests claim and run jobs themselves
+    return IngestionQueue(str(tmp_path / "jobs.sqlite3"), workers=0, **kwargs)
+
+
+def age_job(job_queue, job_id, seconds):
+    with closing(job_queue._connect()) as connection:
+        connection.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - seconds, job_id))
+
+
+def run_next(job_queue):
+    row = job_queue._claim()
+    if row is not None:
+        job_queue._run(row)
+    return row
+
+
+def test_submit_deduplicates_active_jobs(tmp_path):
+    job_queue = make_queue(tmp_path)
+    job_queue.register("chapter", lambda payload, progress: {"chunks": 3})
+    first = job_queue.submit("chapter", "key", {"path": "a.pdf"})
+    assert job_queue.submit("chapter", "key", {"path": "a.pdf"})["job_id"] == first["job_id"]
+
+    run_next(job_queue)
+    done = job_queue.get(first["job_id"])
+    assert done["status"] == "succeeded"
+    assert done["result"] == {"chunks": 3}
+    # Finished jobs do not block a new submission for the same key
+    assert job_queue.submit("chapter", "key", {"path": "a.pdf"})["job_id"] != first["job_id"]
+
+
+def test_progress_and_failure_are_recorded(tmp_path):
+    job_queue = make_queue(tmp_path)
+
+    def handler(payload, progress):
+        progress.stage("extracting")
+        progress.pages(4, 4)
+        raise RuntimeError("corrupt PDF")
+
+    job_queue.register("chapter", handler)
+    job = job_queue.submit("chapter", "key", {})
+    run_next(job_queue)
+    failed = job_queue.get(job["job_id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "corrupt PDF"
+    assert (failed["pages_done"], failed["pages_total"]) == (4, 4)
+
+
+def test_stale_local_job_keeps_its_owner(tmp_path):
+    job_queue = make_queue(tmp_path, stale_seconds=0)
+    job_queue.register("enhanced", lambda payload, progress: None)
+    job = job_queue.submit("enhanced", "key", {}, local=True)
+    job_queue._claim()
+    age_job(job_queue, job["job_id"], 10)
+
+    other_process = make_queue(tmp_path, stale_seconds=0)
+    other_process._owner = staticmethod(lambda: "elsewhere:1")
+    assert other_process._claim() is None
+    assert job_queue.get(job["job_id"])["stage"] == "requeued"
+    assert job_queue._claim()["id"] == job["job_id"]
+
+
+def test_local_job_of_exited_process_fails(tmp_path):
+    job_queue = make_queue(tmp_path)
+    job_queue.register("enhanced", lambda payload, progress: None)
+    job_queue._owner = staticmethod(lambda: "elsewhere:1")
+    job = job_queue.submit("enhanced", "key", {}, local=True)
+    job_queue._owner_alive = staticmethod(lambda owner: False)
+
+    assert job_queue._claim() is None
+    assert job_queue.get(job["job_id"])["status"] == "failed"
+
+
+def test_finished_jobs_are_pruned_after_retention(tmp_path):
+    job_queue = make_queue(tmp_path, retention_seconds=60)
+    job_queue.register("chapter", lambda payload, progress: None)
+    old = job_queue.submit("chapter", "old", {})
+    run_next(job_queue)
+    age_job(job_queue, old["job_id"], 120)
+    recent = job_queue.submit("chapter", "recent", {})
+    run_next(job_queue)
+    pending = job_queue.submit("chapter", "pending", {})
+
+    job_queue._prune()
+    assert job_queue.get(old["job_id"]) is None
+    assert job_queue.get(recent["job_id"])["status"] == "succeeded"
+    assert job_queue.get(pending["job_id"])["status"] == "queued"
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from memory_cache import ByteBudgetCache, estimate_size
+
+
+def test_estimate_size_counts_array_buffers():
+    array = np.zeros(1000, dtype=np.float32)
+    assert estimate_size(array) == 4000
+    assert estimate_size({"a": array}) > 4000
+
+
+def test_lru_evicts_least_recently_used():
+    evicted = []
+    cache = ByteBudgetCache(max_bytes=300, on_evict=lambda key, value: evicted.append(key))
+    for key in ("a", "b", "c"):
+        cache.set(key, key, size=100)
+    cache.get("a")
+    cache.set("d", "d", size=100)
+    assert evicted == ["b"]
+    assert cache.get("a") == "a" and cache.get("b") is None
+    assert cache.get_stats()["evicted_bytes"] == 100
+
+
+def test_lfu_keeps_frequently_used_entries():
+    cache = ByteBudgetCache(max_bytes=300, policy="lfu")
+    for key in ("a", "b", "c"):
+        cache.set(key, key, size=100)
+    for _ in range(3):
+        cache.get("a")
+    cache.get("c")
+    # b has no hits and goes first; then c (1 hit) goes before a (3) and d (2)
+    cache.set("d", "d", size=100)
+    cache.get("d")
+    cache.get("d")
+    cache.set("e", "e", size=100)
+    assert [key for key in "abcde" if cache.peek(key) is not None] == ["a", "d", "e"]
+
+
+def test_version_mismatch_is_a_stale_miss():
+    evicted = []
+    cache = ByteBudgetCache(max_bytes=1000, on_evict=lambda key, value: evicted.append(value))
+    cache.set("k", "old", version=1, size=10)
+    assert cache.get("k", version=2) is None
+    assert evicted == ["old"]
+    stats = cache.get_stats()
+    assert (stats["stale"], stats["misses"], stats["entries"]) == (1, 1, 0)
+
+
+def test_replacing_and_popping_notify_but_resetting_same_value_does_not():
+    evicted = []
+    cache = ByteBudgetCache(max_bytes=1000, on_evict=lambda key, value: evicted.append(value))
+    value = ["v"]
+    cache.set("k", value, size=10)
+    cache.set("k", value, size=10)
+    assert evicted == []
+    cache.set("k", ["w"], size=10)
+    cache.pop("k")
+    assert evicted == [["v"], ["w"]]
+
+
+def test_oversized_values_are_not_cached():
+    cache = ByteBudgetCache(max_bytes=100)
+    cache.set("small", "s", size=50)
+    assert not cache.set("big", "b", size=200)
+    assert cache.get("small") == "s"
+    assert cache.get_stats()["bytes"] == 50
+
+
+def test_failing_on_evict_does_not_break_the_cache():
+    def explode(key, value):
+        raise RuntimeError("close failed")
+
+    cache = ByteBudgetCache(max_bytes=100, on_evict=explode)
+    cache.set("a", "a", size=100)
+    assert cache.set("b", "b", size=100)
+    assert cache.get("b") == "b"
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ByteBudgetCache(policy="fifo")
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pypdf")
+
+import pdf_extract
+from pdf_extract import extract_page_texts
+
+
+def make_pdf(page_count):
+    """A minimal PDF whose page n shows the text 'Page n'"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(1, page_count + 1):
+        stream = f"BT /F1 12 Tf 72 720 Td (Page {number}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), page_count)
+
+    pdf, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def page_texts(results):
+    return [(number, text.strip() if text else text, error) for number, text, error in results]
+
+
+def test_parallel_matches_serial_in_page_order():
+    pdf_bytes = make_pdf(7)
+    serial = extract_page_texts(pdf_bytes, max_workers=1)
+    parallel = extract_page_texts(pdf_bytes, max_workers=3, min_pages_for_parallel=1)
+    assert page_texts(serial) == [(n, f"Page {n}", None) for n in range(1, 8)]
+    assert page_texts(parallel) == page_texts(serial)
+
+
+def test_small_documents_stay_serial(monkeypatch):
+    def no_pool(max_workers):
+        raise AssertionError("pool used for a small document")
+
+    monkeypatch.setattr(pdf_extract, "_get_executor", no_pool)
+    assert len(extract_page_texts(make_pdf(3), max_workers=4, min_pages_for_parallel=16)) == 3
+
+
+def test_failing_pool_falls_back_to_serial(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            raise RuntimeError("pool is broken")
+
+    monkeypatch.setattr(pdf_extract, "_get_executor", lambda max_workers: BrokenPool())
+    progress = []
+    results = extract_page_texts(make_pdf(4), max_workers=2, min_pages_for_parallel=1,
+                                 on_progress=lambda done, total: progress.append((done, total)))
+    assert page_texts(results) == [(n, f"Page {n}", None) for n in range(1, 5)]
+    assert progress[-1] == (4, 4)
+
+
+def test_workers_do_not_rerun_the_main_script(tmp_path):
+    script = tmp_path / "server.py"
+    script.write_text(
+        "import sys\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(pdf_extract.__file__))!r})\n"
+        "print('MAIN START-UP', flush=True)\n"
+        "from pdf_extract import extract_page_texts\n"
+        "if __name__ == '__main__':\n"
+        "    pdf_bytes = open(sys.argv[1], 'rb').read()\n"
+        "    print(len(extract_page_texts(pdf_bytes, max_workers=2, min_pages_for_parallel=1)))\n"
+    )
+    pdf_path = tmp_path / "chapter.pdf"
+    pdf_path.write_bytes(make_pdf(4))
+    output = subprocess.run([sys.executable, str(script), str(pdf_path)], capture_output=True,
+                            text=True, timeout=60, check=True).stdout
+    assert output.split() == ["MAIN", "START-UP", "4"]
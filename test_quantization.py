@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from quantization import (
+    EMBEDDING_DTYPES, QuantizedMatrix, as_quantized, decode_vector, encode_vector,
+    load_quantized, quantize_rows, save_quantized, scales_filename,
+)
+from vector_search import EmbeddingMatrix, normalize_rows, top_k_indices
+
+# Worst-case per-component error for unit vectors of dimension 384
+TOLERANCE = {"float32": 0.0, "float16": 1e-3, "int8": 0.02}
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return normalize_rows(rng.standard_normal((300, 384)))
+
+
+@pytest.mark.parametrize("dtype", EMBEDDING_DTYPES)
+def test_vector_encode_decode_round_trip(embeddings, dtype):
+    vector = embeddings[0]
+    payload = encode_vector(vector, dtype)
+    assert len(payload) == {"float32": 1536, "float16": 768, "int8": 388}[dtype]
+    decoded = decode_vector(payload, dtype)
+    assert decoded.dtype == np.float32
+    assert np.abs(decoded - vector).max() <= TOLERANCE[dtype]
+
+
+@pytest.mark.parametrize("dtype", EMBEDDING_DTYPES)
+def test_scores_match_dequantised_rows(embeddings, dtype):
+    matrix = QuantizedMatrix.from_float(embeddings, dtype)
+    query = embeddings[5]
+    expected = matrix.rows() @ query
+    assert np.allclose(matrix.scores(query), expected, atol=1e-5)
+    indices = [3, 250, 5, 0]
+    assert np.allclose(matrix.scores(query, indices), expected[indices], atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", EMBEDDING_DTYPES)
+def test_top_k_recall_against_float32(embeddings, dtype):
+    exact = QuantizedMatrix.from_float(embeddings, "float32")
+    matrix = QuantizedMatrix.from_float(embeddings, dtype)
+    hits = 0
+    for query in embeddings[:20]:
+        hits += len(set(top_k_indices(matrix.scores(query), 5)) & set(top_k_indices(exact.scores(query), 5)))
+    assert hits / 100 >= 0.9
+
+
+def test_int8_scales_and_zero_rows():
+    data, scales = quantize_rows(np.array([[0.5, -1.0], [0.0, 0.0]], dtype=np.float32), "int8")
+    assert data.dtype == np.int8 and data[0].tolist() == [64, -127]
+    assert scales[1] == 1.0 and data[1].tolist() == [0, 0]
+
+
+def test_storage_sizes(embeddings):
+    sizes = {dtype: QuantizedMatrix.from_float(embeddings, dtype).nbytes for dtype in EMBEDDING_DTYPES}
+    assert sizes["float16"] * 2 == sizes["float32"]
+    assert sizes["int8"] == 300 * 384 + 300 * 4
+
+
+def test_unknown_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        quantize_rows(np.zeros((1, 4)), "int4")
+
+
+def test_int8_needs_scales():
+    with pytest.raises(ValueError):
+        QuantizedMatrix(np.zeros((2, 4), dtype=np.int8))
+
+
+@pytest.mark.parametrize("dtype", EMBEDDING_DTYPES)
+def test_save_and_memory_mapped_load(tmp_path, embeddings, dtype):
+    filename = str(tmp_path / "chapter_embeddings.npy")
+    matrix = QuantizedMatrix.from_float(embeddings, dtype)
+    save_quantized(filename, matrix)
+    loaded = load_quantized(filename)
+    assert loaded.dtype == dtype and isinstance(loaded.data, np.memmap)
+    assert np.array_equal(loaded.scores(embeddings[1]), matrix.scores(embeddings[1]))
+
+
+def test_int8_without_scales_is_incomplete(tmp_path, embeddings):
+    filename = str(tmp_path / "chapter_embeddings.npy")
+    save_quantized(filename, QuantizedMatrix.from_float(embeddings, "int8"))
+    (tmp_path / "chapter_embeddings_scales.npy").unlink()
+    assert load_quantized(filename) is None
+
+
+def test_saving_float_removes_old_scales(tmp_path, embeddings):
+    filename = str(tmp_path / "chapter_embeddings.npy")
+    save_quantized(filename, QuantizedMatrix.from_float(embeddings, "int8"))
+    save_quantized(filename, QuantizedMatrix.from_float(embeddings, "float16"))
+    assert not (tmp_path / "chapter_embeddings_scales.npy").exists()
+    assert scales_filename(filename) == str(tmp_path / "chapter_embeddings_scales.npy")
+
+
+def test_plain_float32_files_still_load(tmp_path, embeddings):
+    filename = str(tmp_path / "legacy_embeddings.npy")
+    np.save(filename, embeddings)
+    assert load_quantized(filename).dtype == "float32"
+    assert as_quantized(embeddings).dtype == "float32"
+
+
+@pytest.mark.parametrize("dtype", EMBEDDING_DTYPES)
+def test_embedding_matrix_search(embeddings, dtype):
+    items = [{"chunk_id": i} for i in range(len(embeddings))]
+    index = EmbeddingMatrix(embeddings * 3.0, items, dtype=dtype)
+    best, score = index.search(embeddings[42], 1)[0]
+    assert best["chunk_id"] == 42
+    assert score == pytest.approx(1.0, abs=0.02)
@@ -0,0 +1,93 @@
+from quiz_pool import QuizQuestionPool
+
+
+def make_questions(prefix, count):
+    return [{"question": f"{prefix} question {i}?", "options": ["a", "b"], "answer": "a"} for i in range(count)]
+
+
+class RecordingGenerator:
+    def __init__(self, per_call=10):
+        self.calls = []
+        self.per_call = per_call
+
+    def __call__(self, *key):
+        self.calls.append(key)
+        questions = make_questions(f"refill {len(self.calls)}", self.per_call)
+        return questions
+
+
+def wait_for_refills(pool):
+    pool._executor.shutdown(wait=True)
+
+
+def test_cold_miss_does_not_schedule_refill():
+    generate = RecordingGenerator()
+    pool = QuizQuestionPool(generate, refill_threshold=5)
+    assert pool.take(("k",), "user", 10) is None
+    wait_for_refills(pool)
+    assert generate.calls == []
+    assert pool.get_stats()["pool_misses"] == 1
+
+
+def test_inline_add_seeds_pool_and_refills_when_short():
+    generate = RecordingGenerator()
+    pool = QuizQuestionPool(generate, refill_threshold=5)
+    assert pool.add(("k",), make_questions("inline", 10), served_to="alice") == 10
+    wait_for_refills(pool)
+    # alice has seen all ten, so one background refill tops the pool up
+    assert generate.calls == [("k",)]
+    assert pool.get_stats()["questions"] == 20
+
+
+def test_take_serves_unseen_questions_without_repeats():
+    pool = QuizQuestionPool(RecordingGenerator(), refill_threshold=0)
+    pool.add(("k",), make_questions("inline", 30))
+    first = {q["question"] for q in pool.take(("k",), "bob", 10)}
+    second = {q["question"] for q in pool.take(("k",), "bob", 10)}
+    third = {q["question"] for q in pool.take(("k",), "bob", 10)}
+    assert len(first | second | third) == 30
+    assert pool.take(("k",), "bob", 10) is None
+    # Another user still gets the whole pool
+    assert pool.take(("k",), "carol", 10) is not None
+
+
+def test_take_refills_when_serving_leaves_user_short():
+    generate = RecordingGenerator()
+    pool = QuizQuestionPool(generate, refill_threshold=15)
+    pool.add(("k",), make_questions("inline", 20))
+    assert pool.take(("k",), "dave", 10) is not None
+    wait_for_refills(pool)
+    assert generate.calls == [("k",)]
+    assert pool.get_stats()["refills"] == 1
+
+
+def test_duplicates_are_skipped_and_size_is_capped():
+    pool = QuizQuestionPool(RecordingGenerator(), max_size=15, refill_threshold=0)
+    assert pool.add(("k",), make_questions("a", 10)) == 10
+    assert pool.add(("k",), make_questions("a", 10)) == 0
+    pool.add(("k",), make_questions("b", 10))
+    assert pool.get_stats()["questions"] == 15
+
+
+def test_chapters_and_users_are_bounded():
+    pool = QuizQuestionPool(RecordingGenerator(), refill_threshold=0, max_chapters=2, max_users=2)
+    for key in ("a", "b", "c"):
+        pool.add((key,), make_questions(key, 5))
+    assert pool.get_stats()["chapters"] == 2
+    assert pool.take(("a",), "user", 1) is None
+
+    for user in ("u1", "u2", "u3"):
+        pool.take(("c",), user, 1)
+    assert list(pool._pools[("c",)].served) == ["u2", "u3"]
+
+
+def test_failed_refill_is_counted():
+    def failing(*key):
+        raise RuntimeError("model unavailable")
+
+    pool = QuizQuestionPool(failing, refill_threshold=5)
+    assert pool.request_refill(("k",))
+    wait_for_refills(pool)
+    stats = pool.get_stats()
+    assert stats["refill_failures"] == 1
+    assert stats["refills_in_flight"] == 0
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight, file_lock
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls, results = [], []
+
+    def build():
+        calls.append(1)
+        release.wait(5)
+        return "chunks"
+
+    def caller():
+        results.append(flight.do("chapter", build))
+
+    threads = [threading.Thread(target=caller) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flight.get_stats()["coalesced"] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == ["chunks"] * 8
+    assert flight.get_stats() == {"executions": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    def failing():
+        raise RuntimeError("download failed")
+
+    with pytest.raises(RuntimeError):
+        flight.do("chapter", failing)
+    # Nothing is remembered once the call finishes
+    assert flight.do("chapter", lambda: "ok") == "ok"
+    assert flight.get_stats()["executions"] == 2
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.get_stats()["coalesced"] == 0
+
+
+def test_file_lock_serialises_holders(tmp_path):
+    lock_path = str(tmp_path / "chapter.lock")
+    inside, overlaps = [], []
+
+    def hold():
+        with file_lock(lock_path):
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(1)
+            time.sleep(0.01)
+            inside.pop()
+
+    run_concurrently(4, hold)
+    assert overlaps == []
@@ -0,0 +1,79 @@
+import logging
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+from quantization import QuantizedMatrix, EMBEDDING_DTYPE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Return the indices of the top_k highest scores, best first.
+    Uses argpartition so only the selected rows are sorted, not the whole array.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[0]
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k >= n:
+        return np.argsort(-scores, kind='stable')
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def normalize_rows(embeddings) -> np.ndarray:
+    """Return a C-contiguous float32 copy of the matrix with every row scaled to unit L2 norm"""
+    matrix = np.array(embeddings, dtype=np.float32, copy=True, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+
+class EmbeddingMatrix:
+    """
+    Search structure for one document: a contiguous, L2-normalised matrix (float32, or
+    float16/int8 per EMBEDDING_DTYPE) plus the compact per-row items (text/metadata,
+    no embedding lists) it was built from.
+    Cosine similarity then reduces to a single matrix-vector product.
+    """
+
+    def __init__(self, embeddings, items: List[Dict], dtype: Optional[str] = None):
+        if len(items) != len(embeddings):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(items)} items")
+        matrix = normalize_rows(embeddings) if len(items) else np.zeros((0, 0), dtype=np.float32)
+        self.vectors = QuantizedMatrix.from_float(matrix, dtype or EMBEDDING_DTYPE)
+        self.items = items
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict], embedding_key: str = 'embedding',
+                    dtype: Optional[str] = None) -> "EmbeddingMatrix":
+        """Build from chunk dicts carrying embeddings (lists or arrays), dropping them from the items"""
+        embedded = [chunk for chunk in chunks if embedding_key in chunk]
+        items = [{k: v for k, v in chunk.items() if k != embedding_key} for chunk in embedded]
+        embeddings = [chunk[embedding_key] for chunk in embedded]
+        return cls(embeddings, items, dtype)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+    def scores(self, query_embedding) -> np.ndarray:
+        """Cosine similarity of the query against every row"""
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        return self.vectors.scores(query)
+
+    def search(self, query_embedding, top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """Return (item, cosine similarity) pairs for the top_k rows, best first"""
+        if not self.items:
+            return []
+        scores = self.scores(query_embedding)
+        return [(self.items[i], float(scores[i])) for i in top_k_indices(scores, top_k)]
@@ -1,14 +1,26 @@
 import os
-import io
 import json
+import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 from google.cloud import aiplatform
 from google.cloud import storage
 from vertexai.generative_models import GenerativeModel
-from sentence_transformers import SentenceTransformer
-from pypdf import PdfReader
+from embedding_provider import get_embedding_model
+from vector_search import EmbeddingMatrix
+from quantization import encode_vector, decode_vector, EMBEDDING_DTYPE
+from ann_index import IVFIndex
+from gcp_clients import get_storage_client, get_generative_model
+from pdf_extract import extract_page_texts
+from chunking import chunk_pages, assign_chunk_ids
+from context_packer import pack_context, prompt_token_stats, QUIZ_CONTEXT_TOKEN_BUDGET
+from llm_executor import llm_executor
+from streaming import iter_response_text
+from single_flight import SingleFlight
+from memory_cache import ByteBudgetCache, estimate_size
 import firebase_admin
 from firebase_admin import firestore
 from datetime import datetime
@@ -17,6 +29,63 @@ import re
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Local directory for the corpus-wide ANN index (all chapters of every class)
+CORPUS_INDEX_DIR = os.getenv('CORPUS_INDEX_DIR', '/tmp/corpus_index')
+
+# Byte budget for the document indexes shared by the enhanced chat and quiz services
+ENHANCED_DOCUMENT_CACHE_MAX_BYTES = int(os.getenv('ENHANCED_DOCUMENT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# "lru" or "lfu" (keeps frequently used chapters resident when many are touched once)
+ENHANCED_DOCUMENT_CACHE_POLICY = os.getenv('ENHANCED_DOCUMENT_CACHE_POLICY', 'lru').lower()
+
+# Firestore caps a batch at 500 writes; batches of one document are committed concurrently
+FIRESTORE_BATCH_SIZE = min(500, int(os.getenv('FIRESTORE_BATCH_SIZE', '500')))
+FIRESTORE_WRITE_CONCURRENCY = int(os.getenv('FIRESTORE_WRITE_CONCURRENCY', '4'))
+# One marker per persisted document version, listing the chunk documents written for it
+PERSISTED_DOCUMENTS_SUFFIX = "_documents"
+
+# Fields read back when warm-starting a document; embeddings travel as packed little-endian
+# values in EMBEDDING_DTYPE (float32, float16 or int8 with a scale), recorded in embedding_dtype
+PERSISTED_CHUNK_FIELDS = ['text', 'metadata', 'chunk_id', 'position', 'embedding_bytes', 'embedding_dtype']
+
+def pack_embedding(embedding, dtype: str = EMBEDDING_DTYPE) -> bytes:
+    return encode_vector(embedding, dtype)
+
+def unpack_embedding(chunk: Dict) -> Optional[np.ndarray]:
+    """Embedding of a persisted chunk as float32, from the packed field or a legacy list of floats"""
+    if chunk.get('embedding_bytes') is not None:
+        return decode_vector(chunk['embedding_bytes'], chunk.get('embedding_dtype', 'float32'))
+    if chunk.get('embedding') is not None:
+        return np.asarray(chunk['embedding'], dtype=np.float32)
+    return None
+
+def firestore_document_key(bucket_name: str, file_path: str, generation=None) -> str:
+    """Stable Firestore-safe key for one version (GCS generation) of a source PDF"""
+    source = f"gs://{bucket_name}/{file_path}#{generation if generation is not None else ''}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+def commit_in_batches(db, writes: List[Tuple], batch_size: int = FIRESTORE_BATCH_SIZE,
+                      max_workers: int = FIRESTORE_WRITE_CONCURRENCY) -> int:
+    """
+    Apply (doc_ref, data) sets and (doc_ref, None) deletes in batches of at most batch_size,
+    committing the batches in parallel. Raises the first commit error. Returns the write count.
+    """
+    batches = []
+    for start in range(0, len(writes), batch_size):
+        batch = db.batch()
+        for doc_ref, data in writes[start:start + batch_size]:
+            if data is None:
+                batch.delete(doc_ref)
+            else:
+                batch.set(doc_ref, data)
+        batches.append(batch)
+    if len(batches) == 1:
+        batches[0].commit()
+    elif batches:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            for future in [executor.submit(batch.commit) for batch in batches]:
+                future.result()
+    return len(writes)
+
 class VertexAIRAG:
     """
     Enhanced RAG implementation using Vertex AI for embeddings and text generation
@@ -25,7 +94,6 @@ class VertexAIRAG:
     def __init__(self, project_id: str, location: str = "us-central1"):
         self.project_id = project_id
         self.location = location
-        self.storage_client = storage.Client()
         
         # Initialize Vertex AI
         try:
@@ -42,21 +110,30 @@ class VertexAIRAG:
         """Initialize Vertex AI models"""
         try:
             # Text generation model
-            self.text_model = GenerativeModel("gemini-2.0-flash-001")
+            self.text_model = get_generative_model("gemini-2.0-flash-001")
             logger.info("Gemini text model initialized")
             
-            # Use sentence-transformers as primary embedding model (more reliable)
-            try:
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                logger.info("Sentence-transformers embedding model initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize sentence-transformers: {e}")
-                self.embedding_model = None
-                
+            # Sentence-transformers embedding model is shared process-wide and
+            # loaded lazily through embedding_provider (see the embedding_model property)
+
         except Exception as e:
             logger.error(f"Failed to initialize models: {str(e)}")
             raise
     
+    @property
+    def storage_client(self) -> storage.Client:
+        """Worker-wide pooled Cloud Storage client"""
+        return get_storage_client()
+    
+    @property
+    def embedding_model(self):
+        """Shared sentence-transformers model, or None if it cannot be loaded"""
+        try:
+            return get_embedding_model()
+        except Exception as e:
+            logger.error(f"Failed to initialize sentence-transformers: {e}")
+            return None
+    
     def get_embeddings(self, texts: List[str]) -> np.ndarray:
         """
         Get embeddings using sentence-transformers model
@@ -71,19 +148,23 @@ class VertexAIRAG:
             logger.error(f"Error getting embeddings: {str(e)}")
             raise Exception(f"Failed to generate embeddings: {str(e)}")
     
-    def process_pdf(self, bucket_name: str, file_path: str, metadata: Dict = None) -> List[Dict]:
+    def process_pdf(self, bucket_name: str, file_path: str, metadata: Dict = None,
+                    blob_info: Dict = None) -> List[Dict]:
         """
-        Process PDF from GCS and return chunks with embeddings
+        Process PDF from GCS and return chunks with embeddings.
+        If blob_info is given it is filled with the downloaded blob's generation and etag.
         """
         try:
-            # Download PDF from GCS
+            # Download PDF from GCS (get_blob also returns the generation we persist under)
             bucket = self.storage_client.bucket(bucket_name)
-            blob = bucket.blob(file_path)
+            blob = bucket.get_blob(file_path)
             
-            if not blob.exists():
+            if blob is None:
                 raise FileNotFoundError(f"PDF not found: gs://{bucket_name}/{file_path}")
             
-            pdf_bytes = blob.download_as_bytes()
+            pdf_bytes = blob.download_as_bytes(if_generation_match=blob.generation)
+            if blob_info is not None:
+                blob_info.update(generation=blob.generation, etag=blob.etag)
             logger.info(f"Downloaded PDF: {len(pdf_bytes)} bytes")
             
             # Split into chunks
@@ -92,11 +173,11 @@ class VertexAIRAG:
             
             # Generate embeddings for chunks
             texts = [chunk['text'] for chunk in chunks]
-            embeddings = self.get_embeddings(texts)
+            embeddings = np.asarray(self.get_embeddings(texts), dtype=np.float32)
             
-            # Add embeddings to chunks
+            # Add embeddings to chunks as float32 rows (a Python float list costs ~8x the memory)
             for i, chunk in enumerate(chunks):
-                chunk['embedding'] = embeddings[i].tolist()
+                chunk['embedding'] = embeddings[i]
             
             return chunks
             
@@ -109,62 +190,43 @@ class VertexAIRAG:
         if metadata is None:
             metadata = {}
         
-        chunks = []
-        pdf_stream = io.BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_stream)
-        
-        for i, page in enumerate(reader.pages):
-            try:
-                text = page.extract_text()
-                if text:
-                    words = text.split()
-                    for j in range(0, len(words), chunk_size):
-                        chunk_text = ' '.join(words[j:j+chunk_size])
-                        chunk = {
-                            "text": chunk_text,
-                            "metadata": {**metadata, "page": i + 1},
-                            "chunk_id": f"page_{i+1}_chunk_{j//chunk_size + 1}"
-                        }
-                        chunks.append(chunk)
-            except Exception as e:
-                logger.warning(f"Error extracting text from page {i+1}: {e}")
+        pages = []
+        for page_number, text, page_error in extract_page_texts(pdf_bytes):
+            if page_error:
+                logger.warning(f"Error extracting text from page {page_number}: {page_error.strip().splitlines()[-1]}")
+            elif text:
+                pages.append((page_number, text))
         
-        return chunks
+        return assign_chunk_ids(chunk_pages(pages, metadata, chunk_size=chunk_size))
+    
+    def build_index(self, chunks: List[Dict]) -> EmbeddingMatrix:
+        """
+        Pack chunk embeddings into a normalised float32 matrix for fast repeated search
+        """
+        return EmbeddingMatrix.from_chunks(chunks)
     
-    def semantic_search(self, query: str, chunks: List[Dict], top_k: int = 5) -> List[Tuple[Dict, float]]:
+    def semantic_search(self, query: str, chunks: Union[List[Dict], EmbeddingMatrix], top_k: int = 5) -> List[Tuple[Dict, float]]:
         """
-        Perform semantic search using embeddings
+        Perform semantic search using embeddings.
+        Accepts a prebuilt EmbeddingMatrix (one GEMV + partial top-k) or a list of
+        chunk dicts with 'embedding' lists, which are packed on the fly.
         """
         try:
+            if not isinstance(chunks, EmbeddingMatrix):
+                chunks = self.build_index(chunks)
+            
             # Get query embedding
             query_embedding = self.get_embeddings([query])[0]
             
-            # Calculate similarities
-            scored_chunks = []
-            for chunk in chunks:
-                if 'embedding' in chunk:
-                    chunk_embedding = np.array(chunk['embedding'])
-                    similarity = np.dot(query_embedding, chunk_embedding) / (
-                        np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
-                    )
-                    scored_chunks.append((chunk, float(similarity)))
-            
-            # Sort by similarity and return top_k
-            scored_chunks.sort(key=lambda x: x[1], reverse=True)
-            return scored_chunks[:top_k]
+            return chunks.search(query_embedding, top_k)
             
         except Exception as e:
             logger.error(f"Error in semantic search: {str(e)}")
             return []
     
-    def generate_answer(self, context: str, question: str, model_name: str = "gemini-2.0-flash-001") -> str:
-        """
-        Generate answer using Vertex AI Gemini model
-        """
-        try:
-            model = GenerativeModel(model_name)
-            
-            prompt = f"""
+    def _build_answer_prompt(self, context: str, question: str) -> str:
+        """Prompt shared by the blocking and streaming answer paths"""
+        return f"""
             You are an expert educational assistant. Provide detailed, structured answers to student questions.
             
             Context from educational materials:
@@ -183,20 +245,39 @@ class VertexAIRAG:
             
             Answer:
             """
+    
+    def generate_answer(self, context: str, question: str, model_name: str = "gemini-2.0-flash-001") -> str:
+        """
+        Generate answer using Vertex AI Gemini model
+        """
+        try:
+            model = get_generative_model(model_name)
             
-            response = model.generate_content(prompt)
+            prompt = self._build_answer_prompt(context, question)
+            prompt_token_stats.record("enhanced_ask", prompt)
+            response = llm_executor.generate_content(model, prompt)
             return response.text.strip()
             
         except Exception as e:
             logger.error(f"Error generating answer: {str(e)}")
             return "I encountered an error while generating an answer. Please try again."
     
+    def generate_answer_stream(self, context: str, question: str, model_name: str = "gemini-2.0-flash-001") -> Iterator[str]:
+        """
+        Yield the answer text incrementally as Gemini produces it
+        """
+        model = get_generative_model(model_name)
+        prompt = self._build_answer_prompt(context, question)
+        prompt_token_stats.record("enhanced_ask", prompt)
+        responses = llm_executor.stream(lambda: model.generate_content(prompt, stream=True))
+        yield from iter_response_text(responses)
+    
     def generate_quiz_questions(self, context: str, difficulty: str = "medium", num_questions: int = 10) -> List[Dict]:
         """
         Generate quiz questions using Vertex AI
         """
         try:
-            model = GenerativeModel("gemini-2.0-flash-001")
+            model = get_generative_model("gemini-2.0-flash-001")
             
             prompt = f"""
             Generate {num_questions} multiple choice questions based on the following educational content.
@@ -226,7 +307,8 @@ class VertexAIRAG:
             JSON Response:
             """
             
-            response = model.generate_content(prompt)
+            prompt_token_stats.record("enhanced_quiz", prompt)
+            response = llm_executor.generate_content(model, prompt)
             
             # Clean and parse JSON response
             json_text = response.text.strip()
@@ -256,37 +338,110 @@ class VertexAIRAG:
             logger.error(f"Error generating quiz questions: {str(e)}")
             return []
     
-    def store_chunks_in_firestore(self, chunks: List[Dict], collection_name: str = "document_chunks") -> bool:
+    def store_chunks_in_firestore(self, chunks: List[Dict], bucket_name: str, file_path: str,
+                                  generation=None, collection_name: str = "document_chunks") -> bool:
         """
-        Store chunks with embeddings in Firestore for persistent storage
+        Store chunks with embeddings in Firestore for persistent storage.
+        Document IDs are derived from the blob path, its generation and the chunk id, so storing
+        the same PDF version again overwrites rather than duplicates. A marker document per
+        version makes a repeat call a single read, and chunks of older generations of the same
+        blob are deleted once the new version is written.
         """
         try:
             db = firestore.client()
             collection_ref = db.collection(collection_name)
-            
-            # Batch write for efficiency
-            batch = db.batch()
-            
+            markers_ref = db.collection(f"{collection_name}{PERSISTED_DOCUMENTS_SUFFIX}")
+            doc_key = firestore_document_key(bucket_name, file_path, generation)
+            
+            marker = markers_ref.document(doc_key).get()
+            marker_data = marker.to_dict() if marker.exists else {}
+            if (marker.exists and marker_data.get('chunk_count') == len(chunks)
+                    and marker_data.get('embedding_dtype', 'float32') == EMBEDDING_DTYPE):
+                logger.info(f"Chunks for gs://{bucket_name}/{file_path} (generation {generation}) already in Firestore")
+                return True
+            
+            created_at = datetime.now()
+            writes, chunk_ids = [], []
             for i, chunk in enumerate(chunks):
-                doc_ref = collection_ref.document(f"chunk_{i}_{datetime.now().timestamp()}")
-                # Convert numpy arrays to lists for Firestore storage
+                chunk_id = chunk.get('chunk_id') or f"chunk_{i}"
+                chunk_ids.append(chunk_id)
+                # Packed bytes: float32 is a quarter of the size of a list of doubles, int8 a sixteenth
                 chunk_data = {
                     'text': chunk['text'],
                     'metadata': chunk['metadata'],
-                    'chunk_id': chunk['chunk_id'],
-                    'embedding': chunk['embedding'],
-                    'created_at': datetime.now()
+                    'chunk_id': chunk_id,
+                    'position': i,
+                    'embedding_bytes': pack_embedding(chunk['embedding']),
+                    'embedding_dtype': EMBEDDING_DTYPE,
+                    'doc_key': doc_key,
+                    'created_at': created_at
                 }
-                batch.set(doc_ref, chunk_data)
-            
-            batch.commit()
-            logger.info(f"Stored {len(chunks)} chunks in Firestore")
+                writes.append((collection_ref.document(f"{doc_key}_{chunk_id}"), chunk_data))
+            
+            # Chunks of earlier versions of this blob are replaced, not accumulated
+            for old_marker in markers_ref.where('bucket', '==', bucket_name).where('path', '==', file_path).stream():
+                if old_marker.id == doc_key:
+                    continue
+                old_ids = old_marker.to_dict().get('chunk_ids', [])
+                writes.extend((collection_ref.document(f"{old_marker.id}_{chunk_id}"), None) for chunk_id in old_ids)
+                writes.append((old_marker.reference, None))
+            
+            commit_in_batches(db, writes)
+            # Written last, so an interrupted store is simply redone (with the same IDs) next time
+            markers_ref.document(doc_key).set({
+                'bucket': bucket_name,
+                'path': file_path,
+                'generation': str(generation) if generation is not None else None,
+                'chunk_count': len(chunks),
+                'chunk_ids': chunk_ids,
+                'embedding_dtype': EMBEDDING_DTYPE,
+                'created_at': created_at
+            })
+            logger.info(f"Stored {len(chunks)} chunks in Firestore ({len(writes) - len(chunks)} superseded writes)")
             return True
             
         except Exception as e:
             logger.error(f"Error storing chunks in Firestore: {str(e)}")
             return False
     
+    def load_persisted_document(self, bucket_name: str, file_path: str,
+                                collection_name: str = "document_chunks") -> Optional[List[Dict]]:
+        """
+        Chunks (with embeddings) persisted for the current generation of a PDF, or None if that
+        version has not been fully stored. Costs one GCS metadata call, one marker read and one
+        projected query over just this document's chunks.
+        """
+        try:
+            blob = self.storage_client.bucket(bucket_name).get_blob(file_path)
+            if blob is None:
+                return None
+            db = firestore.client()
+            doc_key = firestore_document_key(bucket_name, file_path, blob.generation)
+            marker = db.collection(f"{collection_name}{PERSISTED_DOCUMENTS_SUFFIX}").document(doc_key).get()
+            if not marker.exists:
+                return None
+            
+            docs = db.collection(collection_name).where('doc_key', '==', doc_key).select(PERSISTED_CHUNK_FIELDS).stream()
+            chunks = []
+            for doc in docs:
+                chunk = doc.to_dict()
+                chunk['embedding'] = unpack_embedding(chunk)
+                chunk.pop('embedding_bytes', None)
+                chunk.pop('embedding_dtype', None)
+                chunks.append(chunk)
+            
+            expected = marker.to_dict().get('chunk_count')
+            if len(chunks) != expected:
+                logger.warning(f"Found {len(chunks)} of {expected} persisted chunks for gs://{bucket_name}/{file_path}")
+                return None
+            chunks.sort(key=lambda chunk: chunk.pop('position', 0))
+            logger.info(f"Loaded {len(chunks)} persisted chunks for gs://{bucket_name}/{file_path}")
+            return chunks
+            
+        except Exception as e:
+            logger.warning(f"Could not load persisted chunks for gs://{bucket_name}/{file_path}: {e}")
+            return None
+    
     def load_chunks_from_firestore(self, filters: Dict = None, collection_name: str = "document_chunks") -> List[Dict]:
         """
         Load chunks from Firestore with optional filtering
@@ -307,6 +462,11 @@ class VertexAIRAG:
             chunks = []
             for doc in docs:
                 chunk_data = doc.to_dict()
+                embedding = unpack_embedding(chunk_data)
+                chunk_data.pop('embedding_bytes', None)
+                chunk_data.pop('embedding_dtype', None)
+                if embedding is not None:
+                    chunk_data['embedding'] = embedding
                 chunks.append(chunk_data)
             
             logger.info(f"Loaded {len(chunks)} chunks from Firestore")
@@ -316,31 +476,109 @@ class VertexAIRAG:
             logger.error(f"Error loading chunks from Firestore: {str(e)}")
             return []
 
-class EnhancedChatService:
+class DocumentStore:
     """
-    Enhanced chat service using Vertex AI RAG
+    Per-process store of document indexes (packed embedding matrix plus chunk text and
+    metadata), shared by the enhanced chat and quiz services so a chapter is embedded once.
+    Entries are bounded by their byte size and evicted by the configured policy (LRU or LFU);
+    an evicted document is rebuilt on its next use from the source it was loaded from.
     """
     
-    def __init__(self, project_id: str, location: str = "us-central1"):
-        self.rag = VertexAIRAG(project_id, location)
-        self.chunk_cache = {}  # In-memory cache for chunks
+    def __init__(self, max_bytes: int = ENHANCED_DOCUMENT_CACHE_MAX_BYTES, policy: str = ENHANCED_DOCUMENT_CACHE_POLICY):
+        self._cache = ByteBudgetCache(max_bytes, policy)
+        self._sources: Dict[str, Tuple[str, str, Optional[Dict]]] = {}  # cache_key -> (bucket, path, metadata)
+        # Concurrent requests for the same document share one download, parse and embedding pass
+        self._flight = SingleFlight()
+        self.stats = {"loaded_from_firestore": 0, "processed": 0, "reloads": 0}
     
-    def process_document(self, bucket_name: str, file_path: str, metadata: Dict = None) -> str:
+    def __contains__(self, cache_key: str) -> bool:
+        """Whether the document has been loaded in this process (it may need rebuilding)"""
+        return cache_key in self._sources
+    
+    def load(self, rag: VertexAIRAG, cache_key: str, bucket_name: str, file_path: str,
+             metadata: Dict = None) -> EmbeddingMatrix:
         """
-        Process a document and return a cache key
+        Return the index for a document, building it on a miss: from the chunks persisted in
+        Firestore when the blob's current generation is there, otherwise by processing the PDF
+        (once, however many callers are waiting)
         """
-        cache_key = f"{bucket_name}_{file_path}"
+        index = self._cache.get(cache_key)
+        if index is not None:
+            return index
+        return self._flight.do(cache_key, self._build, rag, cache_key, bucket_name, file_path, metadata)
+    
+    def get(self, rag: VertexAIRAG, cache_key: str) -> Optional[EmbeddingMatrix]:
+        """Index of a previously loaded document, rebuilt if it was evicted; None if never loaded"""
+        index = self._cache.get(cache_key)
+        if index is not None:
+            return index
+        source = self._sources.get(cache_key)
+        if source is None:
+            return None
+        self.stats["reloads"] += 1
+        return self._flight.do(cache_key, self._build, rag, cache_key, *source)
+    
+    def _build(self, rag: VertexAIRAG, cache_key: str, bucket_name: str, file_path: str,
+               metadata: Optional[Dict]) -> EmbeddingMatrix:
+        # Another caller may have finished building it between our miss and this flight
+        index = self._cache.peek(cache_key)
+        if index is not None:
+            return index
         
-        if cache_key not in self.chunk_cache:
-            chunks = self.rag.process_pdf(bucket_name, file_path, metadata)
-            self.chunk_cache[cache_key] = chunks
+        persisted = rag.load_persisted_document(bucket_name, file_path)
+        if persisted:
+            self.stats["loaded_from_firestore"] += 1
+            index = rag.build_index(persisted)
+        else:
+            blob_info = {}
+            chunks = rag.process_pdf(bucket_name, file_path, metadata, blob_info)
+            self.stats["processed"] += 1
             
             # Optionally store in Firestore for persistence
             try:
-                self.rag.store_chunks_in_firestore(chunks)
+                rag.store_chunks_in_firestore(chunks, bucket_name, file_path, blob_info.get("generation"))
             except Exception as e:
                 logger.warning(f"Failed to store chunks in Firestore: {e}")
+            
+            # Keep only the packed matrix and compact metadata in memory
+            index = rag.build_index(chunks)
         
+        self._sources[cache_key] = (bucket_name, file_path, metadata)
+        self._cache.set(cache_key, index, size=index.nbytes + estimate_size(index.items))
+        return index
+    
+    def get_stats(self) -> Dict:
+        return {**self._cache.get_stats(), **self.stats, "documents_known": len(self._sources)}
+
+
+# Shared by EnhancedChatService and EnhancedQuizService
+document_store = DocumentStore()
+
+class EnhancedChatService:
+    """
+    Enhanced chat service using Vertex AI RAG
+    """
+    
+    def __init__(self, project_id: str, location: str = "us-central1", rag: VertexAIRAG = None,
+                 documents: DocumentStore = None):
+        self.rag = rag or VertexAIRAG(project_id, location)
+        self.documents = documents or document_store  # Document indexes shared with the quiz service
+        self.corpus_index = None  # IVFIndex over every chunk in Firestore, loaded on first use
+        self._corpus_index_lock = threading.Lock()
+    
+    @staticmethod
+    def get_cache_key(bucket_name: str, file_path: str) -> str:
+        return f"{bucket_name}_{file_path}"
+    
+    def is_processed(self, cache_key: str) -> bool:
+        return cache_key in self.documents
+    
+    def process_document(self, bucket_name: str, file_path: str, metadata: Dict = None) -> str:
+        """
+        Process a document and return a cache key
+        """
+        cache_key = self.get_cache_key(bucket_name, file_path)
+        self.documents.load(self.rag, cache_key, bucket_name, file_path, metadata)
         return cache_key
     
     def ask_question(self, cache_key: str, question: str, top_k: int = 5) -> Dict:
@@ -348,44 +586,129 @@ class EnhancedChatService:
         Ask a question and get an answer using RAG
         """
         try:
-            if cache_key not in self.chunk_cache:
+            chunks = self.documents.get(self.rag, cache_key)
+            if chunks is None:
                 return {"error": "Document not processed. Please process the document first."}
             
-            chunks = self.chunk_cache[cache_key]
-            
             # Perform semantic search
             relevant_chunks = self.rag.semantic_search(question, chunks, top_k)
             
             if not relevant_chunks:
                 return {"answer": "I couldn't find relevant information to answer your question."}
             
-            # Prepare context
-            context = " ".join([chunk[0]['text'] for chunk in relevant_chunks])
-            
-            # Generate answer
-            answer = self.rag.generate_answer(context, question)
-            
-            # Prepare debug information
-            debug_info = {
-                "question": question,
-                "context_used": context[:500] + "..." if len(context) > 500 else context,
-                "relevant_chunks": [
-                    {
-                        "text": chunk[0]['text'][:200] + "..." if len(chunk[0]['text']) > 200 else chunk[0]['text'],
-                        "similarity_score": chunk[1],
-                        "metadata": chunk[0]['metadata']
-                    }
-                    for chunk in relevant_chunks
-                ]
-            }
+            return self._answer_from_chunks(question, relevant_chunks)
+            
+        except Exception as e:
+            logger.error(f"Error in ask_question: {str(e)}")
+            return {"error": str(e)}
+    
+    def _answer_from_chunks(self, question: str, relevant_chunks: List[Tuple[Dict, float]]) -> Dict:
+        """
+        Build the context from scored chunks, generate the answer and attach debug information
+        """
+        context, debug_info = self._prepare_context(question, relevant_chunks)
+        
+        # Generate answer
+        answer = self.rag.generate_answer(context, question)
+        
+        return {
+            "answer": answer,
+            "debug": debug_info
+        }
+    
+    def _prepare_context(self, question: str, relevant_chunks: List[Tuple[Dict, float]]) -> Tuple[str, Dict]:
+        """
+        Pack the scored chunks into the prompt context and describe them for debugging
+        """
+        # Deduplicate, order by score and trim to the context token budget
+        context, packing = pack_context([(chunk[0]['text'], chunk[1]) for chunk in relevant_chunks])
+        
+        # Prepare debug information
+        debug_info = {
+            "question": question,
+            "context_used": context[:500] + "..." if len(context) > 500 else context,
+            "context_packing": packing,
+            "relevant_chunks": [
+                {
+                    "text": chunk[0]['text'][:200] + "..." if len(chunk[0]['text']) > 200 else chunk[0]['text'],
+                    "similarity_score": chunk[1],
+                    "metadata": chunk[0]['metadata']
+                }
+                for chunk in relevant_chunks
+            ]
+        }
+        
+        return context, debug_info
+    
+    def ask_question_stream(self, cache_key: str, question: str, top_k: int = 5) -> Dict:
+        """
+        Like ask_question, but returns {"stream": <text chunk iterator>, "debug": ...}
+        so the route can forward Gemini's partial output as it arrives
+        """
+        try:
+            chunks = self.documents.get(self.rag, cache_key)
+            if chunks is None:
+                return {"error": "Document not processed. Please process the document first."}
+            
+            relevant_chunks = self.rag.semantic_search(question, chunks, top_k)
             
+            if not relevant_chunks:
+                return {"answer": "I couldn't find relevant information to answer your question."}
+            
+            context, debug_info = self._prepare_context(question, relevant_chunks)
             return {
-                "answer": answer,
+                "stream": self.rag.generate_answer_stream(context, question),
                 "debug": debug_info
             }
             
         except Exception as e:
-            logger.error(f"Error in ask_question: {str(e)}")
+            logger.error(f"Error in ask_question_stream: {str(e)}")
+            return {"error": str(e)}
+    
+    def get_corpus_index(self, rebuild: bool = False) -> Optional[IVFIndex]:
+        """
+        Return the corpus-wide ANN index, loading it from CORPUS_INDEX_DIR or
+        building it from every chunk persisted in Firestore
+        """
+        with self._corpus_index_lock:
+            if self.corpus_index is None and not rebuild:
+                self.corpus_index = IVFIndex.load(CORPUS_INDEX_DIR)
+            
+            if self.corpus_index is None or rebuild:
+                chunks = [chunk for chunk in self.rag.load_chunks_from_firestore() if 'embedding' in chunk]
+                if not chunks:
+                    logger.warning("No persisted chunks available to build the corpus index")
+                    return self.corpus_index
+                
+                items = [
+                    {key: chunk[key] for key in ('text', 'metadata', 'chunk_id') if key in chunk}
+                    for chunk in chunks
+                ]
+                index = IVFIndex().build([chunk['embedding'] for chunk in chunks], items)
+                index.save(CORPUS_INDEX_DIR)
+                self.corpus_index = index
+            
+            return self.corpus_index
+    
+    def ask_corpus_question(self, question: str, filters: Dict = None, top_k: int = 5) -> Dict:
+        """
+        Answer a question from every chapter matching the board/class/subject filters
+        """
+        try:
+            index = self.get_corpus_index()
+            if index is None:
+                return {"error": "Corpus index is not available. Process some documents first."}
+            
+            query_embedding = self.rag.get_embeddings([question])[0]
+            relevant_chunks = index.search(query_embedding, top_k, filters=filters)
+            
+            if not relevant_chunks:
+                return {"answer": "I couldn't find relevant information to answer your question."}
+            
+            return self._answer_from_chunks(question, relevant_chunks)
+            
+        except Exception as e:
+            logger.error(f"Error in ask_corpus_question: {str(e)}")
             return {"error": str(e)}
 
 class EnhancedQuizService:
@@ -393,9 +716,10 @@ class EnhancedQuizService:
     Enhanced quiz service using Vertex AI RAG
     """
     
-    def __init__(self, project_id: str, location: str = "us-central1"):
-        self.rag = VertexAIRAG(project_id, location)
-        self.chunk_cache = {}
+    def __init__(self, project_id: str, location: str = "us-central1", rag: VertexAIRAG = None,
+                 documents: DocumentStore = None):
+        self.rag = rag or VertexAIRAG(project_id, location)
+        self.documents = documents or document_store  # Document indexes shared with the chat service
     
     def generate_quiz(self, bucket_name: str, file_path: str, metadata: Dict, 
                      difficulty: str = "medium", num_questions: int = 10) -> Dict:
@@ -403,17 +727,8 @@ class EnhancedQuizService:
         Generate a quiz using RAG
         """
         try:
-            cache_key = f"{bucket_name}_{file_path}"
-            
-            if cache_key not in self.chunk_cache:
-                chunks = self.rag.process_pdf(bucket_name, file_path, metadata)
-                self.chunk_cache[cache_key] = chunks
-                try:
-                    self.rag.store_chunks_in_firestore(chunks)
-                except Exception as e:
-                    logger.warning(f"Failed to store chunks in Firestore: {e}")
-            
-            chunks = self.chunk_cache[cache_key]
+            cache_key = EnhancedChatService.get_cache_key(bucket_name, file_path)
+            chunks = self.documents.load(self.rag, cache_key, bucket_name, file_path, metadata)
             
             # Get relevant context for quiz generation
             quiz_context_chunks = self.rag.semantic_search("generate quiz questions", chunks, top_k=10)
@@ -421,8 +736,11 @@ class EnhancedQuizService:
             if not quiz_context_chunks:
                 return {"error": "No relevant content found for quiz generation."}
             
-            # Prepare context
-            context = " ".join([chunk[0]['text'] for chunk in quiz_context_chunks])
+            # Prepare context within the quiz token budget
+            context, _ = pack_context(
+                [(chunk[0]['text'], chunk[1]) for chunk in quiz_context_chunks],
+                token_budget=QUIZ_CONTEXT_TOKEN_BUDGET
+            )
             
             # Generate quiz questions
             questions = self.rag.generate_quiz_questions(context, difficulty, num_questions)